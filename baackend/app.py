@@ -36,25 +36,88 @@ jwt = JWTManager(app)
 # Initialize the database
 from models import db, init_db
 
-db.init_app(app)
-migrate = Migrate(app, db)
-
 # Import models after db is initialized to avoid circular imports
 from models import User, Lead, Conversation, Message, VoiceAgent, CallLog
 
-# Initialize the database with models
+# Initialize the database with models (init_db registers db on the app)
 init_db(app)
+migrate = Migrate(app, db)
 
 # Register blueprints
 from routes.auth import auth_bp
 from routes.leads import leads_bp
 from routes.conversations import conversation_bp
 from routes.voice_agents import voice_agent_bp
+from routes.telephony import telephony_bp
+from routes.campaigns import campaign_bp
+from routes.ai import ai_bp
 
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(leads_bp, url_prefix='/api/leads')
 app.register_blueprint(conversation_bp, url_prefix='/api/conversations')
 app.register_blueprint(voice_agent_bp, url_prefix='/api/voice-agents')
+app.register_blueprint(telephony_bp, url_prefix='/api/telephony')
+app.register_blueprint(campaign_bp, url_prefix='/api/campaigns')
+app.register_blueprint(ai_bp, url_prefix='/api')
+
+# Push committed messages to SSE subscribers (across workers when
+# PUBSUB_BROKER_URL points at scripts/pubsub_broker.py)
+from services.pubsub_service import pubsub_service
+pubsub_service.init_app(app)
+
+# Agent replies are queued here and generated by scripts/job_worker.py
+from services.job_queue import job_queue
+from services.agent_reply_service import agent_reply_service
+job_queue.init_app(app)
+agent_reply_service.init_app(app)
+
+# Lead scores follow messages, calls and status changes as they are written
+from services.scoring_service import scoring_service
+scoring_service.init_app(app)
+
+# Call analytics rollups follow call log writes the same way
+from services.analytics_service import analytics_service
+analytics_service.init_app(app)
+
+# Call status webhooks are queued here and applied by scripts/telephony_writer.py
+from services.telephony_service import telephony_service
+telephony_service.init_app(app)
+
+# Recordings they point at are fetched into the local store by scripts/job_worker.py
+from services.recording_service import recording_service
+recording_service.init_app(app)
+
+# Compiled voice agent configs, refreshed across workers when an agent changes
+from services.agent_config_service import agent_config_service
+agent_config_service.init_app(app)
+
+# LLM latency and token metrics: /api/metrics/llm for the caller's usage,
+# /api/metrics for Prometheus (needs METRICS_TOKEN), plus the
+# LLM_METRICS_LOG sink when it is set
+from services.metrics_service import metrics_service
+metrics_service.init_app(app)
+
+# Chat, embeddings and hedging stats under /api/openai. Without
+# OPENAI_API_KEY the app still starts and those calls fail instead.
+from services.openai_service import openai_service
+if os.getenv('OPENAI_API_KEY'):
+    openai_service.init_app(app)
+
+# Memory store and semantic search under /api/memory (limited mode
+# without FAISS and sentence-transformers); init_app logs via current_app
+from services.memory_service import memory_service
+with app.app_context():
+    memory_service.init_app(app)
+
+# Agent turns with parallel tool calls under /api/agent; the send_email
+# tool goes through email_service's pooled SMTP connections and the
+# run_workflow tool through n8n (N8N_BASE_URL)
+from services import n8n_service
+from services.tool_service import tool_service
+from services.email_service import email_service
+n8n_service.init_app(app)
+tool_service.init_app(app)
+email_service.init_app(app)
 
 # Create uploads directory
 with app.app_context():
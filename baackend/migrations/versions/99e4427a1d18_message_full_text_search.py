@@ -0,0 +1,89 @@
+"""message full-text search
+
+Revision ID: 99e4427a1d18
+Revises: df6a2832b1f6
+Create Date: 2026-10-19 12:31:04.118260
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '99e4427a1d18'
+down_revision = 'df6a2832b1f6'
+branch_labels = None
+depends_on = None
+
+# Same DDL as models/message.py runs for create_all
+SQLITE_FTS_CREATE = (
+    """
+    CREATE VIEW IF NOT EXISTS messages_fts_content AS
+    SELECT messages.id AS id, messages.content AS content, 'u' || conversations.user_id AS owner
+    FROM messages JOIN conversations ON conversations.id = messages.conversation_id
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        content, owner,
+        content='messages_fts_content', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content, owner)
+        SELECT new.id, new.content, 'u' || user_id FROM conversations WHERE id = new.conversation_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content, owner)
+        SELECT 'delete', old.id, old.content, 'u' || user_id FROM conversations WHERE id = old.conversation_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content, conversation_id ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content, owner)
+        SELECT 'delete', old.id, old.content, 'u' || user_id FROM conversations WHERE id = old.conversation_id;
+        INSERT INTO messages_fts(rowid, content, owner)
+        SELECT new.id, new.content, 'u' || user_id FROM conversations WHERE id = new.conversation_id;
+    END
+    """,
+)
+SQLITE_FTS_DROP = (
+    'DROP TRIGGER IF EXISTS messages_fts_update',
+    'DROP TRIGGER IF EXISTS messages_fts_delete',
+    'DROP TRIGGER IF EXISTS messages_fts_insert',
+    'DROP TABLE IF EXISTS messages_fts',
+    'DROP VIEW IF EXISTS messages_fts_content',
+)
+
+POSTGRES_FTS_CREATE = (
+    "CREATE INDEX IF NOT EXISTS ix_messages_content_fts ON messages "
+    "USING GIN (to_tsvector('english', content))",
+)
+POSTGRES_FTS_DROP = (
+    'DROP INDEX IF EXISTS ix_messages_content_fts',
+)
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_FTS_CREATE:
+            op.execute(statement)
+        # Index the messages that already exist
+        op.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        for statement in POSTGRES_FTS_CREATE:
+            op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_FTS_DROP:
+            op.execute(statement)
+    elif dialect == 'postgresql':
+        for statement in POSTGRES_FTS_DROP:
+            op.execute(statement)
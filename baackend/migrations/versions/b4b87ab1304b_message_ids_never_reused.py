@@ -0,0 +1,89 @@
+"""message ids never reused
+
+Revision ID: b4b87ab1304b
+Revises: 79e1fc1a9589
+Create Date: 2026-10-19 14:09:44.126941
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4b87ab1304b'
+down_revision = '79e1fc1a9589'
+branch_labels = None
+depends_on = None
+
+# Only SQLite reuses the ids of deleted rows (without AUTOINCREMENT); the
+# rebuild needs the message search view and triggers out of the way, same
+# DDL as 99e4427a1d18
+SQLITE_FTS_DEPENDENTS_DROP = (
+    'DROP TRIGGER IF EXISTS messages_fts_update',
+    'DROP TRIGGER IF EXISTS messages_fts_delete',
+    'DROP TRIGGER IF EXISTS messages_fts_insert',
+    'DROP VIEW IF EXISTS messages_fts_content',
+)
+SQLITE_FTS_DEPENDENTS_CREATE = (
+    """
+    CREATE VIEW IF NOT EXISTS messages_fts_content AS
+    SELECT messages.id AS id, messages.content AS content, 'u' || conversations.user_id AS owner
+    FROM messages JOIN conversations ON conversations.id = messages.conversation_id
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content, owner)
+        SELECT new.id, new.content, 'u' || user_id FROM conversations WHERE id = new.conversation_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content, owner)
+        SELECT 'delete', old.id, old.content, 'u' || user_id FROM conversations WHERE id = old.conversation_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content, conversation_id ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content, owner)
+        SELECT 'delete', old.id, old.content, 'u' || user_id FROM conversations WHERE id = old.conversation_id;
+        INSERT INTO messages_fts(rowid, content, owner)
+        SELECT new.id, new.content, 'u' || user_id FROM conversations WHERE id = new.conversation_id;
+    END
+    """,
+)
+
+TABLES = ('message_archives', 'messages')
+
+
+def rebuild(autoincrement):
+    for statement in SQLITE_FTS_DEPENDENTS_DROP:
+        op.execute(statement)
+    for table in TABLES:
+        with op.batch_alter_table(table, recreate='always',
+                                  table_kwargs={'sqlite_autoincrement': autoincrement}):
+            pass
+    for statement in SQLITE_FTS_DEPENDENTS_CREATE:
+        op.execute(statement)
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    rebuild(True)
+    # The copied rows set each sequence to the highest id left; tiered
+    # messages may have had higher ones
+    op.execute("""
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'messages', 0 WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'messages')
+    """)
+    op.execute("""
+        UPDATE sqlite_sequence
+        SET seq = MAX(seq, (SELECT COALESCE(MAX(last_message_id), 0) FROM message_archives))
+        WHERE name = 'messages'
+    """)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    rebuild(False)
@@ -12,6 +12,15 @@ def init_db(app):
     from .message import Message
     from .voice_agent import VoiceAgent
     from .call_log import CallLog
+    from .job import Job
+    from .message_archive import MessageArchive
+    from .lead_merge_suggestion import LeadMergeSuggestion
+    from .lead_facet import LeadFacet
+    from .call_rollup import CallRollup, CallDurationBin
+    from .telephony_event import TelephonyEvent
+    from .call_transcript_segment import CallTranscriptSegment
+    from .campaign import Campaign, CampaignLead
+    from .recording import Recording
     
     # Initialize the database with the app
     db.init_app(app)
@@ -29,3 +38,12 @@ from .conversation import Conversation
 from .message import Message
 from .voice_agent import VoiceAgent
 from .call_log import CallLog
+from .job import Job
+from .message_archive import MessageArchive
+from .lead_merge_suggestion import LeadMergeSuggestion
+from .lead_facet import LeadFacet
+from .call_rollup import CallRollup, CallDurationBin
+from .telephony_event import TelephonyEvent
+from .call_transcript_segment import CallTranscriptSegment
+from .campaign import Campaign, CampaignLead
+from .recording import Recording
@@ -3,18 +3,31 @@ from . import db
 
 class CallLog(db.Model):
     __tablename__ = 'call_logs'
+    __table_args__ = (
+        db.Index('ix_call_logs_user_id_created_at', 'user_id', 'created_at', 'id'),
+        db.Index('ix_call_logs_voice_agent_id_created_at', 'voice_agent_id', 'created_at'),
+        # Live calls per agent, for the campaign dialer's concurrency limit
+        db.Index('ix_call_logs_voice_agent_id_status', 'voice_agent_id', 'status'),
+        db.Index('ix_call_logs_lead_id', 'lead_id'),
+        db.Index('uq_call_logs_provider_call_id', 'provider_call_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     lead_id = db.Column(db.Integer, db.ForeignKey('leads.id'), nullable=True)
-    voice_agent_id = db.Column(db.Integer, db.ForeignKey('voice_agents.id'), nullable=True)
+    # Active history keeps the old agent, status and duration on change for the call rollups
+    voice_agent_id = db.column_property(db.Column(db.Integer, db.ForeignKey('voice_agents.id'), nullable=True),
+                                        active_history=True)
+    provider_call_id = db.Column(db.String(64), nullable=True)  # Telephony provider's id for the call
     from_number = db.Column(db.String(20), nullable=False)
     to_number = db.Column(db.String(20), nullable=False)
     direction = db.Column(db.String(10), nullable=False)  # inbound, outbound
-    status = db.Column(db.String(20), nullable=False)  # initiated, ringing, in-progress, completed, failed
-    duration = db.Column(db.Integer, default=0)  # in seconds
-    recording_url = db.Column(db.String(500), nullable=True)
-    transcription = db.Column(db.Text, nullable=True)
+    status = db.column_property(db.Column(db.String(20), nullable=False), active_history=True)  # initiated, ringing, in-progress, completed, failed, busy, no-answer, canceled
+    duration = db.column_property(db.Column(db.Integer, default=0), active_history=True)  # in seconds
+    recording_url = db.Column(db.String(500), nullable=True)  # Where the provider keeps the recording
+    recording_id = db.Column(db.Integer, nullable=True)  # Our stored copy (recordings.id)
+    transcription = db.Column(db.Text, nullable=True)  # Built from the transcript segments on read
+    transcript_segment_id = db.Column(db.Integer, nullable=True)  # Newest segment included in transcription
     call_metadata = db.Column('metadata', db.JSON, nullable=True)  # Additional call metadata
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     ended_at = db.Column(db.DateTime, nullable=True)
@@ -25,12 +38,14 @@ class CallLog(db.Model):
             'user_id': self.user_id,
             'lead_id': self.lead_id,
             'voice_agent_id': self.voice_agent_id,
+            'provider_call_id': self.provider_call_id,
             'from_number': self.from_number,
             'to_number': self.to_number,
             'direction': self.direction,
             'status': self.status,
             'duration': self.duration,
             'recording_url': self.recording_url,
+            'recording_id': self.recording_id,
             'transcription': self.transcription,
             'metadata': self.call_metadata,
             'created_at': self.created_at.isoformat() if self.created_at else None,
@@ -0,0 +1,57 @@
+from . import db
+
+class CallRollup(db.Model):
+    """
+    Calls per user, voice agent, hour or day bucket and status.
+
+    Kept up to date by the analytics service as call logs are written, so
+    reports sum a few rollup rows instead of scanning call_logs. Calls are
+    bucketed by created_at (UTC); voice_agent_id 0 collects calls without
+    an agent.
+    """
+    __tablename__ = 'call_rollups'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    period = db.Column(db.String(10), primary_key=True)  # hour, day
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    voice_agent_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    status = db.Column(db.String(20), primary_key=True)
+    calls = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    duration = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')  # Total seconds
+
+    def to_dict(self):
+        return {
+            'period': self.period,
+            'bucket_start': self.bucket_start.isoformat(),
+            'voice_agent_id': self.voice_agent_id or None,
+            'status': self.status,
+            'calls': self.calls,
+            'duration': self.duration
+        }
+
+
+class CallDurationBin(db.Model):
+    """
+    Duration sketch of the completed calls in a CallRollup bucket.
+
+    Each row counts the calls whose duration falls in one logarithmic bin
+    (see services.analytics_service.duration_bin). Bins add up across
+    agents and buckets, so percentiles of any range come from summing them.
+    """
+    __tablename__ = 'call_duration_bins'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    period = db.Column(db.String(10), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    voice_agent_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    bin = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    calls = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    def to_dict(self):
+        return {
+            'period': self.period,
+            'bucket_start': self.bucket_start.isoformat(),
+            'voice_agent_id': self.voice_agent_id or None,
+            'bin': self.bin,
+            'calls': self.calls
+        }
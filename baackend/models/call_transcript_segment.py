@@ -0,0 +1,95 @@
+from datetime import datetime
+from . import db
+
+# Full-text index over segment text, maintained by the database itself the
+# same way as the message index (see models/message.py). Segments are
+# append-only, so there is no update trigger.
+SQLITE_FTS_CREATE = (
+    """
+    CREATE VIEW IF NOT EXISTS transcript_fts_content AS
+    SELECT call_transcript_segments.id AS id, call_transcript_segments.text AS text,
+           'u' || call_logs.user_id AS owner
+    FROM call_transcript_segments JOIN call_logs ON call_logs.id = call_transcript_segments.call_log_id
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS transcript_fts USING fts5(
+        text, owner,
+        content='transcript_fts_content', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS transcript_fts_insert AFTER INSERT ON call_transcript_segments BEGIN
+        INSERT INTO transcript_fts(rowid, text, owner)
+        SELECT new.id, new.text, 'u' || user_id FROM call_logs WHERE id = new.call_log_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS transcript_fts_delete AFTER DELETE ON call_transcript_segments BEGIN
+        INSERT INTO transcript_fts(transcript_fts, rowid, text, owner)
+        SELECT 'delete', old.id, old.text, 'u' || user_id FROM call_logs WHERE id = old.call_log_id;
+    END
+    """,
+)
+SQLITE_FTS_DROP = (
+    'DROP TRIGGER IF EXISTS transcript_fts_delete',
+    'DROP TRIGGER IF EXISTS transcript_fts_insert',
+    'DROP TABLE IF EXISTS transcript_fts',
+    'DROP VIEW IF EXISTS transcript_fts_content',
+)
+
+POSTGRES_FTS_CREATE = (
+    "CREATE INDEX IF NOT EXISTS ix_call_transcript_segments_text_fts ON call_transcript_segments "
+    "USING GIN (to_tsvector('english', text))",
+)
+POSTGRES_FTS_DROP = (
+    'DROP INDEX IF EXISTS ix_call_transcript_segments_text_fts',
+)
+
+class CallTranscriptSegment(db.Model):
+    """
+    One utterance of a call transcript, appended while the call is live.
+
+    Segments are only ever inserted; (call_log_id, seq) is unique, so a
+    transcriber retrying an append does not duplicate text. The full
+    transcript in CallLog.transcription is rebuilt from the segments when
+    it is read after new ones arrived (see TranscriptService).
+    """
+    __tablename__ = 'call_transcript_segments'
+    __table_args__ = (
+        db.Index('uq_call_transcript_segments_call_log_id_seq', 'call_log_id', 'seq', unique=True),
+        # Streaming and staleness checks read a call's segments in arrival order
+        db.Index('ix_call_transcript_segments_call_log_id_id', 'call_log_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    call_log_id = db.Column(db.Integer, db.ForeignKey('call_logs.id'), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)  # Position in the call, assigned by the transcriber
+    speaker = db.Column(db.String(20), nullable=True)  # agent, caller
+    start_ms = db.Column(db.Integer, nullable=True)  # Offset from the start of the call
+    end_ms = db.Column(db.Integer, nullable=True)
+    text = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'call_log_id': self.call_log_id,
+            'seq': self.seq,
+            'speaker': self.speaker,
+            'start_ms': self.start_ms,
+            'end_ms': self.end_ms,
+            'text': self.text,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+for _statement in SQLITE_FTS_CREATE:
+    db.event.listen(CallTranscriptSegment.__table__, 'after_create', db.DDL(_statement).execute_if(dialect='sqlite'))
+for _statement in SQLITE_FTS_DROP:
+    db.event.listen(CallTranscriptSegment.__table__, 'before_drop', db.DDL(_statement).execute_if(dialect='sqlite'))
+for _statement in POSTGRES_FTS_CREATE:
+    db.event.listen(CallTranscriptSegment.__table__, 'after_create',
+                    db.DDL(_statement).execute_if(dialect='postgresql'))
+for _statement in POSTGRES_FTS_DROP:
+    db.event.listen(CallTranscriptSegment.__table__, 'before_drop', db.DDL(_statement).execute_if(dialect='postgresql'))
@@ -0,0 +1,99 @@
+from datetime import datetime
+from . import db
+
+class Campaign(db.Model):
+    """
+    An outbound calling campaign: the leads matching lead_filter are called
+    by one voice agent, paced and limited by the settings below.
+
+    The campaign dialer (scripts/campaign_dialer.py) runs campaigns whose
+    status is running; see CampaignService for the scheduling rules.
+    """
+    __tablename__ = 'campaigns'
+    __table_args__ = (
+        db.Index('ix_campaigns_user_id_created_at', 'user_id', 'created_at', 'id'),
+        # The dialer looks up running campaigns every tick
+        db.Index('ix_campaigns_status_completed_at', 'status', 'completed_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    voice_agent_id = db.Column(db.Integer, db.ForeignKey('voice_agents.id'), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='draft')  # draft, running, paused, completed, canceled
+    lead_filter = db.Column(db.JSON, nullable=True)  # Same parameters as the lead list filters
+    from_number = db.Column(db.String(20), nullable=True)  # Defaults to TELEPHONY_FROM_NUMBER
+    calls_per_minute = db.Column(db.Integer, nullable=False, default=30)  # Pacing
+    max_concurrent_calls = db.Column(db.Integer, nullable=False, default=5)  # Live calls on the agent
+    timezone = db.Column(db.String(50), nullable=False, default='UTC')  # For the calling hours
+    calling_hours = db.Column(db.JSON, nullable=True)  # {"days": [0-6, Monday=0], "start": "09:00", "end": "17:00"}
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)  # Calls per lead, retries included
+    retry_delay_minutes = db.Column(db.Integer, nullable=False, default=60)
+    retry_statuses = db.Column(db.JSON, nullable=True)  # Call outcomes worth retrying
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'voice_agent_id': self.voice_agent_id,
+            'name': self.name,
+            'status': self.status,
+            'lead_filter': self.lead_filter,
+            'from_number': self.from_number,
+            'calls_per_minute': self.calls_per_minute,
+            'max_concurrent_calls': self.max_concurrent_calls,
+            'timezone': self.timezone,
+            'calling_hours': self.calling_hours,
+            'max_attempts': self.max_attempts,
+            'retry_delay_minutes': self.retry_delay_minutes,
+            'retry_statuses': self.retry_statuses,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+
+class CampaignLead(db.Model):
+    """
+    One lead's progress through a campaign.
+
+    Enrolled when the campaign starts. The dialer claims pending leads
+    whose next_attempt_at has passed, and moves each one back to pending
+    (for a retry), to completed or to failed once its call has ended.
+    """
+    __tablename__ = 'campaign_leads'
+    __table_args__ = (
+        db.Index('uq_campaign_leads_campaign_id_lead_id', 'campaign_id', 'lead_id', unique=True),
+        # Claiming (pending, due first) and the progress counts per status
+        db.Index('ix_campaign_leads_campaign_id_status', 'campaign_id', 'status', 'next_attempt_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    campaign_id = db.Column(db.Integer, db.ForeignKey('campaigns.id'), nullable=False)
+    lead_id = db.Column(db.Integer, db.ForeignKey('leads.id'), nullable=False)
+    to_number = db.Column(db.String(20), nullable=False)  # The lead's phone when enrolled
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, dialing, completed, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    call_log_id = db.Column(db.Integer, db.ForeignKey('call_logs.id'), nullable=True)  # Latest call
+    last_call_status = db.Column(db.String(20), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'campaign_id': self.campaign_id,
+            'lead_id': self.lead_id,
+            'to_number': self.to_number,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'call_log_id': self.call_log_id,
+            'last_call_status': self.last_call_status,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -3,18 +3,34 @@ from . import db
 
 class Conversation(db.Model):
     __tablename__ = 'conversations'
+    __table_args__ = (
+        db.Index('ix_conversations_user_id_updated_at', 'user_id', 'updated_at', 'id'),
+        db.Index('ix_conversations_archived_at', 'archived_at'),
+        db.Index('uq_conversations_user_id_external_id', 'user_id', 'external_id', unique=True),
+        db.Index('ix_conversations_lead_id', 'lead_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     lead_id = db.Column(db.Integer, db.ForeignKey('leads.id'), nullable=True)
+    external_id = db.Column(db.String(100), nullable=True)  # Id on the platform it was imported from
     title = db.Column(db.String(200), nullable=True)
     channel = db.Column(db.String(20), default='chat')  # chat, voice, email, etc.
     status = db.Column(db.String(20), default='active')  # active, closed, archived
+    summary = db.Column(db.Text, nullable=True)  # Running summary of older messages
+    summary_message_id = db.Column(db.Integer, nullable=True)  # Last message folded into the summary
+    # Denormalized from messages; maintained by the Message insert/delete listeners
+    message_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_message_at = db.Column(db.DateTime, nullable=True)
+    last_message_preview = db.Column(db.String(200), nullable=True)
+    archived_at = db.Column(db.DateTime, nullable=True)  # When status became closed/archived
+    cold_storage_at = db.Column(db.DateTime, nullable=True)  # When its messages moved to message_archives
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     messages = db.relationship('Message', backref='conversation', lazy=True, cascade='all, delete-orphan')
+    archives = db.relationship('MessageArchive', backref='conversation', lazy=True, cascade='all, delete-orphan')
     
     def to_dict(self):
         return {
@@ -26,5 +42,20 @@ class Conversation(db.Model):
             'status': self.status,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
-            'message_count': len(self.messages)
+            'message_count': self.message_count or 0,
+            'last_message_at': self.last_message_at.isoformat() if self.last_message_at else None,
+            'last_message_preview': self.last_message_preview,
+            'archived_at': self.archived_at.isoformat() if self.archived_at else None,
+            'cold_storage': self.cold_storage_at is not None
         }
+
+
+ARCHIVED_STATUSES = ('closed', 'archived')
+
+@db.event.listens_for(Conversation.status, 'set')
+def _status_changed(target, value, oldvalue, initiator):
+    """Track when a conversation was closed or archived; cold storage tiering ages from it"""
+    if value in ARCHIVED_STATUSES and oldvalue not in ARCHIVED_STATUSES:
+        target.archived_at = datetime.utcnow()
+    elif value not in ARCHIVED_STATUSES:
+        target.archived_at = None
@@ -0,0 +1,36 @@
+from typing import Dict, List, Sequence
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+def add_counts(connection, table, key_columns: Sequence[str], rows: List[Dict]):
+    """
+    Add each row's counter columns (every column not in `key_columns`) to
+    the row with the same key, inserting rows seen for the first time.
+
+    One upsert on SQLite and Postgres; elsewhere an UPDATE per row with an
+    INSERT when it matched nothing. Rows are written in key order so that
+    concurrent writers lock them in the same order.
+    """
+    if not rows:
+        return
+    rows = sorted(rows, key=lambda row: tuple(row[column] for column in key_columns))
+    counters = [column for column in rows[0] if column not in key_columns]
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+        connection.execute(
+            insert.on_conflict_do_update(
+                index_elements=[table.c[column] for column in key_columns],
+                set_={column: table.c[column] + insert.excluded[column] for column in counters}
+            ),
+            rows
+        )
+        return
+    for row in rows:
+        result = connection.execute(
+            table.update()
+            .where(*[table.c[column] == row[column] for column in key_columns])
+            .values(**{column: table.c[column] + row[column] for column in counters})
+        )
+        if not result.rowcount:
+            connection.execute(table.insert().values(**row))
@@ -0,0 +1,40 @@
+from datetime import datetime
+from . import db
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # Claiming scans ready jobs in id order
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at', 'id'),
+        # Ordering check: is there an earlier unfinished job with the same key?
+        db.Index('ix_jobs_queue_key_status', 'queue_key', 'status', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # Name of the registered handler
+    queue_key = db.Column(db.String(100), nullable=True)  # Jobs sharing a key run one at a time, in order
+    payload = db.Column(db.JSON, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Not claimed before this time
+    locked_by = db.Column(db.String(64), nullable=True)  # Claim token of the worker running it
+    locked_until = db.Column(db.DateTime, nullable=True)  # Lease; requeued if the worker dies
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'queue_key': self.queue_key,
+            'payload': self.payload,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at.isoformat() if self.run_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat()
+        }
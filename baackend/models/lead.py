@@ -3,6 +3,13 @@ from . import db
 
 class Lead(db.Model):
     __tablename__ = 'leads'
+    __table_args__ = (
+        db.Index('ix_leads_user_id_updated_at', 'user_id', 'updated_at', 'id'),
+        db.Index('uq_leads_user_id_email', 'user_id', 'email', unique=True),
+        db.Index('ix_leads_user_id_score', 'user_id', 'score', 'id'),
+        db.Index('ix_leads_user_id_created_at', 'user_id', 'created_at', 'id'),
+        db.Index('ix_leads_user_id_name', 'user_id', 'name', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -10,9 +17,12 @@ class Lead(db.Model):
     email = db.Column(db.String(120), nullable=True)
     phone = db.Column(db.String(20), nullable=True)
     company = db.Column(db.String(100), nullable=True)
-    status = db.Column(db.String(20), default='new')  # new, contacted, qualified, converted, lost
-    source = db.Column(db.String(50), default='web')  # web, referral, call, etc.
-    score = db.Column(db.Integer, default=0)  # Lead score
+    # Active history keeps the old value on change for the lead_facets counts
+    status = db.column_property(db.Column(db.String(20), default='new'), active_history=True)  # new, contacted, qualified, converted, lost
+    source = db.column_property(db.Column(db.String(50), default='web'), active_history=True)  # web, referral, call, etc.
+    score = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Lead score, kept up to date by the scoring service
+    engagement = db.Column(db.Float, nullable=False, default=0.0, server_default='0')  # Decaying event points
+    engagement_at = db.Column(db.DateTime, nullable=True)  # When engagement was last computed; null until scored
     notes = db.Column(db.Text, nullable=True)
     last_contacted = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
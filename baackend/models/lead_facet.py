@@ -0,0 +1,102 @@
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+from . import db
+from .counters import add_counts
+from .lead import Lead
+
+# Lead columns with per-user counts kept in lead_facets
+FACET_FIELDS = ('status', 'source')
+
+class LeadFacet(db.Model):
+    """
+    Number of a user's leads per status and per source.
+
+    Maintained incrementally: the Lead listeners below adjust it on every
+    ORM insert, delete and status/source change, and bulk writers that go
+    through Core call adjust_lead_facets themselves. The lead list reads
+    its facet counts from here instead of grouping the leads table.
+    """
+    __tablename__ = 'lead_facets'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    field = db.Column(db.String(20), primary_key=True)  # status, source
+    value = db.Column(db.String(50), primary_key=True)  # '' stands for leads without one
+    count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    def to_dict(self):
+        return {
+            'field': self.field,
+            'value': self.value or None,
+            'count': self.count
+        }
+
+
+def facet_changes(old: Optional[Dict[str, Optional[str]]], new: Optional[Dict[str, Optional[str]]]) -> Counter:
+    """
+    Facet deltas for one lead going from `old` to `new` field values;
+    None for `old` means it was created and for `new` that it was deleted.
+    """
+    changes = Counter()
+    for field in FACET_FIELDS:
+        before = (old or {}).get(field) or ''
+        after = (new or {}).get(field) or ''
+        if old is not None and new is not None and before == after:
+            continue
+        if old is not None:
+            changes[(field, before)] -= 1
+        if new is not None:
+            changes[(field, after)] += 1
+    return changes
+
+
+def adjust_lead_facets(connection, user_id: int, changes: Dict[Tuple[str, str], int]):
+    """
+    Add `changes` ({(field, value): delta}) to a user's facet counts in the
+    connection's transaction, creating counts seen for the first time.
+    """
+    add_counts(connection, LeadFacet.__table__, ('user_id', 'field', 'value'), [
+        {'user_id': int(user_id), 'field': field, 'value': (value or '')[:50], 'count': delta}
+        for (field, value), delta in changes.items() if delta
+    ])
+
+
+def rebuild_lead_facets(connection, user_ids: Optional[Iterable[int]] = None):
+    """Recount facets from the leads table, for all users or just `user_ids`"""
+    facets, leads = LeadFacet.__table__, Lead.__table__
+    user_ids = None if user_ids is None else [int(user_id) for user_id in user_ids]
+    delete = facets.delete()
+    if user_ids is not None:
+        delete = delete.where(facets.c.user_id.in_(user_ids))
+    connection.execute(delete)
+    for field in FACET_FIELDS:
+        value = db.func.coalesce(leads.c[field], '')
+        counts = db.select(leads.c.user_id, db.literal(field), value, db.func.count())\
+                   .group_by(leads.c.user_id, value)
+        if user_ids is not None:
+            counts = counts.where(leads.c.user_id.in_(user_ids))
+        connection.execute(facets.insert().from_select(['user_id', 'field', 'value', 'count'], counts))
+
+
+def _facet_values(target):
+    return {field: getattr(target, field) for field in FACET_FIELDS}
+
+
+@db.event.listens_for(Lead, 'after_insert')
+def _lead_inserted(mapper, connection, target):
+    adjust_lead_facets(connection, target.user_id, facet_changes(None, _facet_values(target)))
+
+@db.event.listens_for(Lead, 'after_delete')
+def _lead_deleted(mapper, connection, target):
+    adjust_lead_facets(connection, target.user_id, facet_changes(_facet_values(target), None))
+
+@db.event.listens_for(Lead, 'after_update')
+def _lead_updated(mapper, connection, target):
+    """Move the lead between facet values when its status or source changed"""
+    state = db.inspect(target)
+    old = {}
+    for field in FACET_FIELDS:
+        history = state.attrs[field].history
+        # Status and source have active history, so the old value is loaded
+        # before it is overwritten even when the attribute was expired
+        old[field] = history.deleted[0] if history.deleted else getattr(target, field)
+    adjust_lead_facets(connection, target.user_id, facet_changes(old, _facet_values(target)))
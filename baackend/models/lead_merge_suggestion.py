@@ -0,0 +1,34 @@
+from datetime import datetime
+from . import db
+
+class LeadMergeSuggestion(db.Model):
+    __tablename__ = 'lead_merge_suggestions'
+    __table_args__ = (
+        # Review list: a user's open suggestions, best first
+        db.Index('ix_lead_merge_suggestions_user_id_status_score', 'user_id', 'status', 'score', 'id'),
+        db.Index('uq_lead_merge_suggestions_pair', 'lead_id', 'duplicate_id', unique=True),
+        db.Index('ix_lead_merge_suggestions_duplicate_id', 'duplicate_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    lead_id = db.Column(db.Integer, db.ForeignKey('leads.id'), nullable=False)  # Lead to keep
+    duplicate_id = db.Column(db.Integer, db.ForeignKey('leads.id'), nullable=False)  # Lead to merge into it
+    score = db.Column(db.Float, nullable=False)  # 0..1, higher is more certain
+    reasons = db.Column(db.JSON, nullable=True)  # Matching evidence, e.g. ["phone", "name"]
+    status = db.Column(db.String(20), nullable=False, default='open')  # open, dismissed
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    lead = db.relationship('Lead', foreign_keys=[lead_id], lazy='joined')
+    duplicate = db.relationship('Lead', foreign_keys=[duplicate_id], lazy='joined')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'lead': self.lead.to_dict() if self.lead else None,
+            'duplicate': self.duplicate.to_dict() if self.duplicate else None,
+            'score': self.score,
+            'reasons': self.reasons or [],
+            'status': self.status,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -1,8 +1,73 @@
 from datetime import datetime
-from . import db, Base
+from . import db
+from .conversation import Conversation
 
-class Message(Base, db.Model):
+PREVIEW_LENGTH = 200
+
+# Full-text index over message content, maintained by the database itself.
+# SQLite: an FTS5 index using a view as its external content, so message
+# text is not stored twice. The view adds the owner as a "u<user_id>" token,
+# which lets a search intersect the user's posting list inside FTS5 instead
+# of filtering matches afterwards.
+SQLITE_FTS_CREATE = (
+    """
+    CREATE VIEW IF NOT EXISTS messages_fts_content AS
+    SELECT messages.id AS id, messages.content AS content, 'u' || conversations.user_id AS owner
+    FROM messages JOIN conversations ON conversations.id = messages.conversation_id
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        content, owner,
+        content='messages_fts_content', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content, owner)
+        SELECT new.id, new.content, 'u' || user_id FROM conversations WHERE id = new.conversation_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content, owner)
+        SELECT 'delete', old.id, old.content, 'u' || user_id FROM conversations WHERE id = old.conversation_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content, conversation_id ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content, owner)
+        SELECT 'delete', old.id, old.content, 'u' || user_id FROM conversations WHERE id = old.conversation_id;
+        INSERT INTO messages_fts(rowid, content, owner)
+        SELECT new.id, new.content, 'u' || user_id FROM conversations WHERE id = new.conversation_id;
+    END
+    """,
+)
+SQLITE_FTS_DROP = (
+    'DROP TRIGGER IF EXISTS messages_fts_update',
+    'DROP TRIGGER IF EXISTS messages_fts_delete',
+    'DROP TRIGGER IF EXISTS messages_fts_insert',
+    'DROP TABLE IF EXISTS messages_fts',
+    'DROP VIEW IF EXISTS messages_fts_content',
+)
+
+# Postgres: a GIN expression index; search queries repeat the same expression
+POSTGRES_FTS_CREATE = (
+    "CREATE INDEX IF NOT EXISTS ix_messages_content_fts ON messages "
+    "USING GIN (to_tsvector('english', content))",
+)
+POSTGRES_FTS_DROP = (
+    'DROP INDEX IF EXISTS ix_messages_content_fts',
+)
+
+class Message(db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        db.Index('ix_messages_conversation_id_created_at', 'conversation_id', 'created_at', 'id'),
+        db.Index('ix_messages_conversation_id_id', 'conversation_id', 'id'),
+        # Ids of tiered and deleted messages are never handed out again
+        {'sqlite_autoincrement': True},
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id'), nullable=False)
@@ -20,3 +85,57 @@ class Message(Base, db.Model):
             'metadata': self.message_metadata,
             'created_at': self.created_at.isoformat()
         }
+
+
+@db.event.listens_for(Message, 'after_insert')
+def _message_inserted(mapper, connection, target):
+    """Bump the parent conversation's counters in the same transaction"""
+    conversations = Conversation.__table__
+    is_latest = db.or_(
+        conversations.c.last_message_at.is_(None),
+        conversations.c.last_message_at <= target.created_at
+    )
+    connection.execute(
+        conversations.update()
+        .where(conversations.c.id == target.conversation_id)
+        .values(
+            message_count=conversations.c.message_count + 1,
+            last_message_at=db.case((is_latest, target.created_at), else_=conversations.c.last_message_at),
+            last_message_preview=db.case(
+                (is_latest, target.content[:PREVIEW_LENGTH]),
+                else_=conversations.c.last_message_preview
+            )
+        )
+    )
+
+@db.event.listens_for(Message, 'after_delete')
+def _message_deleted(mapper, connection, target):
+    """Decrement the count and re-derive the last message from what remains"""
+    conversations = Conversation.__table__
+    messages = Message.__table__
+    latest = db.select(messages.c.created_at, messages.c.content)\
+               .where(messages.c.conversation_id == target.conversation_id)\
+               .order_by(messages.c.created_at.desc(), messages.c.id.desc())\
+               .limit(1)\
+               .subquery()
+    connection.execute(
+        conversations.update()
+        .where(conversations.c.id == target.conversation_id)
+        .values(
+            message_count=db.case(
+                (conversations.c.message_count > 0, conversations.c.message_count - 1),
+                else_=0
+            ),
+            last_message_at=db.select(latest.c.created_at).scalar_subquery(),
+            last_message_preview=db.select(db.func.substr(latest.c.content, 1, PREVIEW_LENGTH)).scalar_subquery()
+        )
+    )
+
+for _statement in SQLITE_FTS_CREATE:
+    db.event.listen(Message.__table__, 'after_create', db.DDL(_statement).execute_if(dialect='sqlite'))
+for _statement in SQLITE_FTS_DROP:
+    db.event.listen(Message.__table__, 'before_drop', db.DDL(_statement).execute_if(dialect='sqlite'))
+for _statement in POSTGRES_FTS_CREATE:
+    db.event.listen(Message.__table__, 'after_create', db.DDL(_statement).execute_if(dialect='postgresql'))
+for _statement in POSTGRES_FTS_DROP:
+    db.event.listen(Message.__table__, 'before_drop', db.DDL(_statement).execute_if(dialect='postgresql'))
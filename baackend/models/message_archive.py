@@ -0,0 +1,34 @@
+from datetime import datetime
+from . import db
+
+class MessageArchive(db.Model):
+    """A compressed segment of messages moved out of the hot messages table"""
+    __tablename__ = 'message_archives'
+    __table_args__ = (
+        db.Index('ix_message_archives_conversation_id_first_message_id', 'conversation_id', 'first_message_id'),
+        # Decoded segments are cached by id, so ids must not be reused
+        {'sqlite_autoincrement': True},
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id'), nullable=False)
+    first_message_id = db.Column(db.Integer, nullable=False)
+    last_message_id = db.Column(db.Integer, nullable=False)
+    message_count = db.Column(db.Integer, nullable=False)
+    codec = db.Column(db.String(20), nullable=False)  # zlib, zstd
+    raw_size = db.Column(db.Integer, nullable=False)  # Bytes before compression
+    data = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'conversation_id': self.conversation_id,
+            'first_message_id': self.first_message_id,
+            'last_message_id': self.last_message_id,
+            'message_count': self.message_count,
+            'codec': self.codec,
+            'raw_size': self.raw_size,
+            'compressed_size': len(self.data) if self.data is not None else None,
+            'created_at': self.created_at.isoformat()
+        }
@@ -0,0 +1,29 @@
+from datetime import datetime
+from . import db
+
+class Recording(db.Model):
+    """
+    A stored call recording, addressed by the SHA-256 of its bytes.
+
+    The file lives at <RECORDING_STORAGE_DIR>/objects/<aa>/<bb>/<sha256>;
+    identical audio is stored once however many calls point at it.
+    """
+    __tablename__ = 'recordings'
+    __table_args__ = (
+        db.Index('uq_recordings_sha256', 'sha256', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False)  # Hex digest of the file
+    size = db.Column(db.BigInteger, nullable=False)  # in bytes
+    content_type = db.Column(db.String(100), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sha256': self.sha256,
+            'size': self.size,
+            'content_type': self.content_type,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -0,0 +1,45 @@
+from datetime import datetime
+from . import db
+
+class TelephonyEvent(db.Model):
+    """
+    Inbox of call status webhooks from the telephony provider.
+
+    The webhook endpoint only inserts here (a provider event id is stored
+    once, so redeliveries are dropped) and the telephony writer applies
+    unprocessed events to call_logs in batches. Processed events are kept
+    for the dedup window and then pruned.
+    """
+    __tablename__ = 'telephony_events'
+    __table_args__ = (
+        db.Index('uq_telephony_events_event_id', 'event_id', unique=True),
+        # The writer claims unprocessed events in arrival order and prunes old ones
+        db.Index('ix_telephony_events_processed_at', 'processed_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.String(100), nullable=False)  # Provider's event id
+    provider_call_id = db.Column(db.String(64), nullable=False)  # Provider's call id
+    call_log_id = db.Column(db.Integer, nullable=True)  # Our call id, when we passed it to the provider
+    status = db.Column(db.String(20), nullable=True)  # Null for events that only carry e.g. a recording
+    duration = db.Column(db.Integer, nullable=True)  # in seconds
+    recording_url = db.Column(db.String(500), nullable=True)
+    occurred_at = db.Column(db.DateTime, nullable=False)  # Provider timestamp
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)
+    outcome = db.Column(db.String(20), nullable=True)  # applied, stale, unmatched
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'event_id': self.event_id,
+            'provider_call_id': self.provider_call_id,
+            'call_log_id': self.call_log_id,
+            'status': self.status,
+            'duration': self.duration,
+            'recording_url': self.recording_url,
+            'occurred_at': self.occurred_at.isoformat(),
+            'received_at': self.received_at.isoformat() if self.received_at else None,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None,
+            'outcome': self.outcome
+        }
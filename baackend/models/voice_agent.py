@@ -3,6 +3,9 @@ from . import db
 
 class VoiceAgent(db.Model):
     __tablename__ = 'voice_agents'
+    __table_args__ = (
+        db.Index('ix_voice_agents_user_id_updated_at', 'user_id', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
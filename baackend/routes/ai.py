@@ -0,0 +1,13 @@
+from flask import Blueprint
+from services.openai_service import create_openai_routes
+from services.metrics_service import create_metrics_routes
+from services.memory_service import create_memory_routes
+from services.tool_service import create_tool_routes
+
+# Routes defined next to their services (create_*_routes), mounted under /api
+ai_bp = Blueprint('ai', __name__)
+
+create_openai_routes(ai_bp)
+create_metrics_routes(ai_bp)
+create_memory_routes(ai_bp)
+create_tool_routes(ai_bp)
@@ -0,0 +1,121 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from models import db, Campaign, VoiceAgent
+from services.campaign_service import campaign_service, validate_campaign, InvalidCampaign
+from .pagination import keyset_page, InvalidCursor
+
+campaign_bp = Blueprint('campaigns', __name__)
+
+# Settings that can still change once a campaign has started (while paused)
+PAUSED_FIELDS = ('name', 'from_number', 'calls_per_minute', 'max_concurrent_calls', 'timezone',
+                 'calling_hours', 'max_attempts', 'retry_delay_minutes', 'retry_statuses')
+
+def _campaign_response(campaign):
+    return {**campaign.to_dict(), 'progress': campaign_service.progress(campaign.id)}
+
+@campaign_bp.route('', methods=['GET'])
+@jwt_required()
+def get_campaigns():
+    user_id = get_jwt_identity()
+    query = Campaign.query.filter_by(user_id=user_id)
+    try:
+        campaigns, pagination = keyset_page(query, Campaign.created_at, Campaign.id)
+    except InvalidCursor as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({
+        'data': [campaign.to_dict() for campaign in campaigns],
+        'pagination': pagination
+    }), 200
+
+@campaign_bp.route('', methods=['POST'])
+@jwt_required()
+def create_campaign():
+    """
+    Create a draft campaign.
+    
+    Required: name and voice_agent_id. Optional: lead_filter (the lead list
+    filters: status, source, min_score, max_score, contacted_after,
+    contacted_before, q), from_number, calls_per_minute,
+    max_concurrent_calls, timezone, calling_hours ({"days": [0-6],
+    "start": "09:00", "end": "17:00"}), max_attempts, retry_delay_minutes
+    and retry_statuses.
+    """
+    user_id = get_jwt_identity()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'message': 'No data provided'}), 400
+    try:
+        values = validate_campaign(data)
+    except InvalidCampaign as e:
+        return jsonify({'message': str(e)}), 400
+    if not VoiceAgent.query.filter_by(id=values['voice_agent_id'], user_id=user_id).first():
+        return jsonify({'message': 'Voice agent not found'}), 400
+    
+    campaign = Campaign(user_id=user_id, status='draft', **values)
+    db.session.add(campaign)
+    db.session.commit()
+    
+    return jsonify(_campaign_response(campaign)), 201
+
+@campaign_bp.route('/<int:campaign_id>', methods=['GET'])
+@jwt_required()
+def get_campaign(campaign_id):
+    """The campaign with its progress: leads per status and calls placed"""
+    user_id = get_jwt_identity()
+    campaign = Campaign.query.filter_by(id=campaign_id, user_id=user_id).first_or_404()
+    return jsonify(_campaign_response(campaign))
+
+@campaign_bp.route('/<int:campaign_id>', methods=['PUT'])
+@jwt_required()
+def update_campaign(campaign_id):
+    """Change a draft campaign, or the pacing and calling rules of a paused one"""
+    user_id = get_jwt_identity()
+    campaign = Campaign.query.filter_by(id=campaign_id, user_id=user_id).first_or_404()
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'message': 'No data provided'}), 400
+    try:
+        values = validate_campaign(data, partial=True)
+    except InvalidCampaign as e:
+        return jsonify({'message': str(e)}), 400
+    if campaign.status not in ('draft', 'paused'):
+        return jsonify({'message': f'A {campaign.status} campaign cannot be changed'}), 400
+    if campaign.status == 'paused' and set(values) - set(PAUSED_FIELDS):
+        return jsonify({'message': 'Only pacing and calling rules can change after a campaign started'}), 400
+    if 'voice_agent_id' in values and not VoiceAgent.query.filter_by(id=values['voice_agent_id'],
+                                                                     user_id=user_id).first():
+        return jsonify({'message': 'Voice agent not found'}), 400
+    
+    for field, value in values.items():
+        setattr(campaign, field, value)
+    db.session.commit()
+    
+    return jsonify(_campaign_response(campaign))
+
+def _change_status(campaign_id, change):
+    user_id = get_jwt_identity()
+    campaign = Campaign.query.filter_by(id=campaign_id, user_id=user_id).first_or_404()
+    try:
+        change(campaign)
+    except InvalidCampaign as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify(_campaign_response(campaign))
+
+@campaign_bp.route('/<int:campaign_id>/start', methods=['POST'])
+@jwt_required()
+def start_campaign(campaign_id):
+    """Start dialing; the first start enrolls the leads matching the filter"""
+    return _change_status(campaign_id, campaign_service.start)
+
+@campaign_bp.route('/<int:campaign_id>/pause', methods=['POST'])
+@jwt_required()
+def pause_campaign(campaign_id):
+    """Stop placing new calls until started again; live calls carry on"""
+    return _change_status(campaign_id, campaign_service.pause)
+
+@campaign_bp.route('/<int:campaign_id>/cancel', methods=['POST'])
+@jwt_required()
+def cancel_campaign(campaign_id):
+    """Stop placing calls for good"""
+    return _change_status(campaign_id, campaign_service.cancel)
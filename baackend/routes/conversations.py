@@ -1,7 +1,15 @@
-from flask import Blueprint, request, jsonify
+import json
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, Conversation, Message, User
 from datetime import datetime
+from services.pubsub_service import pubsub_service
+from services.agent_reply_service import agent_reply_service
+from services.search_service import search_service, InvalidSearchQuery
+from services.tiering_service import tiering_service
+from services.import_service import import_service
+from .pagination import keyset_page, keyset_page_items, InvalidCursor, DEFAULT_LIMIT, MAX_LIMIT
+from .streaming import stream_response, last_event_id
 
 conversation_bp = Blueprint('conversations', __name__)
 
@@ -9,8 +17,15 @@ conversation_bp = Blueprint('conversations', __name__)
 @jwt_required()
 def get_conversations():
     user_id = get_jwt_identity()
-    conversations = Conversation.query.filter_by(user_id=user_id).order_by(Conversation.updated_at.desc()).all()
-    return jsonify([conv.to_dict() for conv in conversations]), 200
+    query = Conversation.query.filter_by(user_id=user_id)
+    try:
+        conversations, pagination = keyset_page(query, Conversation.updated_at, Conversation.id)
+    except InvalidCursor as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({
+        'data': [conv.to_dict() for conv in conversations],
+        'pagination': pagination
+    }), 200
 
 @conversation_bp.route('', methods=['POST'])
 @jwt_required()
@@ -31,6 +46,55 @@ def create_conversation():
     
     return jsonify(conversation.to_dict()), 201
 
+@conversation_bp.route('/import', methods=['POST'])
+@jwt_required()
+def import_conversations():
+    """
+    Bulk import conversations and messages from an NDJSON request body.
+    
+    Batches are committed while the body streams in. The response is NDJSON
+    as well: a progress line after every batch and a final summary line
+    with "done": true.
+    """
+    user_id = get_jwt_identity()
+    batch_size = request.args.get('batch_size', type=int)
+    
+    def generate():
+        for report in import_service.iter_import_conversations(request.stream, user_id, batch_size):
+            yield json.dumps(report) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@conversation_bp.route('/search', methods=['GET'])
+@jwt_required()
+def search_messages():
+    """Ranked full-text search over the user's messages"""
+    user_id = get_jwt_identity()
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'message': 'Search query (q) is required'}), 400
+    
+    limit = max(1, min(request.args.get('limit', 20, type=int), MAX_LIMIT))
+    offset = max(0, request.args.get('offset', 0, type=int))
+    try:
+        results = search_service.search_messages(
+            user_id, query, limit=limit + 1, offset=offset,
+            conversation_id=request.args.get('conversation_id', type=int)
+        )
+    except InvalidSearchQuery as e:
+        return jsonify({'message': str(e)}), 400
+    
+    has_more = len(results) > limit
+    return jsonify({
+        'data': results[:limit],
+        'pagination': {
+            'limit': limit,
+            'offset': offset,
+            'next_offset': offset + limit if has_more else None,
+            'has_more': has_more
+        }
+    })
+
 @conversation_bp.route('/<int:conversation_id>', methods=['GET'])
 @jwt_required()
 def get_conversation(conversation_id):
@@ -47,6 +111,9 @@ def update_conversation(conversation_id):
     data = request.get_json()
     if 'status' in data:
         conversation.status = data['status']
+        if conversation.status == 'active':
+            # Reopened: bring its messages back from cold storage
+            tiering_service.rehydrate(conversation)
     if 'title' in data:
         conversation.title = data['title']
     
@@ -59,11 +126,44 @@ def get_messages(conversation_id):
     user_id = get_jwt_identity()
     conversation = Conversation.query.filter_by(id=conversation_id, user_id=user_id).first_or_404()
     
-    messages = Message.query.filter_by(conversation_id=conversation_id)\
-                          .order_by(Message.created_at.asc())\
-                          .all()
+    query = Message.query.filter_by(conversation_id=conversation_id)
+    cold = conversation.cold_storage_at is not None
+    
+    # Incremental sync: only messages newer than the last one the client has
+    since = request.args.get('since', type=int)
+    if since is not None:
+        limit = max(1, min(request.args.get('limit', DEFAULT_LIMIT, type=int), MAX_LIMIT))
+        if cold:
+            messages = sorted(tiering_service.conversation_messages(conversation, since),
+                              key=lambda msg: msg.id)[:limit + 1]
+        else:
+            messages = query.filter(Message.id > since).order_by(Message.id.asc()).limit(limit + 1).all()
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        return jsonify({
+            'data': [msg.to_dict() for msg in messages],
+            'pagination': {
+                'limit': limit,
+                'since': since,
+                'last_id': messages[-1].id if messages else since,
+                'has_more': has_more
+            }
+        })
+    
+    try:
+        if cold:
+            # Read back from compressed segments; the response is the same
+            messages, pagination = keyset_page_items(tiering_service.conversation_messages(conversation),
+                                                     Message.created_at, Message.id, descending=False)
+        else:
+            messages, pagination = keyset_page(query, Message.created_at, Message.id, descending=False)
+    except InvalidCursor as e:
+        return jsonify({'message': str(e)}), 400
     
-    return jsonify([msg.to_dict() for msg in messages])
+    return jsonify({
+        'data': [msg.to_dict() for msg in messages],
+        'pagination': pagination
+    })
 
 @conversation_bp.route('/<int:conversation_id>/messages', methods=['POST'])
 @jwt_required()
@@ -75,18 +175,62 @@ def send_message(conversation_id):
     if not data or 'content' not in data:
         return jsonify({'message': 'Message content is required'}), 400
     
+    # New activity: the agent reply needs the full history in the hot table
+    tiering_service.rehydrate(conversation)
+    
     message = Message(
         conversation_id=conversation_id,
         sender_type='user',
         content=data['content'],
-        status='delivered'
+        message_metadata=data.get('metadata', {})
     )
     
     db.session.add(message)
     conversation.updated_at = datetime.utcnow()
-    db.session.commit()
+    db.session.flush()
     
-    # Here you would typically process the message with your AI/agent
-    # and generate a response
+    # The reply is generated by a job worker and pushed over the stream
+    agent_reply_service.enqueue(message)
+    db.session.commit()
     
     return jsonify(message.to_dict()), 201
+
+@conversation_bp.route('/<int:conversation_id>/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream_conversation(conversation_id):
+    """SSE stream of new messages in one conversation"""
+    user_id = get_jwt_identity()
+    conversation = Conversation.query.filter_by(id=conversation_id, user_id=user_id).first_or_404()
+    
+    # Subscribe before reading the backlog so nothing falls in between
+    subscription = pubsub_service.subscribe(f"conversation:{conversation_id}")
+    last_id = last_event_id()
+    backlog = []
+    if last_id is not None and conversation.cold_storage_at is not None:
+        backlog = [msg.to_dict() for msg in sorted(tiering_service.conversation_messages(conversation, last_id),
+                                                   key=lambda msg: msg.id)[:MAX_LIMIT]]
+    elif last_id is not None:
+        backlog = [msg.to_dict() for msg in Message.query
+                   .filter(Message.conversation_id == conversation_id, Message.id > last_id)
+                   .order_by(Message.id.asc())
+                   .limit(MAX_LIMIT)]
+    
+    return stream_response(subscription, backlog, last_id)
+
+@conversation_bp.route('/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream_user_messages():
+    """SSE stream of new messages across all of the user's conversations"""
+    user_id = get_jwt_identity()
+    
+    subscription = pubsub_service.subscribe(f"user:{user_id}")
+    last_id = last_event_id()
+    backlog = []
+    if last_id is not None:
+        backlog = [msg.to_dict() for msg in Message.query
+                   .join(Conversation, Conversation.id == Message.conversation_id)
+                   .filter(Conversation.user_id == user_id, Message.id > last_id)
+                   .order_by(Message.id.asc())
+                   .limit(MAX_LIMIT)]
+    
+    return stream_response(subscription, backlog, last_id)
@@ -1,16 +1,60 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Lead, User
+from sqlalchemy.exc import IntegrityError
+from models import db, Lead, User, LeadMergeSuggestion, LeadFacet, Conversation, CallLog, CampaignLead
+from models.lead_facet import FACET_FIELDS
 from datetime import datetime
+from services.import_service import import_service, read_records
+from services.export_service import export_service, InvalidExportRequest, LEAD_EXPORT_COLUMNS, lead_filters
+from services.dedup_service import dedup_service, InvalidMerge
+from .pagination import keyset_page, InvalidCursor
 
 leads_bp = Blueprint('leads', __name__)
 
+# Sortable lead columns; each has a (user_id, column, id) index to seek on
+LEAD_SORTS = {
+    'updated_at': Lead.updated_at,
+    'created_at': Lead.created_at,
+    'score': Lead.score,
+    'name': Lead.name
+}
+
+def lead_facets(user_id):
+    """A user's lead counts per status and source; '' counts leads without one"""
+    facets = {field: {} for field in FACET_FIELDS}
+    for facet in LeadFacet.query.filter(LeadFacet.user_id == user_id, LeadFacet.count > 0):
+        facets[facet.field][facet.value] = facet.count
+    return facets
+
 @leads_bp.route('', methods=['GET'])
 @jwt_required()
 def get_leads():
+    """
+    One page of the user's leads plus their facet counts.
+    
+    Filters: status and source (comma separated), min_score/max_score,
+    contacted_after/contacted_before on last_contacted (before is
+    exclusive) and q, a prefix of the name, company or email.
+    sort=updated_at|created_at|score|name. The facets count all of the
+    user's leads per status and source, whatever the filters.
+    """
     user_id = get_jwt_identity()
-    leads = Lead.query.filter_by(user_id=user_id).order_by(Lead.updated_at.desc()).all()
-    return jsonify([lead.to_dict() for lead in leads]), 200
+    sort = request.args.get('sort', 'updated_at')
+    if sort not in LEAD_SORTS:
+        return jsonify({'message': f"sort must be one of {', '.join(LEAD_SORTS)}"}), 400
+    try:
+        query = Lead.query.filter(Lead.user_id == user_id, *lead_filters(request.args))
+        # Names read A to Z by default, everything else newest or highest first
+        leads, pagination = keyset_page(query, LEAD_SORTS[sort], Lead.id, descending=sort != 'name')
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    facets = lead_facets(user_id)
+    return jsonify({
+        'data': [lead.to_dict() for lead in leads],
+        'pagination': pagination,
+        'facets': facets,
+        'total': sum(facets['status'].values())
+    }), 200
 
 @leads_bp.route('', methods=['POST'])
 @jwt_required()
@@ -21,31 +65,150 @@ def create_lead():
     # Validate required fields
     if not data or 'name' not in data:
         return jsonify({'message': 'Name is required'}), 400
+    if data.get('email') is not None and not isinstance(data['email'], str):
+        return jsonify({'message': 'email must be a string'}), 400
     
-    # Check for duplicate email if provided
-    if 'email' in data and data['email']:
-        existing_lead = Lead.query.filter_by(email=data['email'], user_id=user_id).first()
-        if existing_lead:
-            return jsonify({'message': 'A lead with this email already exists'}), 400
-    
-    # Create new lead
+    # Create new lead; duplicate emails are rejected by the unique index.
+    # Emails are stored lowercased so imports can match them exactly.
     lead = Lead(
         user_id=user_id,
         name=data['name'],
-        email=data.get('email'),
+        email=(data['email'].strip().lower() or None) if data.get('email') else None,
         phone=data.get('phone'),
         company=data.get('company'),
         status=data.get('status', 'new'),
         source=data.get('source', 'web'),
-        score=data.get('score', 0),
+        score=data.get('score') or 0,
         notes=data.get('notes')
     )
     
     db.session.add(lead)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': 'A lead with this email already exists'}), 400
     
     return jsonify(lead.to_dict()), 201
 
+@leads_bp.route('/import', methods=['POST'])
+@jwt_required()
+def import_leads():
+    """
+    Bulk import leads from a CSV or NDJSON file.
+    
+    Accepts a multipart upload in the "file" field or the raw request body.
+    The file is parsed as it streams in and written in chunks; leads whose
+    email already exists are updated, or left alone with on_duplicate=skip.
+    """
+    user_id = get_jwt_identity()
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    filename = (upload.filename if upload else '') or ''
+    content_type = (upload.mimetype if upload else request.mimetype) or ''
+    
+    fmt = request.args.get('format')
+    if not fmt:
+        if filename.lower().endswith('.csv') or 'csv' in content_type:
+            fmt = 'csv'
+        elif filename.lower().endswith(('.ndjson', '.jsonl')) or 'json' in content_type:
+            fmt = 'ndjson'
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'message': 'format must be csv or ndjson'}), 400
+    
+    try:
+        report = import_service.import_leads(
+            read_records(stream, fmt), user_id,
+            on_duplicate=request.args.get('on_duplicate', 'update'),
+            chunk_size=request.args.get('chunk_size', type=int)
+        )
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify(report), 200
+
+@leads_bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_leads():
+    """
+    Stream the user's leads as CSV or NDJSON (format=csv|ndjson, gzip=1).
+    
+    Filters: status, source, from/to on created_at and agent_id.
+    """
+    user_id = get_jwt_identity()
+    fmt = request.args.get('format', 'csv')
+    compress = request.args.get('gzip', type=int) == 1
+    try:
+        query = export_service.leads_query(user_id, request.args)
+        chunks = export_service.stream(query, LEAD_EXPORT_COLUMNS, fmt, compress)
+    except InvalidExportRequest as e:
+        return jsonify({'message': str(e)}), 400
+    
+    filename = f"leads-{datetime.utcnow():%Y%m%d%H%M%S}.{fmt}" + ('.gz' if compress else '')
+    return Response(
+        stream_with_context(chunks),
+        mimetype='application/gzip' if compress else ('text/csv' if fmt == 'csv' else 'application/x-ndjson'),
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@leads_bp.route('/duplicates', methods=['GET'])
+@jwt_required()
+def get_duplicate_suggestions():
+    """Merge suggestions from the last duplicate scan, most certain first"""
+    user_id = get_jwt_identity()
+    status = request.args.get('status', 'open')
+    query = LeadMergeSuggestion.query.filter_by(user_id=user_id, status=status)
+    try:
+        suggestions, pagination = keyset_page(query, LeadMergeSuggestion.score, LeadMergeSuggestion.id)
+    except InvalidCursor as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({
+        'data': [suggestion.to_dict() for suggestion in suggestions],
+        'pagination': pagination
+    }), 200
+
+@leads_bp.route('/duplicates/scan', methods=['POST'])
+@jwt_required()
+def scan_duplicates():
+    """Queue a duplicate scan; its suggestions replace the open ones when it finishes"""
+    user_id = get_jwt_identity()
+    job = dedup_service.enqueue_scan(user_id)
+    db.session.commit()
+    return jsonify({'job': job.to_dict()}), 202
+
+@leads_bp.route('/duplicates/<int:suggestion_id>/dismiss', methods=['POST'])
+@jwt_required()
+def dismiss_duplicate(suggestion_id):
+    user_id = get_jwt_identity()
+    suggestion = LeadMergeSuggestion.query.filter_by(id=suggestion_id, user_id=user_id).first_or_404()
+    suggestion.status = 'dismissed'
+    db.session.commit()
+    return jsonify(suggestion.to_dict()), 200
+
+@leads_bp.route('/merge', methods=['POST'])
+@jwt_required()
+def merge_leads():
+    """
+    Merge duplicate leads, either from suggestions or explicit groups:
+    
+        {"suggestion_ids": [1, 2]}
+        {"merges": [{"primary_id": 10, "duplicate_ids": [11, 12]}]}
+    """
+    user_id = get_jwt_identity()
+    data = request.get_json() or {}
+    try:
+        if 'suggestion_ids' in data:
+            stats = dedup_service.merge_suggestions(user_id, data['suggestion_ids'])
+        elif 'merges' in data:
+            stats = dedup_service.merge(user_id, {
+                merge['primary_id']: merge['duplicate_ids'] for merge in data['merges']
+            })
+        else:
+            return jsonify({'message': 'suggestion_ids or merges is required'}), 400
+    except (InvalidMerge, KeyError, TypeError, ValueError) as e:
+        db.session.rollback()
+        return jsonify({'message': str(e) if isinstance(e, InvalidMerge) else 'Invalid merge request'}), 400
+    return jsonify(stats), 200
+
 @leads_bp.route('/<int:lead_id>', methods=['GET'])
 @jwt_required()
 def get_lead(lead_id):
@@ -62,15 +225,27 @@ def update_lead(lead_id):
     data = request.get_json()
     if not data:
         return jsonify({'message': 'No data provided'}), 400
+    if data.get('email') is not None and not isinstance(data['email'], str):
+        return jsonify({'message': 'email must be a string'}), 400
     
     # Update fields if they exist in the request
     update_fields = ['name', 'email', 'phone', 'company', 'status', 'source', 'score', 'notes']
     for field in update_fields:
         if field in data:
             setattr(lead, field, data[field])
+    # score is NOT NULL: score pages seek on (score, id)
+    if 'score' in data and data['score'] is None:
+        lead.score = 0
+    # Stored lowercased like create_lead, so the unique index sees case variants
+    if 'email' in data:
+        lead.email = (data['email'].strip().lower() or None) if data['email'] else None
     
     lead.updated_at = datetime.utcnow()
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': 'A lead with this email already exists'}), 400
     
     return jsonify(lead.to_dict())
 
@@ -80,6 +255,18 @@ def delete_lead(lead_id):
     user_id = get_jwt_identity()
     lead = Lead.query.filter_by(id=lead_id, user_id=user_id).first_or_404()
     
+    LeadMergeSuggestion.query.filter(db.or_(
+        LeadMergeSuggestion.lead_id == lead.id, LeadMergeSuggestion.duplicate_id == lead.id
+    )).delete(synchronize_session=False)
+    # Keep the conversations and calls but unlink them; SQLite does not
+    # enforce the foreign keys, and conversations keep their list position
+    conversations = Conversation.__table__
+    db.session.execute(conversations.update().where(conversations.c.lead_id == lead.id)
+                       .values(lead_id=None, updated_at=conversations.c.updated_at))
+    db.session.execute(CallLog.__table__.update().where(CallLog.__table__.c.lead_id == lead.id)
+                       .values(lead_id=None))
+    # Campaign enrollments need the lead; left behind they stay pending forever
+    CampaignLead.query.filter_by(lead_id=lead.id).delete(synchronize_session=False)
     db.session.delete(lead)
     db.session.commit()
     
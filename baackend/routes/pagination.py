@@ -0,0 +1,120 @@
+import base64
+import json
+from datetime import datetime
+from flask import request
+from models import db
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class InvalidCursor(ValueError):
+    """Raised when a before/after cursor cannot be decoded"""
+
+
+def encode_cursor(sort_value, row_id):
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort_column):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+        if isinstance(sort_column.type, db.DateTime):
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, int(row_id)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid pagination cursor')
+
+
+def _page_args(descending):
+    limit = max(1, min(request.args.get('limit', DEFAULT_LIMIT, type=int), MAX_LIMIT))
+    order = request.args.get('order')
+    if order in ('asc', 'desc'):
+        descending = order == 'desc'
+
+    after = request.args.get('after')
+    before = request.args.get('before')
+    if after and before:
+        raise InvalidCursor('Use either before or after, not both')
+    return limit, descending, after, before
+
+
+def _page(rows, limit, descending, after, before, sort_column, id_column):
+    """Trim an over-fetched scan to one page and build its pagination dict"""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before:
+        rows.reverse()
+
+    def cursor_for(row):
+        return encode_cursor(getattr(row, sort_column.key), getattr(row, id_column.key))
+
+    has_next = has_more if not before else True
+    has_prev = bool(after) if not before else has_more
+    return rows, {
+        'limit': limit,
+        'order': 'desc' if descending else 'asc',
+        'next_cursor': cursor_for(rows[-1]) if rows and has_next else None,
+        'prev_cursor': cursor_for(rows[0]) if rows and has_prev else None,
+        'has_more': has_more
+    }
+
+
+def keyset_page(query, sort_column, id_column, descending=True):
+    """
+    Fetch one page of `query` ordered by (sort_column, id_column).
+
+    Reads `limit`, `order` (asc/desc) and one of `before`/`after` from the
+    request. `after` returns the rows following a cursor in list order and
+    `before` the rows preceding it. Pages seek on the key instead of using
+    OFFSET, so a deep page costs the same as the first one.
+
+    Returns:
+        tuple: (rows, pagination dict with next/prev cursors)
+    """
+    limit, descending, after, before = _page_args(descending)
+
+    key = db.tuple_(sort_column, id_column)
+    if after:
+        value = decode_cursor(after, sort_column)
+        query = query.filter(key < value if descending else key > value)
+    if before:
+        value = decode_cursor(before, sort_column)
+        query = query.filter(key > value if descending else key < value)
+
+    # Walking backwards from a `before` cursor scans in reverse list order
+    scan_descending = descending != bool(before)
+    if scan_descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    rows = query.limit(limit + 1).all()
+    return _page(rows, limit, descending, after, before, sort_column, id_column)
+
+
+def keyset_page_items(items, sort_column, id_column, descending=True):
+    """
+    keyset_page for rows that are already in memory, e.g. messages read
+    back from cold storage. Takes the same request arguments and returns
+    the same cursors, so clients cannot tell the two apart.
+    """
+    limit, descending, after, before = _page_args(descending)
+
+    def key(row):
+        return getattr(row, sort_column.key), getattr(row, id_column.key)
+
+    if after:
+        value = decode_cursor(after, sort_column)
+        items = [row for row in items if (key(row) < value if descending else key(row) > value)]
+    if before:
+        value = decode_cursor(before, sort_column)
+        items = [row for row in items if (key(row) > value if descending else key(row) < value)]
+
+    scan_descending = descending != bool(before)
+    rows = sorted(items, key=key, reverse=scan_descending)[:limit + 1]
+    return _page(rows, limit, descending, after, before, sort_column, id_column)
@@ -0,0 +1,58 @@
+import json
+from flask import Response, request, stream_with_context
+
+# Seconds between SSE keep-alive comments
+STREAM_HEARTBEAT = 15
+
+
+def sse(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream_response(subscription, backlog, last_id, event='message'):
+    """
+    Replay the backlog, then push live items until the client goes away.
+    
+    Items are dicts with an increasing 'id', which is sent as the SSE event
+    id so that a reconnecting client resumes with Last-Event-ID.
+    """
+    def generate():
+        seen = last_id or 0
+        try:
+            for item in backlog:
+                yield sse(event, item, item['id'])
+                seen = item['id']
+            while True:
+                published = subscription.get(timeout=STREAM_HEARTBEAT)
+                if subscription.overflowed:
+                    # Client fell too far behind; it should refetch with ?since=
+                    yield sse('resync', {'since': seen})
+                    return
+                if published is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                _, item = published
+                # Skip anything already sent as part of the backlog
+                if item['id'] <= seen:
+                    continue
+                yield sse(event, item, item['id'])
+                seen = item['id']
+        finally:
+            subscription.close()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+def last_event_id():
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        return int(last_id) if last_id else None
+    except ValueError:
+        return None
@@ -0,0 +1,27 @@
+from flask import Blueprint, request, jsonify
+from services.telephony_service import telephony_service, InvalidTelephonyEvent
+
+telephony_bp = Blueprint('telephony', __name__)
+
+@telephony_bp.route('/events', methods=['POST'])
+def receive_events():
+    """
+    Call status webhook from the telephony provider.
+    
+    Must be signed with X-Telephony-Signature (hex HMAC-SHA256 of the body
+    with TELEPHONY_WEBHOOK_SECRET); unsigned webhooks are refused unless
+    TELEPHONY_ALLOW_UNSIGNED_WEBHOOKS is set for local development. Events
+    are only queued here; the telephony writer applies them to the call logs.
+    """
+    body = request.get_data()
+    if not telephony_service.verify_signature(body, request.headers.get('X-Telephony-Signature')):
+        return jsonify({'message': 'Invalid signature'}), 401
+    
+    payload = request.get_json(silent=True)
+    if payload is None:
+        return jsonify({'message': 'Body must be JSON'}), 400
+    try:
+        events = telephony_service.parse_payload(payload)
+    except InvalidTelephonyEvent as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify(telephony_service.ingest(events)), 202
@@ -1,7 +1,17 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, send_file, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, VoiceAgent, CallLog
+from models import db, VoiceAgent, CallLog, Recording, Lead
 from datetime import datetime
+from services.export_service import export_service, InvalidExportRequest, CALL_EXPORT_COLUMNS, parse_date
+from services.analytics_service import analytics_service, InvalidAnalyticsRequest
+from services.pubsub_service import pubsub_service
+from services.search_service import search_service, InvalidSearchQuery
+from services.transcript_service import transcript_service, InvalidTranscriptSegment
+from services.telephony_service import telephony_service, TelephonyProviderError
+from services.recording_service import recording_service, InvalidRecordingRequest, format_of
+from services.agent_config_service import agent_config_service, validate_config, call_variables, InvalidAgentConfig
+from .pagination import keyset_page, InvalidCursor, DEFAULT_LIMIT, MAX_LIMIT
+from .streaming import stream_response, last_event_id
 
 voice_agent_bp = Blueprint('voice_agents', __name__)
 
@@ -21,16 +31,22 @@ def create_voice_agent():
     # Validate required fields
     if not data or 'name' not in data:
         return jsonify({'message': 'Name is required'}), 400
+    if not data.get('voice_id'):
+        return jsonify({'message': 'voice_id is required'}), 400
+    try:
+        config = validate_config(data.get('config'))
+    except InvalidAgentConfig as e:
+        return jsonify({'message': str(e)}), 400
     
     # Create new voice agent
     agent = VoiceAgent(
         user_id=user_id,
         name=data['name'],
         description=data.get('description', ''),
-        voice_type=data.get('voice_type', 'standard'),
+        voice_id=data['voice_id'],
         language=data.get('language', 'en-US'),
         is_active=data.get('is_active', True),
-        config=data.get('config', {})
+        config=config
     )
     
     db.session.add(agent)
@@ -55,41 +71,82 @@ def update_voice_agent(agent_id):
     if not data:
         return jsonify({'message': 'No data provided'}), 400
     
+    if 'config' in data:
+        try:
+            data['config'] = validate_config(data['config'])
+        except InvalidAgentConfig as e:
+            return jsonify({'message': str(e)}), 400
+    
     # Update fields if they exist in the request
-    update_fields = ['name', 'description', 'voice_type', 'language', 'is_active', 'config']
+    update_fields = ['name', 'description', 'voice_id', 'language', 'is_active', 'config']
     for field in update_fields:
         if field in data:
             setattr(agent, field, data[field])
     
     agent.updated_at = datetime.utcnow()
     db.session.commit()
+    # Workers holding the compiled config recompile it on their next turn
+    agent_config_service.changed(agent)
     
     return jsonify(agent.to_dict())
 
 @voice_agent_bp.route('/<int:agent_id>/calls', methods=['POST'])
 @jwt_required()
 def initiate_call(agent_id):
+    """
+    Place one outbound call with this agent, optionally to one of the
+    user's leads (lead_id) whose details fill in the greeting and call
+    context. To call many leads, create a campaign (/api/campaigns) instead.
+    """
     user_id = get_jwt_identity()
     agent = VoiceAgent.query.filter_by(id=agent_id, user_id=user_id).first_or_404()
     
     data = request.get_json()
     if not data or 'phone_number' not in data:
         return jsonify({'message': 'Phone number is required'}), 400
+    from_number = data.get('from_number') or telephony_service.from_number
+    if not from_number:
+        return jsonify({'message': 'from_number is required when TELEPHONY_FROM_NUMBER is not set'}), 400
+    lead = None
+    if data.get('lead_id') is not None:
+        lead = Lead.query.filter_by(id=data['lead_id'], user_id=user_id).first()
+        if lead is None:
+            return jsonify({'message': 'Lead not found'}), 400
+    try:
+        compiled = agent_config_service.get(agent.id)
+    except InvalidAgentConfig as e:
+        return jsonify({'message': f'Voice agent config cannot be used: {e}'}), 400
     
     # Create call log
     call = CallLog(
         user_id=user_id,
-        agent_id=agent_id,
-        phone_number=data['phone_number'],
-        status='initiated',
+        lead_id=lead.id if lead else None,
+        voice_agent_id=agent.id,
+        from_number=from_number,
+        to_number=data['phone_number'],
+        status='queued',
         direction='outbound'
     )
     
     db.session.add(call)
     db.session.commit()
     
-    # Here you would typically integrate with a telephony service
-    # to place the actual call
+    # The provider reports progress through the telephony webhook
+    try:
+        provider_call_id = telephony_service.place_call({
+            'id': call.id, 'from_number': call.from_number, 'to_number': call.to_number,
+            'voice_agent_id': call.voice_agent_id,
+            'agent': compiled.call_payload(call_variables(lead, call.to_number, call.from_number))
+        })
+        # A webhook may have linked the call already; keep what it set
+        calls = CallLog.__table__
+        db.session.execute(calls.update().where(calls.c.id == call.id, calls.c.provider_call_id.is_(None))
+                           .values(provider_call_id=provider_call_id))
+    except TelephonyProviderError as e:
+        call.status = 'failed'
+        call.ended_at = datetime.utcnow()
+        call.call_metadata = {'dispatch_error': str(e)[:500]}
+    db.session.commit()
     
     return jsonify(call.to_dict()), 201
 
@@ -98,11 +155,196 @@ def initiate_call(agent_id):
 def get_call(call_id):
     user_id = get_jwt_identity()
     call = CallLog.query.filter_by(id=call_id, user_id=user_id).first_or_404()
+    transcript_service.materialize(call)
     return jsonify(call.to_dict())
 
+@voice_agent_bp.route('/calls/<int:call_id>/recording', methods=['GET'])
+@jwt_required()
+def get_call_recording(call_id):
+    """
+    The call's stored recording. Supports Range requests (seeking reads
+    only the bytes asked for) and If-None-Match/If-Modified-Since.
+    ?format=mp3|ogg|wav transcodes it, cached after the first request.
+    """
+    user_id = get_jwt_identity()
+    call = CallLog.query.filter_by(id=call_id, user_id=user_id).first_or_404()
+    if call.recording_id is None:
+        message = 'Recording is still being fetched' if call.recording_url else 'Call has no recording'
+        return jsonify({'message': message}), 404
+    recording = db.session.get(Recording, call.recording_id)
+    fmt = request.args.get('format') or None
+    try:
+        path, content_type, etag = recording_service.file(recording, fmt)
+    except InvalidRecordingRequest as e:
+        return jsonify({'message': str(e)}), 400
+    extension = fmt or format_of(content_type)
+    response = send_file(path, mimetype=content_type, conditional=True, etag=etag,
+                         last_modified=recording.created_at, max_age=recording_service.max_age,
+                         download_name=f'call-{call.id}.{extension}' if extension else f'call-{call.id}')
+    # Stored files never change, but they are the user's own: browser cache only
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+@voice_agent_bp.route('/calls/<int:call_id>/transcript', methods=['POST'])
+@jwt_required()
+def append_transcript(call_id):
+    """
+    Append transcript segments to a call while it is live.
+    
+    Takes one segment, a list or {"segments": [...]}; each has a seq, text
+    and optionally speaker, start_ms and end_ms. A seq the call already has
+    is ignored, so a transcriber can safely retry.
+    """
+    user_id = get_jwt_identity()
+    call = CallLog.query.filter_by(id=call_id, user_id=user_id).first_or_404()
+    
+    payload = request.get_json(silent=True)
+    if payload is None:
+        return jsonify({'message': 'Body must be JSON'}), 400
+    try:
+        segments = transcript_service.parse_payload(payload)
+    except InvalidTranscriptSegment as e:
+        return jsonify({'message': str(e)}), 400
+    result = transcript_service.append(call, segments)
+    return jsonify({'accepted': result['accepted'], 'duplicates': result['duplicates']}), 201
+
+@voice_agent_bp.route('/calls/<int:call_id>/transcript', methods=['GET'])
+@jwt_required()
+def get_transcript(call_id):
+    """The call's full transcript, rebuilt from its segments if any arrived since the last read"""
+    user_id = get_jwt_identity()
+    call = CallLog.query.filter_by(id=call_id, user_id=user_id).first_or_404()
+    return jsonify({
+        'call_id': call.id,
+        'transcription': transcript_service.materialize(call),
+        'last_segment_id': call.transcript_segment_id
+    })
+
+@voice_agent_bp.route('/calls/<int:call_id>/transcript/segments', methods=['GET'])
+@jwt_required()
+def get_transcript_segments(call_id):
+    """A call's segments in arrival order; since=<segment id> returns only newer ones"""
+    user_id = get_jwt_identity()
+    CallLog.query.filter_by(id=call_id, user_id=user_id).first_or_404()
+    
+    since = request.args.get('since', type=int)
+    limit = max(1, min(request.args.get('limit', DEFAULT_LIMIT, type=int), MAX_LIMIT))
+    segments = transcript_service.segments(call_id, since, limit + 1)
+    has_more = len(segments) > limit
+    segments = segments[:limit]
+    return jsonify({
+        'data': [segment.to_dict() for segment in segments],
+        'pagination': {
+            'limit': limit,
+            'since': since,
+            'last_id': segments[-1].id if segments else since,
+            'has_more': has_more
+        }
+    })
+
+@voice_agent_bp.route('/calls/<int:call_id>/transcript/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream_transcript(call_id):
+    """
+    SSE stream of a call's transcript: the segments so far (or those after
+    Last-Event-ID / since), then each new segment as it is appended.
+    """
+    user_id = get_jwt_identity()
+    CallLog.query.filter_by(id=call_id, user_id=user_id).first_or_404()
+    
+    # Subscribe before reading the backlog so nothing falls in between
+    subscription = pubsub_service.subscribe(f"call:{call_id}")
+    last_id = last_event_id()
+    backlog = [segment.to_dict() for segment in transcript_service.segments(call_id, last_id)]
+    return stream_response(subscription, backlog, last_id, event='segment')
+
+@voice_agent_bp.route('/calls/search', methods=['GET'])
+@jwt_required()
+def search_transcripts():
+    """Ranked full-text search over the user's call transcripts"""
+    user_id = get_jwt_identity()
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'message': 'Search query (q) is required'}), 400
+    
+    limit = max(1, min(request.args.get('limit', 20, type=int), MAX_LIMIT))
+    offset = max(0, request.args.get('offset', 0, type=int))
+    try:
+        results = search_service.search_transcripts(
+            user_id, query, limit=limit + 1, offset=offset,
+            call_id=request.args.get('call_id', type=int)
+        )
+    except InvalidSearchQuery as e:
+        return jsonify({'message': str(e)}), 400
+    
+    has_more = len(results) > limit
+    return jsonify({
+        'data': results[:limit],
+        'pagination': {
+            'limit': limit,
+            'offset': offset,
+            'next_offset': offset + limit if has_more else None,
+            'has_more': has_more
+        }
+    })
+
 @voice_agent_bp.route('/calls', methods=['GET'])
 @jwt_required()
 def get_calls():
     user_id = get_jwt_identity()
-    calls = CallLog.query.filter_by(user_id=user_id).order_by(CallLog.created_at.desc()).all()
-    return jsonify([call.to_dict() for call in calls]), 200
+    query = CallLog.query.filter_by(user_id=user_id)
+    try:
+        calls, pagination = keyset_page(query, CallLog.created_at, CallLog.id)
+    except InvalidCursor as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({
+        'data': [call.to_dict() for call in calls],
+        'pagination': pagination
+    }), 200
+
+@voice_agent_bp.route('/calls/export', methods=['GET'])
+@jwt_required()
+def export_calls():
+    """
+    Stream the user's call logs as CSV or NDJSON (format=csv|ndjson, gzip=1).
+    
+    Filters: status, direction, from/to on created_at, agent_id and lead_id.
+    """
+    user_id = get_jwt_identity()
+    fmt = request.args.get('format', 'csv')
+    compress = request.args.get('gzip', type=int) == 1
+    try:
+        query = export_service.calls_query(user_id, request.args)
+        chunks = export_service.stream(query, CALL_EXPORT_COLUMNS, fmt, compress)
+    except InvalidExportRequest as e:
+        return jsonify({'message': str(e)}), 400
+    
+    filename = f"calls-{datetime.utcnow():%Y%m%d%H%M%S}.{fmt}" + ('.gz' if compress else '')
+    return Response(
+        stream_with_context(chunks),
+        mimetype='application/gzip' if compress else ('text/csv' if fmt == 'csv' else 'application/x-ndjson'),
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@voice_agent_bp.route('/analytics', methods=['GET'])
+@jwt_required()
+def get_call_analytics():
+    """
+    Call counts, answer rate and duration percentiles from the call rollups.
+    
+    period=hour|day (default day), from/to (to is exclusive; defaults to the
+    last 48 hours or 30 days) and agent_id.
+    """
+    user_id = get_jwt_identity()
+    try:
+        report = analytics_service.report(
+            user_id,
+            period=request.args.get('period', 'day'),
+            start=parse_date(request.args.get('from'), 'from'),
+            end=parse_date(request.args.get('to'), 'to'),
+            agent_id=request.args.get('agent_id', type=int)
+        )
+    except (InvalidAnalyticsRequest, InvalidExportRequest) as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify(report), 200
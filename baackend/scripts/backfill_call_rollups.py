@@ -0,0 +1,48 @@
+"""
+Call rollup backfill
+
+Rollups follow call log writes once the analytics service is running;
+this rebuilds them from call_logs, e.g. after the migration that adds
+them or to repair drift:
+
+    python scripts/backfill_call_rollups.py              # every account with calls
+    python scripts/backfill_call_rollups.py --user-id 3
+
+Each account is rebuilt in its own transaction; run it while the
+account's calls are quiet. Prints the counts as JSON.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild call analytics rollups from call logs')
+    parser.add_argument('--user-id', type=int, help='Only this account')
+    args = parser.parse_args()
+
+    from app import app
+    from models import db, CallLog
+    from services.analytics_service import analytics_service
+
+    with app.app_context():
+        started = time.monotonic()
+        if args.user_id:
+            user_ids = [args.user_id]
+        else:
+            user_ids = db.session.execute(db.select(CallLog.user_id).distinct()).scalars().all()
+        report = {'users': 0, 'calls': 0, 'rollups': 0, 'bins': 0}
+        for user_id in user_ids:
+            for key, value in analytics_service.rebuild(user_id).items():
+                report[key] += value
+            report['users'] += 1
+        report['seconds'] = round(time.monotonic() - started, 2)
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+SMTP sending benchmark
+
+Starts a local aiosmtpd server as a stand-in for the mail provider and
+sends the same batch of emails through EmailService twice: with a new
+connection per email (SMTP_POOL_SIZE=0, the old behaviour) and through the
+connection pool, reporting messages/sec, latency and sessions opened:
+
+    pip install aiosmtpd
+    python scripts/benchmark_email.py                          # 2000 emails, 8 threads, pool of 4
+    python scripts/benchmark_email.py --session-latency 0.15 --latency 0.01
+    python scripts/benchmark_email.py --emails 500 --threads 16 --pool-size 8 --auth
+
+A loopback connection costs far less than a provider's TCP and TLS
+handshakes and login, so --session-latency delays each new session's EHLO
+by that many seconds and --latency each accepted message, to approximate
+the round trips of a real server.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+from flask import Flask
+
+from services.email_service import email_service
+
+USERNAME = 'bench'
+PASSWORD = 'bench-password'
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))]
+
+
+class StandInHandler:
+    """Accepts every message, counting sessions and messages"""
+
+    def __init__(self, session_latency, latency):
+        self.session_latency = session_latency
+        self.latency = latency
+        self.sessions = 0
+        self.messages = 0
+        self._lock = threading.Lock()
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        session.host_name = hostname
+        with self._lock:
+            self.sessions += 1
+        if self.session_latency:
+            await asyncio.sleep(self.session_latency)
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        with self._lock:
+            self.messages += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return '250 Message accepted for delivery'
+
+
+def authenticate(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=auth_data.login == USERNAME.encode() and auth_data.password == PASSWORD.encode())
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run(args, app, handler, pool_size):
+    app.config['SMTP_POOL_SIZE'] = pool_size
+    email_service.init_app(app)
+    sessions, messages = handler.sessions, handler.messages
+    body = 'x' * args.body_bytes
+
+    def send(i):
+        started = time.monotonic()
+        result = email_service.send_email(to_emails=f'lead{i}@example.com', subject=f'Benchmark {i}', body=body)
+        return time.monotonic() - started, result['success']
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        results = list(executor.map(send, range(args.emails)))
+    elapsed = time.monotonic() - started
+    email_service.close()
+
+    latencies = [latency for latency, _ in results]
+    return {
+        'pool_size': pool_size,
+        'sent': sum(1 for _, ok in results if ok),
+        'failed': sum(1 for _, ok in results if not ok),
+        'seconds': round(elapsed, 3),
+        'messages_per_sec': round(len(results) / elapsed, 1),
+        'latency_ms': {
+            label: round(percentile(latencies, pct) * 1000, 2)
+            for label, pct in (('p50', 50), ('p95', 95), ('p99', 99), ('max', 100))
+        },
+        'sessions_opened': handler.sessions - sessions,
+        'messages_received': handler.messages - messages
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark EmailService against a local aiosmtpd server')
+    parser.add_argument('--emails', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent senders')
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--body-bytes', type=int, default=2000)
+    parser.add_argument('--session-latency', type=float, default=0.0,
+                        help='Seconds added to each new session, standing in for connect, TLS and login')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to each message')
+    parser.add_argument('--auth', action='store_true', help='Require AUTH LOGIN/PLAIN')
+    parser.add_argument('--output', help='Also write the JSON report to this file')
+    args = parser.parse_args()
+
+    handler = StandInHandler(args.session_latency, args.latency)
+    port = free_port()
+    controller = Controller(handler, hostname='127.0.0.1', port=port,
+                            authenticator=authenticate if args.auth else None, auth_require_tls=False)
+    controller.start()
+
+    app = Flask(__name__)
+    app.config.update(SMTP_SERVER='127.0.0.1', SMTP_PORT=port, SMTP_USE_TLS=False,
+                      DEFAULT_EMAIL_SENDER='bench@example.com')
+    if args.auth:
+        app.config.update(SMTP_USERNAME=USERNAME, SMTP_PASSWORD=PASSWORD)
+
+    report = {'emails': args.emails, 'threads': args.threads,
+              'session_latency': args.session_latency, 'latency': args.latency}
+    try:
+        for name, pool_size in (('per_email_connection', 0), ('pooled', args.pool_size)):
+            print(f'Sending {args.emails} emails: {name}')
+            report[name] = run(args, app, handler, pool_size)
+            print(f"  {report[name]['messages_per_sec']} messages/sec, "
+                  f"p50 {report[name]['latency_ms']['p50']} ms, "
+                  f"{report[name]['sessions_opened']} sessions")
+    finally:
+        controller.stop()
+    report['speedup'] = round(report['pooled']['messages_per_sec'] /
+                              report['per_email_connection']['messages_per_sec'], 2)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+
+
+if __name__ == '__main__':
+    main()
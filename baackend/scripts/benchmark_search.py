@@ -0,0 +1,216 @@
+"""
+Full-text message search benchmark
+
+Seeds a scratch database with synthetic conversations (Zipf-distributed
+vocabulary, so there are very common and very rare terms), then times
+/api/conversations/search's queries per query class and compares them
+with the unindexed LIKE fallback:
+
+    python scripts/benchmark_search.py                         # 10M messages in /tmp
+    python scripts/benchmark_search.py --messages 1000000 --users 200
+    python scripts/benchmark_search.py --reuse                 # query an existing seed
+    python scripts/benchmark_search.py --database-url postgresql://.../scratch
+
+On SQLite, --rebuild loads with the sync triggers dropped and builds the
+index in one pass afterwards; without it every insert maintains the index,
+which is what the insert rate then measures.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from flask import Flask
+
+from models import db, User, Conversation, Message
+from models.message import SQLITE_FTS_CREATE
+from services.search_service import search_service
+
+COMMON_WORDS = (
+    'price pricing demo call meeting team plan contract budget integration support '
+    'trial discount renewal onboarding invoice schedule follow quote proposal feature '
+    'account manager customer agent voice email lead deal sales timeline decision '
+    'security compliance migration api webhook crm dashboard report analytics seats'
+).split()
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))]
+
+
+def build_vocabulary(size):
+    words = COMMON_WORDS + [f'term{i}' for i in range(size - len(COMMON_WORDS))]
+    weights = 1.0 / np.arange(1, len(words) + 1) ** 1.1
+    return words, weights / weights.sum()
+
+
+def create_app(database_url):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=database_url, SQLALCHEMY_TRACK_MODIFICATIONS=False)
+    db.init_app(app)
+    return app
+
+
+def seed(args, words, probabilities):
+    rng = np.random.default_rng(args.seed)
+    now = datetime.utcnow()
+    dialect = db.engine.dialect.name
+
+    db.drop_all()
+    db.create_all()
+    db.session.execute(db.insert(User), [
+        {'email': f'bench{i}@example.com', 'password_hash': 'x'} for i in range(args.users)
+    ])
+    user_ids = db.session.execute(db.select(User.id)).scalars().all()
+    db.session.execute(db.insert(Conversation), [
+        {'user_id': user_id, 'title': f'Conversation {i}', 'channel': 'chat', 'status': 'active',
+         'created_at': now, 'updated_at': now}
+        for user_id in user_ids for i in range(args.conversations_per_user)
+    ])
+    conversation_ids = np.array(db.session.execute(db.select(Conversation.id)).scalars().all())
+    db.session.commit()
+
+    if args.rebuild and dialect == 'sqlite':
+        for name in ('messages_fts_insert', 'messages_fts_delete', 'messages_fts_update'):
+            db.session.execute(db.text(f'DROP TRIGGER IF EXISTS {name}'))
+        db.session.commit()
+
+    vocabulary = np.array(words, dtype=object)
+    messages = Message.__table__
+    inserted = 0
+    generate_seconds = insert_seconds = 0.0
+    while inserted < args.messages:
+        batch = min(args.batch, args.messages - inserted)
+        started = time.monotonic()
+        lengths = rng.integers(5, 40, size=batch)
+        tokens = vocabulary[rng.choice(len(words), size=int(lengths.sum()), p=probabilities)]
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        owners = conversation_ids[rng.integers(0, len(conversation_ids), size=batch)]
+        rows = [{
+            'conversation_id': int(owners[i]),
+            'sender_type': 'user' if i % 2 else 'bot',
+            'content': ' '.join(tokens[offsets[i]:offsets[i + 1]]),
+            'created_at': now - timedelta(seconds=int(args.messages - inserted - i))
+        } for i in range(batch)]
+        generate_seconds += time.monotonic() - started
+
+        started = time.monotonic()
+        db.session.execute(messages.insert(), rows)
+        db.session.commit()
+        insert_seconds += time.monotonic() - started
+        inserted += batch
+        print(f'  {inserted:,}/{args.messages:,} messages', end='\r', flush=True)
+    print()
+
+    rebuild_seconds = None
+    if args.rebuild and dialect == 'sqlite':
+        started = time.monotonic()
+        db.session.execute(db.text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+        for statement in SQLITE_FTS_CREATE:
+            db.session.execute(db.text(statement))
+        db.session.commit()
+        rebuild_seconds = round(time.monotonic() - started, 2)
+
+    # Message counters are not needed here; the Core inserts skip the ORM listeners
+    return {
+        'messages': inserted,
+        'users': len(user_ids),
+        'conversations': len(conversation_ids),
+        'generate_s': round(generate_seconds, 2),
+        'insert_s': round(insert_seconds, 2),
+        'insert_rows_per_s': round(inserted / insert_seconds) if insert_seconds else None,
+        'index_rebuild_s': rebuild_seconds
+    }
+
+
+def query_classes(words):
+    middle = len(words) // 20
+    return {
+        'common_term': lambda: random.choice(COMMON_WORDS[:10]),
+        'mid_term': lambda: random.choice(words[middle:middle * 2]),
+        'rare_term': lambda: random.choice(words[-len(words) // 10:]),
+        'two_terms': lambda: f'{random.choice(COMMON_WORDS)} {random.choice(words[middle:middle * 2])}',
+        'phrase': lambda: f'"{random.choice(COMMON_WORDS)} {random.choice(COMMON_WORDS)}"',
+        'prefix': lambda: random.choice(COMMON_WORDS)[:4] + '*',
+    }
+
+
+def run_queries(args, words, user_ids):
+    report = {}
+    for name, make_query in query_classes(words).items():
+        latencies, hits, like_latencies = [], [], []
+        for i in range(args.queries):
+            query, user_id = make_query(), random.choice(user_ids)
+            started = time.monotonic()
+            results = search_service.search_messages(user_id, query, limit=20)
+            latencies.append(time.monotonic() - started)
+            hits.append(len(results))
+
+            if i < args.like_queries:
+                started = time.monotonic()
+                search_service._search_like(user_id, query.strip('"*'), 20, 0, None)
+                like_latencies.append(time.monotonic() - started)
+            db.session.rollback()
+
+        report[name] = {
+            'queries': len(latencies),
+            'avg_results': round(sum(hits) / len(hits), 1),
+            'latency_ms': {
+                label: round(percentile(latencies, pct) * 1000, 2)
+                for label, pct in (('p50', 50), ('p95', 95), ('p99', 99), ('max', 100))
+            },
+            'like_p50_ms': round(percentile(like_latencies, 50) * 1000, 2) if like_latencies else None
+        }
+        print(f"  {name}: p50 {report[name]['latency_ms']['p50']} ms, "
+              f"p99 {report[name]['latency_ms']['p99']} ms, LIKE p50 {report[name]['like_p50_ms']} ms")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark full-text message search')
+    parser.add_argument('--database-url', default='sqlite:////tmp/vly-search-bench.db',
+                        help='Scratch database; its tables are dropped and recreated unless --reuse')
+    parser.add_argument('--messages', type=int, default=10_000_000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--conversations-per-user', type=int, default=20)
+    parser.add_argument('--vocabulary', type=int, default=50_000, help='Distinct words in the synthetic text')
+    parser.add_argument('--batch', type=int, default=50_000, help='Messages per insert transaction')
+    parser.add_argument('--rebuild', action='store_true', help='SQLite: build the index after loading')
+    parser.add_argument('--reuse', action='store_true', help='Skip seeding and query the existing data')
+    parser.add_argument('--queries', type=int, default=200, help='Queries per query class')
+    parser.add_argument('--like-queries', type=int, default=3, help='LIKE baseline queries per class')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Also write the JSON report to this file')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    words, probabilities = build_vocabulary(args.vocabulary)
+    app = create_app(args.database_url)
+    with app.app_context():
+        report = {'database': db.engine.dialect.name}
+        if not args.reuse:
+            print('Seeding')
+            report['seed'] = seed(args, words, probabilities)
+        user_ids = db.session.execute(db.select(User.id)).scalars().all()
+        print('Querying')
+        report['queries'] = run_queries(args, words, user_ids)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Campaign dialer
+
+Schedules and places the calls of running outbound campaigns (see
+CampaignService). Run exactly one next to the telephony writer, which
+applies the call outcomes it waits for:
+
+    python scripts/campaign_dialer.py
+    python scripts/campaign_dialer.py --workers 32 --tick 0.5
+
+Calls are placed with TELEPHONY_API_URL; point it at
+`scripts/telephony_stub.py serve` to dial against the stand-in provider.
+SIGINT/SIGTERM stop after the tick in progress; the totals are printed as
+JSON.
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from services import init_services, campaign_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dial running outbound campaigns')
+    parser.add_argument('--workers', type=int, help='Calls placed concurrently (defaults to CAMPAIGN_DISPATCH_WORKERS)')
+    parser.add_argument('--tick', type=float, help='Seconds between scheduling passes (defaults to CAMPAIGN_TICK_SECONDS)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(threadName)s %(levelname)s %(message)s')
+    with app.app_context():
+        init_services(app)
+    if args.workers:
+        campaign_service.dispatch_workers = args.workers
+    if args.tick:
+        campaign_service.tick_interval = args.tick
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    started = time.monotonic()
+    dialer = campaign_service.start_dialer(app)
+    print(f'Campaign dialer running ({campaign_service.dispatch_workers} dispatch workers)')
+    stop.wait()
+    dialer.stop()
+    totals = dict(dialer.stats)
+    totals['seconds'] = round(time.monotonic() - started, 2)
+    print(json.dumps(totals, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""
+Query plan check for the API's hot access paths
+
+Seeds a throwaway database, calls each list/detail route through the Flask
+test client, captures every SELECT the routes issue and runs EXPLAIN on it.
+Exits non-zero if any of them needs a full table scan or a sort that an
+index should have provided, or if the conversation list stops being a
+single query as its conversations gain messages.
+
+    python scripts/check_query_plans.py                      # in-memory SQLite
+    python scripts/check_query_plans.py --database-url postgresql://.../scratch
+
+Tables are not ANALYZEd, and on Postgres sequential scans are disabled for
+the EXPLAIN, so a small seeded table still shows whether an index path
+exists at all.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+from sqlalchemy import event
+
+from models import db, User, Lead, Conversation, Message, VoiceAgent, CallLog
+from services.telephony_service import telephony_service
+from services.campaign_service import campaign_service
+from services.agent_config_service import agent_config_service
+
+SQLITE_SCAN = re.compile(r'\bSCAN (\w+)(?! USING (COVERING )?INDEX)')
+SQLITE_SORT = re.compile(r'USE TEMP B-TREE FOR ORDER BY')
+
+
+def create_app(database_url):
+    from routes.leads import leads_bp
+    from routes.conversations import conversation_bp
+    from routes.voice_agents import voice_agent_bp
+    from routes.telephony import telephony_bp
+    from routes.campaigns import campaign_bp
+
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=database_url,
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        JWT_SECRET_KEY='query-plan-check-secret-key-0123456789'
+    )
+    JWTManager(app)
+    db.init_app(app)
+    app.register_blueprint(leads_bp, url_prefix='/api/leads')
+    app.register_blueprint(conversation_bp, url_prefix='/api/conversations')
+    app.register_blueprint(voice_agent_bp, url_prefix='/api/voice-agents')
+    app.register_blueprint(telephony_bp, url_prefix='/api/telephony')
+    app.register_blueprint(campaign_bp, url_prefix='/api/campaigns')
+    return app
+
+
+def seed(rows):
+    now = datetime.utcnow()
+    user = User(email='plans@example.com', password_hash='x')
+    other = User(email='other@example.com', password_hash='x')
+    db.session.add_all([user, other])
+    db.session.flush()
+
+    for owner in (user, other):
+        agent = VoiceAgent(user_id=owner.id, name='Agent', voice_id='v1')
+        db.session.add(agent)
+        db.session.flush()
+        for i in range(rows):
+            lead = Lead(user_id=owner.id, name=f'Lead {i}', email=f'lead{i}@example.com',
+                        phone=f'+1555{i:07d}', updated_at=now - timedelta(minutes=i))
+            db.session.add(lead)
+            db.session.flush()
+            conversation = Conversation(user_id=owner.id, lead_id=lead.id,
+                                        updated_at=now - timedelta(minutes=i))
+            db.session.add(conversation)
+            db.session.flush()
+            db.session.add_all([
+                Message(conversation_id=conversation.id, sender_type='user', content=f'Hello {j}',
+                        created_at=now - timedelta(minutes=i, seconds=j))
+                for j in range(3)
+            ])
+            db.session.add(CallLog(user_id=owner.id, lead_id=lead.id, voice_agent_id=agent.id,
+                                   from_number='+15550000000', to_number='+15550000001',
+                                   direction='outbound', status='completed',
+                                   created_at=now - timedelta(minutes=i)))
+    db.session.commit()
+    return user
+
+
+def explain(statement, parameters):
+    dialect = db.engine.dialect.name
+    with db.engine.connect() as conn:
+        if dialect == 'sqlite':
+            rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+            plan = '\n'.join(row[-1] for row in rows)
+            problems = [f'full scan of {m.group(1)}' for m in SQLITE_SCAN.finditer(plan)]
+            if SQLITE_SORT.search(plan):
+                problems.append('sort not satisfied by an index')
+            return plan, problems
+
+        conn.exec_driver_sql('SET enable_seqscan = off')
+        rows = conn.exec_driver_sql(f'EXPLAIN {statement}', parameters).fetchall()
+        plan = '\n'.join(row[0] for row in rows)
+        problems = [f'sequential scan: {line.strip()}' for line in plan.splitlines() if 'Seq Scan' in line]
+        return plan, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fail on full table scans in route queries')
+    parser.add_argument('--database-url', default='sqlite://',
+                        help='Scratch database; its tables are dropped and recreated')
+    parser.add_argument('--rows', type=int, default=200, help='Seed rows per table per user')
+    parser.add_argument('--verbose', action='store_true', help='Print every plan')
+    args = parser.parse_args()
+
+    app = create_app(args.database_url)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = seed(args.rows)
+        token = create_access_token(identity=str(user.id))
+        lead_id = Lead.query.filter_by(user_id=user.id).first().id
+        conversation_id = Conversation.query.filter_by(user_id=user.id).first().id
+        call_id = CallLog.query.filter_by(user_id=user.id).first().id
+        agent_id = VoiceAgent.query.filter_by(user_id=user.id).first().id
+
+        captured = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT'):
+                captured.append((statement, parameters))
+
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {token}'}
+        checks = []
+
+        def traced(label, call):
+            captured.clear()
+            event.listen(db.engine, 'before_cursor_execute', capture)
+            try:
+                result = call()
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', capture)
+            checks.append((label, list(captured)))
+            return result
+
+        def request(method, url, **kwargs):
+            return traced(f'{method} {url.split("?")[0]}',
+                          lambda: client.open(url, method=method, headers=headers, **kwargs))
+
+        page = request('GET', '/api/leads?limit=20').get_json()
+        request('GET', f"/api/leads?limit=20&after={page['pagination']['next_cursor']}")
+        page = request('GET', '/api/leads?limit=20&sort=score').get_json()
+        request('GET', f"/api/leads?limit=20&sort=score&after={page['pagination']['next_cursor']}")
+        for sort in ('created_at', 'name'):
+            page = request('GET', f'/api/leads?limit=20&sort={sort}').get_json()
+            request('GET', f"/api/leads?limit=20&sort={sort}&after={page['pagination']['next_cursor']}")
+        request('GET', '/api/leads?limit=20&status=new,contacted&source=web&q=lead')
+        request('GET', '/api/leads?limit=20&sort=score&min_score=10&max_score=90')
+        request('GET', f'/api/leads/{lead_id}')
+        request('GET', '/api/leads/duplicates?limit=20')
+        request('POST', '/api/leads', json={'name': 'Dup', 'email': 'lead1@example.com'})
+        page = request('GET', '/api/conversations?limit=20').get_json()
+        list_queries = [len(checks[-1][1])]
+        request('GET', f"/api/conversations?limit=20&after={page['pagination']['next_cursor']}")
+        # Counts and previews are maintained on the conversation rows, so the
+        # list stays one query however many messages the conversations hold
+        db.session.add_all([
+            Message(conversation_id=conv.id, sender_type='user', content=f'More {j}')
+            for conv in Conversation.query.filter_by(user_id=user.id).all() for j in range(20)
+        ])
+        db.session.commit()
+        request('GET', '/api/conversations?limit=20')
+        list_queries.append(len(checks[-1][1]))
+        request('GET', f'/api/conversations/{conversation_id}')
+        request('GET', f'/api/conversations/{conversation_id}/messages')
+        request('GET', f'/api/conversations/{conversation_id}/messages?since=1')
+        request('GET', '/api/voice-agents')
+        request('PUT', f'/api/voice-agents/{agent_id}', json={'config': {'greeting': 'Hi $lead_name'}})
+        traced('voice agent config compile', lambda: agent_config_service.get(agent_id))
+        page = request('GET', '/api/voice-agents/calls?limit=20').get_json()
+        request('GET', f"/api/voice-agents/calls?limit=20&after={page['pagination']['next_cursor']}")
+        request('POST', f'/api/voice-agents/calls/{call_id}/transcript', json=[
+            {'seq': 0, 'speaker': 'agent', 'text': 'Hello, calling about your order'},
+            {'seq': 1, 'speaker': 'caller', 'text': 'Yes, the order arrived'}
+        ])
+        request('GET', f'/api/voice-agents/calls/{call_id}')
+        request('GET', f'/api/voice-agents/calls/{call_id}/transcript')
+        request('GET', f'/api/voice-agents/calls/{call_id}/recording')
+        request('GET', f'/api/voice-agents/calls/{call_id}/transcript/segments?since=1')
+        request('GET', '/api/voice-agents/analytics')
+        request('GET', '/api/voice-agents/analytics?period=hour&agent_id=1')
+        request('GET', '/api/leads/export?status=new', buffered=True)
+        request('GET', '/api/voice-agents/calls/export?from=2020-01-01', buffered=True)
+        # Webhooks must be signed; sign them the way the provider does
+        telephony_service.webhook_secret = 'query-plan-check'
+        events = json.dumps([
+            {'id': 'plan-1', 'call_id': 'CA-plan', 'call_log_id': call_id, 'status': 'ringing'},
+            {'id': 'plan-2', 'call_id': 'CA-unknown', 'status': 'completed', 'duration': 30}
+        ]).encode()
+        traced('POST /api/telephony/events', lambda: client.post(
+            '/api/telephony/events', data=events, content_type='application/json',
+            headers={'X-Telephony-Signature': telephony_service.sign(events)}))
+        traced('telephony writer batch', telephony_service.process_batch)
+        campaign_id = request('POST', '/api/campaigns', json={
+            'name': 'Plans', 'voice_agent_id': agent_id, 'from_number': '+15550000000',
+            'lead_filter': {'status': 'new'}, 'calls_per_minute': 60
+        }).get_json()['id']
+        request('GET', '/api/campaigns?limit=20')
+        request('POST', f'/api/campaigns/{campaign_id}/start')
+        request('GET', f'/api/campaigns/{campaign_id}')
+        now = datetime.utcnow()
+        campaign = traced('campaign dialer campaigns', campaign_service.active_campaigns)[0]
+        traced('campaign dialer live calls', lambda: campaign_service.live_calls(agent_id, now))
+        placed = traced('campaign dialer claim', lambda: campaign_service.dial(campaign, 10, now))
+        traced('campaign dialer dispatches', lambda: campaign_service.record_dispatches(
+            [(call['id'], f"CA-dial-{call['id']}", None) for call in placed[1:]]
+            + [(placed[0]['id'], None, 'refused')]))
+        traced('campaign dialer reconcile', lambda: campaign_service.reconcile(campaign, now))
+        traced('campaign dialer finish', lambda: campaign_service.finish(campaign, now))
+
+        failures = 0
+        for route, statements in checks:
+            for statement, parameters in statements:
+                plan, problems = explain(statement, parameters)
+                status = 'FAIL' if problems else 'ok'
+                failures += bool(problems)
+                print(f'[{status}] {route}: {" ".join(statement.split())[:100]}')
+                for problem in problems:
+                    print(f'       {problem}')
+                if args.verbose or problems:
+                    print('       ' + plan.replace('\n', '\n       '))
+
+        if list_queries != [1, 1]:
+            failures += 1
+            print(f'[FAIL] GET /api/conversations: {list_queries[0]} queries with 3 messages per '
+                  f'conversation, {list_queries[1]} with 23; expected 1 each')
+
+        db.drop_all()
+
+    print(f'\n{failures} problem queries' if failures else '\nAll route queries use indexes')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Duplicate lead scan
+
+Same scan as POST /api/leads/duplicates/scan, run in the foreground:
+
+    python scripts/dedup_leads.py --user-email owner@example.com
+    python scripts/dedup_leads.py --user-id 3 --min-score 0.9
+    python scripts/dedup_leads.py --user-id 3 --merge-above 0.97   # also merge the near-certain ones
+
+Replaces the user's open merge suggestions and prints the scan
+statistics (and merge counts) as JSON.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find duplicate leads and suggest merges')
+    parser.add_argument('--user-id', type=int)
+    parser.add_argument('--user-email')
+    parser.add_argument('--min-score', type=float, help='Suggest pairs scoring at least this (defaults to LEAD_DEDUP_MIN_SCORE)')
+    parser.add_argument('--merge-above', type=float, metavar='SCORE',
+                        help='Merge suggestions scoring at least SCORE right away')
+    args = parser.parse_args()
+    if not args.user_id and not args.user_email:
+        parser.error('--user-id or --user-email is required')
+
+    from app import app
+    from models import User, LeadMergeSuggestion
+    from services.dedup_service import dedup_service
+
+    with app.app_context():
+        dedup_service.init_app(app)
+        if args.min_score is not None:
+            dedup_service.min_score = args.min_score
+        user = User.query.get(args.user_id) if args.user_id else User.query.filter_by(email=args.user_email).first()
+        if user is None:
+            raise SystemExit('User not found')
+
+        report = {'scan': dedup_service.scan(user.id)}
+        if args.merge_above is not None:
+            suggestion_ids = [suggestion_id for (suggestion_id,) in LeadMergeSuggestion.query.with_entities(
+                LeadMergeSuggestion.id
+            ).filter(LeadMergeSuggestion.user_id == user.id, LeadMergeSuggestion.status == 'open',
+                     LeadMergeSuggestion.score >= args.merge_above)]
+            report['merged'] = dedup_service.merge_suggestions(user.id, suggestion_ids)
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
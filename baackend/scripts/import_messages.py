@@ -0,0 +1,79 @@
+"""
+Bulk import of conversations and messages from NDJSON
+
+Same format and code path as POST /api/conversations/import, for files too
+large to upload:
+
+    python scripts/import_messages.py history.ndjson --user-email owner@example.com
+    zcat history.ndjson.gz | python scripts/import_messages.py - --user-id 3 --batch-size 10000
+
+Prints a progress line per committed batch and the summary as JSON. Use
+--generate N to write a synthetic file for throughput testing instead.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def generate(path, messages, per_conversation):
+    words = 'hello pricing demo call team plan contract budget support follow up next week thanks'.split()
+    started = datetime(2024, 1, 1)
+    with open(path, 'w') as f:
+        for i in range(0, messages, per_conversation):
+            conversation = f'legacy-{i // per_conversation}'
+            f.write(json.dumps({'type': 'conversation', 'id': conversation, 'title': f'Legacy {conversation}',
+                                'status': 'closed', 'created_at': started.isoformat()}) + '\n')
+            for j in range(min(per_conversation, messages - i)):
+                f.write(json.dumps({
+                    'type': 'message',
+                    'conversation': conversation,
+                    'sender_type': 'lead' if j % 2 else 'bot',
+                    'content': ' '.join(random.choices(words, k=random.randint(5, 30))),
+                    'created_at': (started + timedelta(minutes=i + j)).isoformat() + 'Z'
+                }) + '\n')
+    print(f'Wrote {messages} messages to {path}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import conversations and messages from NDJSON')
+    parser.add_argument('path', help="NDJSON file, or - for stdin")
+    parser.add_argument('--user-id', type=int)
+    parser.add_argument('--user-email')
+    parser.add_argument('--batch-size', type=int, help='Messages per transaction (defaults to IMPORT_BATCH_SIZE)')
+    parser.add_argument('--generate', type=int, metavar='N', help='Write N synthetic messages to path and exit')
+    parser.add_argument('--per-conversation', type=int, default=50)
+    args = parser.parse_args()
+
+    if args.generate:
+        generate(args.path, args.generate, args.per_conversation)
+        return
+    if not args.user_id and not args.user_email:
+        parser.error('--user-id or --user-email is required')
+
+    from app import app
+    from models import User
+    from services.import_service import import_service
+
+    with app.app_context():
+        import_service.init_app(app)
+        user = User.query.get(args.user_id) if args.user_id else User.query.filter_by(email=args.user_email).first()
+        if user is None:
+            raise SystemExit('User not found')
+
+        def progress(report):
+            print(f"batch {report['batches']}: {report['messages_inserted']} messages, "
+                  f"{report['messages_per_second']} msg/s, {report['errors']} errors", flush=True)
+
+        source = sys.stdin if args.path == '-' else open(args.path, encoding='utf-8')
+        with source:
+            report = import_service.import_conversations(source, user.id, args.batch_size, progress)
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Background job worker
+
+Claims jobs from the database queue (agent replies to new messages, call
+recording downloads) and runs them on a pool of threads. Start one or
+more next to the web workers; with a pub/sub broker configured, replies
+reach SSE clients held by any web worker and idle workers wake as soon
+as a job is queued:
+
+    PUBSUB_BROKER_URL=unix:///tmp/vly-pubsub.sock python scripts/job_worker.py --concurrency 8
+
+Without a broker, workers fall back to polling every JOB_POLL_INTERVAL
+seconds. SIGINT/SIGTERM stop claiming and let running jobs finish.
+"""
+import argparse
+import logging
+import os
+import signal
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from services import init_services, job_queue
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run background job workers')
+    parser.add_argument('--concurrency', type=int,
+                        help='Worker threads (defaults to JOB_WORKER_CONCURRENCY)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(threadName)s %(levelname)s %(message)s')
+    with app.app_context():
+        init_services(app)
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    worker = job_queue.start_workers(app, args.concurrency)
+    print(f'Job worker running with {worker.concurrency} threads')
+    stop.wait()
+    print('Stopping; waiting for running jobs')
+    worker.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""
+Open-loop load test for the AI endpoints
+
+Drives /openai/chat, /openai/embeddings and /memory/search at a target
+request rate and reports throughput and latency percentiles per endpoint.
+Requests are issued on a fixed schedule regardless of how fast earlier ones
+complete, and latency is measured from the scheduled send time, so a slow
+server cannot hide its queueing delay (coordinated omission).
+
+Run it against the backend pointed at scripts/openai_stub.py to avoid API
+spend:
+
+    python scripts/loadtest.py --base-url http://localhost:5000/api \\
+        --email load@test.dev --password secret --rps 50 --duration 60 \\
+        --mix chat=2,embeddings=1,memory=1
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+PROMPTS = (
+    'What does your pricing look like for a team of 20?',
+    'Can the voice agent call leads outside business hours?',
+    'Summarize my last conversation with Acme Corp.',
+    'Which leads asked about integrations last week?',
+    'Draft a follow-up for a lead that missed the demo.',
+)
+
+SCENARIOS = {
+    'chat': ('/openai/chat', lambda: {
+        'messages': [
+            {'role': 'system', 'content': 'You are a helpful sales assistant.'},
+            {'role': 'user', 'content': random.choice(PROMPTS)}
+        ],
+        'max_tokens': 150
+    }),
+    'embeddings': ('/openai/embeddings', lambda: {
+        'text': random.choice(PROMPTS)
+    }),
+    'memory': ('/memory/search', lambda: {
+        'query': random.choice(PROMPTS),
+        'limit': 5
+    }),
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))]
+
+
+class Results:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    def record(self, scenario, status, latency):
+        with self._lock:
+            self.statuses[scenario][status] += 1
+            if status == 200 or status == 201:
+                self.latencies[scenario].append(latency)
+
+    def report(self, elapsed):
+        report = {}
+        for scenario, statuses in self.statuses.items():
+            latencies = self.latencies[scenario]
+            total = sum(statuses.values())
+            report[scenario] = {
+                'requests': total,
+                'ok': len(latencies),
+                'errors': {str(k): v for k, v in statuses.items() if k not in (200, 201)},
+                'throughput_rps': round(len(latencies) / elapsed, 2),
+                'latency_ms': {
+                    name: round(percentile(latencies, pct) * 1000, 1) if latencies else None
+                    for name, pct in (('p50', 50), ('p90', 90), ('p95', 95), ('p99', 99), ('max', 100))
+                }
+            }
+        return report
+
+
+def post_json(url, payload, token=None, timeout=60):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    req = urllib.request.Request(url, data=json.dumps(payload).encode(), headers=headers, method='POST')
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+    except (urllib.error.URLError, TimeoutError, ConnectionError):
+        return 'connection_error', b''
+
+
+def login(base_url, email, password):
+    status, body = post_json(f'{base_url}/auth/login', {'email': email, 'password': password})
+    if status != 200:
+        raise SystemExit(f'Login failed ({status}): {body[:200]!r}')
+    return json.loads(body)['access_token']
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise SystemExit(f'Unknown scenario {name!r}; choose from {", ".join(SCENARIOS)}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def run(args):
+    token = args.token or login(args.base_url, args.email, args.password)
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    results = Results()
+    in_flight = threading.Semaphore(args.max_in_flight)
+    dropped = defaultdict(int)
+
+    def fire(scenario, scheduled):
+        path, build = SCENARIOS[scenario]
+        try:
+            status, _ = post_json(args.base_url + path, build(), token, timeout=args.timeout)
+            results.record(scenario, status, time.monotonic() - scheduled)
+        finally:
+            in_flight.release()
+
+    interval = 1.0 / args.rps
+    total = int(args.rps * args.duration)
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.max_in_flight) as pool:
+        for i in range(total):
+            scheduled = started + i * interval
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            scenario = random.choices(names, weights)[0]
+            if not in_flight.acquire(blocking=False):
+                # Client saturated; count it rather than silently slowing down
+                dropped[scenario] += 1
+                continue
+            pool.submit(fire, scenario, scheduled)
+    elapsed = time.monotonic() - started
+
+    report = results.report(elapsed)
+    for scenario, count in dropped.items():
+        report.setdefault(scenario, {})['dropped_client_side'] = count
+    return {
+        'target_rps': args.rps,
+        'duration_s': round(elapsed, 2),
+        'scenarios': report
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the AI endpoints')
+    parser.add_argument('--base-url', default='http://localhost:5000/api',
+                        help='URL prefix the service routes are mounted under')
+    parser.add_argument('--token', help='JWT access token; otherwise log in with --email/--password')
+    parser.add_argument('--email')
+    parser.add_argument('--password')
+    parser.add_argument('--rps', type=float, default=20.0, help='Target requests per second')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run')
+    parser.add_argument('--mix', default='chat=1,embeddings=1,memory=1',
+                        help='Scenario weights, e.g. chat=2,embeddings=1')
+    parser.add_argument('--max-in-flight', type=int, default=256)
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--output', help='Also write the JSON report to this file')
+    args = parser.parse_args()
+
+    if not args.token and not (args.email and args.password):
+        parser.error('--token or --email/--password is required')
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+
+
+if __name__ == '__main__':
+    main()
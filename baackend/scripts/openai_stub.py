@@ -0,0 +1,249 @@
+"""
+Offline OpenAI-compatible stub server
+
+Serves /v1/chat/completions (plain and streaming), /v1/embeddings and
+/v1/models with configurable latency, token rates and injected failures, so
+the AI paths can be load-tested without network access or API spend.
+
+Point the backend at it with:
+
+    OPENAI_BASE_URL=http://localhost:8001/v1 OPENAI_API_KEY=stub
+
+Example:
+
+    python scripts/openai_stub.py --port 8001 --ttft lognormal:0.35,0.5 \\
+        --token-rate 60 --completion-tokens 40,200 --error-rate 0.01
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+
+import numpy as np
+from flask import Flask, Response, jsonify, request
+
+
+def parse_distribution(spec):
+    """
+    Parse a latency distribution spec into a sampler returning seconds.
+
+    Supported forms: fixed:S, uniform:LO,HI, normal:MU,SIGMA and
+    lognormal:MEDIAN,SIGMA.
+    """
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',')] if params else []
+    if kind == 'fixed':
+        return lambda: values[0]
+    if kind == 'uniform':
+        return lambda: random.uniform(values[0], values[1])
+    if kind == 'normal':
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == 'lognormal':
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1])
+    raise ValueError(f"Unknown distribution: {spec}")
+
+
+def parse_range(spec):
+    """Parse 'N' or 'LO,HI' into a sampler of ints"""
+    parts = [int(v) for v in spec.split(',')]
+    if len(parts) == 1:
+        return lambda: parts[0]
+    return lambda: random.randint(parts[0], parts[1])
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class StubStats:
+    def __init__(self):
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+
+def create_app(args):
+    app = Flask(__name__)
+    ttft = parse_distribution(args.ttft)
+    embedding_latency = parse_distribution(args.embedding_latency)
+    completion_tokens = parse_range(args.completion_tokens)
+    stats = StubStats()
+
+    def inject_failure():
+        """Return an error response or stall, according to the configured rates"""
+        roll = random.random()
+        if roll < args.error_rate:
+            stats.incr('injected_500')
+            return jsonify({'error': {'message': 'Injected server error', 'type': 'server_error'}}), 500
+        roll -= args.error_rate
+        if roll < args.rate_limit_rate:
+            stats.incr('injected_429')
+            return jsonify({'error': {'message': 'Injected rate limit', 'type': 'rate_limit_error'}}), 429
+        roll -= args.rate_limit_rate
+        if roll < args.hang_rate:
+            stats.incr('injected_hang')
+            time.sleep(args.hang_seconds)
+        return None
+
+    def completion_text(n_tokens):
+        return ' '.join(random.choice(WORDS) for _ in range(n_tokens))
+
+    @app.route('/v1/models', methods=['GET'])
+    def models():
+        return jsonify({
+            'object': 'list',
+            'data': [{'id': m, 'object': 'model', 'owned_by': 'stub'} for m in args.models]
+        })
+
+    @app.route('/v1/chat/completions', methods=['POST'])
+    def chat_completions():
+        stats.incr('chat')
+        body = request.get_json()
+        failure = inject_failure()
+        if failure is not None:
+            return failure
+
+        model = body.get('model', args.models[0])
+        prompt_tokens = sum(estimate_tokens(str(m.get('content') or '')) for m in body.get('messages', []))
+        n_tokens = min(completion_tokens(), body.get('max_tokens') or 1 << 30)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': n_tokens,
+            'total_tokens': prompt_tokens + n_tokens,
+            # The real API nests these detail objects in usage
+            'prompt_tokens_details': {'cached_tokens': 0, 'audio_tokens': 0},
+            'completion_tokens_details': {'reasoning_tokens': 0, 'audio_tokens': 0,
+                                          'accepted_prediction_tokens': 0, 'rejected_prediction_tokens': 0}
+        }
+
+        if not body.get('stream'):
+            time.sleep(ttft() + n_tokens / args.token_rate)
+            return jsonify({
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': created,
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': completion_text(n_tokens)},
+                    'finish_reason': 'stop'
+                }],
+                'usage': usage
+            })
+
+        include_usage = (body.get('stream_options') or {}).get('include_usage')
+
+        def chunk(delta, finish_reason=None):
+            return 'data: ' + json.dumps({
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+            }) + '\n\n'
+
+        def generate():
+            time.sleep(ttft())
+            yield chunk({'role': 'assistant', 'content': ''})
+            for i in range(n_tokens):
+                if i:
+                    time.sleep(1.0 / args.token_rate)
+                yield chunk({'content': random.choice(WORDS) + ' '})
+            yield chunk({}, finish_reason='stop')
+            if include_usage:
+                yield 'data: ' + json.dumps({
+                    'id': completion_id,
+                    'object': 'chat.completion.chunk',
+                    'created': created,
+                    'model': model,
+                    'choices': [],
+                    'usage': usage
+                }) + '\n\n'
+            yield 'data: [DONE]\n\n'
+
+        return Response(generate(), mimetype='text/event-stream')
+
+    @app.route('/v1/embeddings', methods=['POST'])
+    def embeddings():
+        stats.incr('embeddings')
+        body = request.get_json()
+        failure = inject_failure()
+        if failure is not None:
+            return failure
+
+        inputs = body.get('input')
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        time.sleep(embedding_latency())
+
+        data = []
+        for i, text in enumerate(inputs):
+            # Deterministic per text so repeated queries embed identically
+            seed = int.from_bytes(hashlib.sha256(str(text).encode()).digest()[:8], 'little')
+            vector = np.random.default_rng(seed).standard_normal(args.embedding_dim)
+            vector /= np.linalg.norm(vector)
+            data.append({'object': 'embedding', 'index': i, 'embedding': vector.round(6).tolist()})
+
+        prompt_tokens = sum(estimate_tokens(str(t)) for t in inputs)
+        return jsonify({
+            'object': 'list',
+            'model': body.get('model', 'text-embedding-3-small'),
+            'data': data,
+            'usage': {'prompt_tokens': prompt_tokens, 'total_tokens': prompt_tokens}
+        })
+
+    @app.route('/stub/stats', methods=['GET'])
+    def stub_stats():
+        return jsonify(stats.counts)
+
+    return app
+
+
+WORDS = (
+    'thanks', 'for', 'reaching', 'out', 'we', 'can', 'schedule', 'a', 'demo',
+    'next', 'week', 'our', 'plan', 'includes', 'voice', 'agents', 'and',
+    'lead', 'scoring', 'would', 'you', 'like', 'pricing', 'details', 'today'
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OpenAI-compatible stub server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--models', nargs='+', default=['gpt-4o', 'gpt-4o-mini'])
+    parser.add_argument('--ttft', default='lognormal:0.3,0.5',
+                        help='Time to first token distribution (seconds)')
+    parser.add_argument('--token-rate', type=float, default=80.0,
+                        help='Completion tokens generated per second')
+    parser.add_argument('--completion-tokens', default='20,150',
+                        help='Completion length, N or LO,HI')
+    parser.add_argument('--embedding-latency', default='lognormal:0.05,0.4')
+    parser.add_argument('--embedding-dim', type=int, default=1536)
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fraction of requests answered with HTTP 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0,
+                        help='Fraction of requests answered with HTTP 429')
+    parser.add_argument('--hang-rate', type=float, default=0.0,
+                        help='Fraction of requests that stall before answering')
+    parser.add_argument('--hang-seconds', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    app = create_app(args)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+"""
+Local pub/sub broker for multi-worker deployments
+
+Fans SSE message events out between gunicorn workers on one host. Start it
+next to the app and point the workers at it:
+
+    python scripts/pubsub_broker.py unix:///tmp/vly-pubsub.sock
+    PUBSUB_BROKER_URL=unix:///tmp/vly-pubsub.sock gunicorn -k gthread --threads 32 -w 4 app:app
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.pubsub_service import PubSubBroker
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local pub/sub broker')
+    parser.add_argument('url', nargs='?', default=os.getenv('PUBSUB_BROKER_URL', 'unix:///tmp/vly-pubsub.sock'),
+                        help='unix:///path or tcp://host:port')
+    args = parser.parse_args()
+
+    print(f'Pub/sub broker listening on {args.url}')
+    PubSubBroker(args.url).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
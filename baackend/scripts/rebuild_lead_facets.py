@@ -0,0 +1,39 @@
+"""
+Lead facet recount
+
+The per-status and per-source lead counts are kept up to date on write;
+this recounts them from the leads table, e.g. after editing leads by hand:
+
+    python scripts/rebuild_lead_facets.py               # every account
+    python scripts/rebuild_lead_facets.py --user-id 3
+
+Prints the number of facet rows as JSON.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recount lead facets from the leads table')
+    parser.add_argument('--user-id', type=int, help='Only this account')
+    args = parser.parse_args()
+
+    from app import app
+    from models import db, LeadFacet
+    from models.lead_facet import rebuild_lead_facets
+
+    with app.app_context():
+        rebuild_lead_facets(db.session.connection(), [args.user_id] if args.user_id else None)
+        db.session.commit()
+        query = LeadFacet.query
+        if args.user_id:
+            query = query.filter_by(user_id=args.user_id)
+        print(json.dumps({'facets': query.count()}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Lead score maintenance
+
+Scores follow events as they are written; this applies recency decay to
+the stored scores and rebuilds accounts from their history:
+
+    python scripts/score_leads.py                      # decay every scored lead (run from cron)
+    python scripts/score_leads.py --user-id 3          # decay one account
+    python scripts/score_leads.py --rescore --user-id 3
+    python scripts/score_leads.py --rescore --all      # rebuild every account
+
+Prints the counts as JSON.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Refresh or rebuild lead scores')
+    parser.add_argument('--user-id', type=int, help='Only this account')
+    parser.add_argument('--rescore', action='store_true', help='Rebuild engagement from message and call history')
+    parser.add_argument('--all', action='store_true', help='With --rescore: every account')
+    args = parser.parse_args()
+    if args.rescore and not (args.user_id or args.all):
+        parser.error('--rescore needs --user-id or --all')
+
+    from app import app
+    from models import db, User
+    from services.scoring_service import scoring_service
+
+    with app.app_context():
+        started = time.monotonic()
+        if args.rescore:
+            user_ids = [args.user_id] if args.user_id else db.session.execute(db.select(User.id)).scalars().all()
+            report = {'leads': 0, 'messages': 0, 'calls': 0, 'changed': 0}
+            for user_id in user_ids:
+                for key, value in scoring_service.rescore_user(user_id).items():
+                    report[key] += value
+        else:
+            report = scoring_service.refresh_scores(args.user_id)
+        report['seconds'] = round(time.monotonic() - started, 2)
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+"""
+Stand-in telephony provider for webhook and dialer load tests
+
+Generates call status event streams the way a provider sends them and
+replays them against POST /api/telephony/events, open loop at a target
+event rate, with redeliveries and out-of-order delivery mixed in:
+
+    # 5000 calls for existing call logs 1..5000 (or seed them for a user)
+    python scripts/telephony_stub.py generate --calls 5000 --first-call-log-id 1 > events.ndjson
+    python scripts/telephony_stub.py generate --calls 5000 --seed-user-id 3 > events.ndjson
+
+    python scripts/telephony_stub.py replay events.ndjson --rate 3000 --batch 10 \\
+        --duplicates 0.05 --reorder 20 --secret "$TELEPHONY_WEBHOOK_SECRET"
+
+Then drain the inbox with scripts/telephony_writer.py (or leave it
+running) and check the calls. Replay prints throughput and latency
+percentiles as JSON.
+
+`serve` is a fake provider API for the campaign dialer: POST /calls
+answers with a call id and then plays out that call's lifecycle against
+the status callback, time compressed by --speed. Answered calls end with
+a recording URL served by the stub itself (GET /recordings/<id>.wav, a
+tone as long as the call). The job worker only fetches that plain http
+localhost URL with RECORDING_FETCH_ALLOWED_HOSTS=localhost and
+RECORDING_FETCH_ALLOW_INSECURE=true:
+
+    python scripts/telephony_stub.py serve --port 5070 --speed 30 --fail-rate 0.01
+    TELEPHONY_API_URL=http://localhost:5070 \\
+    TELEPHONY_STATUS_CALLBACK_URL=http://localhost:5000/api/telephony/events \\
+        python scripts/campaign_dialer.py
+
+Stats are printed as JSON on exit.
+"""
+import argparse
+import hashlib
+import heapq
+import hmac
+import itertools
+import json
+import math
+import os
+import random
+import signal
+import struct
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from loadtest import percentile
+
+# Share of calls ending each way; the rest are answered
+OUTCOMES = (('no-answer', 0.2), ('busy', 0.08), ('failed', 0.04))
+# Served recordings: 8 kHz mono 16-bit PCM
+RECORDING_RATE = 8000
+
+
+def call_events(call_log_id, started):
+    """One call's events in provider order, with realistic gaps"""
+    call_id = 'CA' + uuid.uuid4().hex
+    at = started
+    events = []
+
+    def event(**fields):
+        events.append({'id': 'EV' + uuid.uuid4().hex, 'call_id': call_id, 'call_log_id': call_log_id,
+                       'timestamp': at.isoformat() + 'Z', **fields})
+
+    event(status='initiated')
+    at += timedelta(seconds=random.uniform(0.2, 1.5))
+    event(status='ringing')
+    at += timedelta(seconds=random.uniform(3, 25))
+    roll = random.random()
+    for status, share in OUTCOMES:
+        if roll < share:
+            event(status=status, duration=0)
+            return events
+        roll -= share
+    event(status='in-progress')
+    duration = int(random.lognormvariate(4.5, 0.9))
+    at += timedelta(seconds=duration)
+    event(status='completed', duration=duration)
+    at += timedelta(seconds=random.uniform(1, 10))
+    event(recording_url=f'https://recordings.example.com/{call_id}.mp3')
+    return events
+
+
+def seed_calls(user_id, count):
+    """Create call logs to receive the generated events"""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import app
+    from models import db, CallLog
+
+    with app.app_context():
+        now = datetime.utcnow()
+        first = (db.session.execute(db.select(db.func.max(CallLog.id))).scalar() or 0) + 1
+        db.session.execute(CallLog.__table__.insert(), [
+            {'id': first + i, 'user_id': user_id, 'from_number': '+15550000000',
+             'to_number': f'+1555{random.randint(0, 9999999):07d}', 'direction': 'outbound',
+             'status': 'queued', 'duration': 0, 'created_at': now}
+            for i in range(count)
+        ])
+        db.session.commit()
+    return first
+
+
+def generate(args):
+    first = seed_calls(args.seed_user_id, args.calls) if args.seed_user_id else args.first_call_log_id
+    started = datetime.utcnow()
+    for i in range(args.calls):
+        # Calls start over the spread so that their events interleave
+        offset = timedelta(seconds=random.uniform(0, args.spread))
+        for event in call_events(first + i, started + offset):
+            sys.stdout.write(json.dumps(event) + '\n')
+
+
+def delivery_order(events, duplicates, reorder):
+    """Send order: by timestamp, shuffled within a window, with redeliveries"""
+    events = sorted(events, key=lambda event: event['timestamp'])
+    order = []
+    for i in range(0, len(events), max(reorder, 1)):
+        window = events[i:i + max(reorder, 1)]
+        random.shuffle(window)
+        order.extend(window)
+    for event in random.sample(events, int(len(events) * duplicates)):
+        # Redelivered a little later, like a provider retry
+        order.insert(min(len(order), order.index(event) + random.randint(1, 200)), event)
+    return order
+
+
+def post(url, body, secret, timeout):
+    headers = {'Content-Type': 'application/json'}
+    if secret:
+        headers['X-Telephony-Signature'] = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    req = urllib.request.Request(url, data=body, headers=headers, method='POST')
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, {}
+    except (urllib.error.URLError, TimeoutError, ConnectionError):
+        return 'connection_error', {}
+
+
+def replay(args):
+    with open(args.events) as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    order = delivery_order(events, args.duplicates, args.reorder)
+    batches = [order[i:i + args.batch] for i in range(0, len(order), args.batch)]
+
+    statuses = defaultdict(int)
+    counts = defaultdict(int)
+    latencies = []
+    lock = threading.Lock()
+    in_flight = threading.Semaphore(args.max_in_flight)
+    dropped = 0
+
+    def fire(batch, scheduled):
+        try:
+            body = json.dumps({'events': batch}).encode()
+            status, result = post(args.url, body, args.secret, args.timeout)
+            with lock:
+                statuses[status] += 1
+                if status == 202:
+                    latencies.append(time.monotonic() - scheduled)
+                    counts['accepted'] += result.get('accepted', 0)
+                    counts['duplicates'] += result.get('duplicates', 0)
+        finally:
+            in_flight.release()
+
+    interval = args.batch / args.rate
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.max_in_flight) as pool:
+        for i, batch in enumerate(batches):
+            scheduled = started + i * interval
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            if not in_flight.acquire(blocking=False):
+                dropped += 1
+                continue
+            pool.submit(fire, batch, scheduled)
+    elapsed = time.monotonic() - started
+
+    return {
+        'events': len(events),
+        'deliveries': len(order),
+        'requests': len(batches),
+        'target_events_per_second': args.rate,
+        'events_per_second': round(sum(len(batch) for batch in batches) / elapsed, 1),
+        'duration_s': round(elapsed, 2),
+        'statuses': {str(status): count for status, count in statuses.items()},
+        'accepted': counts['accepted'],
+        'duplicates': counts['duplicates'],
+        'dropped_client_side': dropped,
+        'latency_ms': {
+            name: round(percentile(latencies, pct) * 1000, 1) if latencies else None
+            for name, pct in (('p50', 50), ('p90', 90), ('p99', 99), ('max', 100))
+        }
+    }
+
+
+class FakeProvider:
+    """Accepts calls and delivers each one's events when they fall due"""
+
+    def __init__(self, args):
+        self.args = args
+        self.stats = defaultdict(int)
+        self._due = []
+        self._order = itertools.count()
+        self._wake = threading.Condition()
+        self._senders = ThreadPoolExecutor(max_workers=args.senders)
+        threading.Thread(target=self._deliver, name='deliver', daemon=True).start()
+
+    def place(self, request):
+        """Events for a new call, scheduled against its callback; None to refuse it"""
+        if self.args.latency:
+            time.sleep(self.args.latency / 1000)
+        if random.random() < self.args.fail_rate:
+            self.stats['refused'] += 1
+            return None
+        callback = request.get('status_callback') or self.args.webhook_url
+        started = datetime.utcnow()
+        events = call_events(request.get('call_log_id'), started)
+        with self._wake:
+            for event in events:
+                if event.get('recording_url'):
+                    event['recording_url'] = (f"{self.args.recording_base_url}/recordings/{event['call_id']}.wav"
+                                              f"?seconds={events[-2].get('duration', 0)}")
+                # Compress the call's timeline and stamp events with when they are sent
+                offset = (datetime.fromisoformat(event['timestamp'][:-1]) - started) / self.args.speed
+                event['timestamp'] = (started + offset).isoformat() + 'Z'
+                heapq.heappush(self._due, (time.monotonic() + offset.total_seconds(), next(self._order),
+                                           callback, event))
+            self._wake.notify()
+        self.stats['calls'] += 1
+        return events[0]['call_id']
+
+    def _deliver(self):
+        while True:
+            with self._wake:
+                while not self._due or self._due[0][0] > time.monotonic():
+                    self._wake.wait(self._due[0][0] - time.monotonic() if self._due else None)
+                _, _, callback, event = heapq.heappop(self._due)
+            self._senders.submit(self._send, callback, event)
+
+    def _send(self, callback, event):
+        status, _ = post(callback, json.dumps(event).encode(), self.args.secret, 10)
+        self.stats[f'events_{status}'] += 1
+
+
+def recording_chunks(seconds):
+    """A WAV file of a tone lasting `seconds`, one second of audio per chunk"""
+    size = seconds * RECORDING_RATE * 2
+    yield (b'RIFF' + struct.pack('<I', 36 + size) + b'WAVEfmt '
+           + struct.pack('<IHHIIHH', 16, 1, 1, RECORDING_RATE, RECORDING_RATE * 2, 2, 16)
+           + b'data' + struct.pack('<I', size))
+    second = struct.pack(f'<{RECORDING_RATE}h', *(int(8000 * math.sin(2 * math.pi * 440 * i / RECORDING_RATE))
+                                                  for i in range(RECORDING_RATE)))
+    for _ in range(seconds):
+        yield second
+
+
+def serve(args):
+    provider = FakeProvider(args)
+    args.recording_base_url = (args.recording_base_url or f'http://localhost:{args.port}').rstrip('/')
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if not url.path.startswith('/recordings/'):
+                self.send_error(404)
+                return
+            seconds = min(int(parse_qs(url.query).get('seconds', ['60'])[0]), 4 * 3600)
+            provider.stats['recordings'] += 1
+            self.send_response(200)
+            self.send_header('Content-Type', 'audio/wav')
+            self.send_header('Content-Length', str(44 + seconds * RECORDING_RATE * 2))
+            self.end_headers()
+            for chunk in recording_chunks(seconds):
+                self.wfile.write(chunk)
+
+        def do_POST(self):
+            if self.path.rstrip('/') != '/calls':
+                self.send_error(404)
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            except ValueError:
+                self.send_error(400)
+                return
+            call_id = provider.place(request)
+            body = json.dumps({'call_id': call_id} if call_id else {'message': 'Unavailable'}).encode()
+            self.send_response(201 if call_id else 503)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('0.0.0.0', args.port), Handler)
+    server.daemon_threads = True
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    print(f'Fake telephony provider on port {args.port}', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return dict(provider.stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate and replay telephony webhook events')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    gen = commands.add_parser('generate', help='Write an NDJSON event stream to stdout')
+    gen.add_argument('--calls', type=int, default=1000)
+    gen.add_argument('--first-call-log-id', type=int, default=1, help='Events target call logs from this id on')
+    gen.add_argument('--seed-user-id', type=int, help='Create the call logs for this user first')
+    gen.add_argument('--spread', type=float, default=60.0, help='Seconds over which calls start')
+    gen.add_argument('--seed', type=int, help='Random seed')
+
+    rep = commands.add_parser('replay', help='POST an event stream to the webhook')
+    rep.add_argument('events', help='NDJSON file from generate')
+    rep.add_argument('--url', default='http://localhost:5000/api/telephony/events')
+    rep.add_argument('--secret', help='TELEPHONY_WEBHOOK_SECRET to sign requests with')
+    rep.add_argument('--rate', type=float, default=1000.0, help='Target events per second')
+    rep.add_argument('--batch', type=int, default=1, help='Events per request')
+    rep.add_argument('--duplicates', type=float, default=0.0, help='Share of events delivered twice')
+    rep.add_argument('--reorder', type=int, default=1, help='Shuffle delivery within windows of this many events')
+    rep.add_argument('--max-in-flight', type=int, default=64)
+    rep.add_argument('--timeout', type=float, default=30.0)
+    rep.add_argument('--seed', type=int, help='Random seed')
+
+    srv = commands.add_parser('serve', help='Run a fake provider API that places calls')
+    srv.add_argument('--port', type=int, default=5070)
+    srv.add_argument('--webhook-url', default='http://localhost:5000/api/telephony/events',
+                     help='Status callback for calls placed without one')
+    srv.add_argument('--secret', help='TELEPHONY_WEBHOOK_SECRET to sign events with')
+    srv.add_argument('--speed', type=float, default=10.0, help='Calls play out this many times faster')
+    srv.add_argument('--fail-rate', type=float, default=0.0, help='Share of calls refused with a 503')
+    srv.add_argument('--latency', type=float, default=0.0, help='Milliseconds to answer POST /calls')
+    srv.add_argument('--recording-base-url',
+                     help='Where recording URLs in events point (defaults to this server)')
+    srv.add_argument('--senders', type=int, default=16, help='Concurrent webhook deliveries')
+    srv.add_argument('--seed', type=int, help='Random seed')
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    if args.command == 'generate':
+        generate(args)
+    elif args.command == 'replay':
+        print(json.dumps(replay(args), indent=2))
+    else:
+        print(json.dumps(serve(args), indent=2))
+
+
+if __name__ == '__main__':
+    main()
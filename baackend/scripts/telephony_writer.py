@@ -0,0 +1,67 @@
+"""
+Telephony event writer
+
+Applies queued call status webhooks (POST /api/telephony/events) to the
+call logs in batches. Run one next to the web workers:
+
+    python scripts/telephony_writer.py
+    python scripts/telephony_writer.py --drain     # apply what is queued, then exit
+
+On Postgres several writers can share the inbox. SIGINT/SIGTERM stop
+after the batch in progress; the totals are printed as JSON.
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+from services import init_services, telephony_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply telephony webhook events to call logs')
+    parser.add_argument('--batch-size', type=int, help='Events per batch (defaults to TELEPHONY_WRITER_BATCH_SIZE)')
+    parser.add_argument('--drain', action='store_true', help='Exit once the inbox is empty')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(threadName)s %(levelname)s %(message)s')
+    with app.app_context():
+        init_services(app)
+    if args.batch_size:
+        telephony_service.batch_size = args.batch_size
+
+    started = time.monotonic()
+    if args.drain:
+        totals = {}
+        with app.app_context():
+            while True:
+                batch = telephony_service.process_batch()
+                for key, value in batch.items():
+                    totals[key] = totals.get(key, 0) + value
+                if not batch['events']:
+                    break
+            db.session.remove()
+    else:
+        stop = threading.Event()
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+        writer = telephony_service.start_writer(app)
+        print(f'Telephony writer running (batches of {telephony_service.batch_size})')
+        stop.wait()
+        writer.stop()
+        totals = dict(writer.stats)
+    totals['seconds'] = round(time.monotonic() - started, 2)
+    print(json.dumps(totals, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Cold storage tiering for archived conversations
+
+Moves the messages of conversations that have been closed or archived for
+longer than MESSAGE_TIERING_AGE_DAYS into compressed segments in
+message_archives. Work happens in batches of MESSAGE_TIERING_BATCH_SIZE
+conversations, one transaction per conversation, so it can run from cron
+while the app is serving:
+
+    python scripts/tier_messages.py                      # until nothing is left
+    python scripts/tier_messages.py --max-batches 10 --age-days 90
+    python scripts/tier_messages.py --dry-run            # count candidates only
+
+Reads through the API stay transparent; reopening a conversation moves its
+messages back.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from services.tiering_service import tiering_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move archived conversations to cold storage')
+    parser.add_argument('--age-days', type=float, help='Defaults to MESSAGE_TIERING_AGE_DAYS')
+    parser.add_argument('--batch-size', type=int, help='Defaults to MESSAGE_TIERING_BATCH_SIZE')
+    parser.add_argument('--max-batches', type=int, help='Stop after this many batches')
+    parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+    parser.add_argument('--dry-run', action='store_true', help='Report the next batch without moving it')
+    args = parser.parse_args()
+
+    with app.app_context():
+        tiering_service.init_app(app)
+        if args.dry_run:
+            candidates = tiering_service.candidates(args.batch_size, args.age_days)
+            print(f'{len(candidates)} conversations in the next batch: {candidates}')
+            return
+
+        totals = {'batches': 0, 'conversations': 0, 'messages': 0, 'segments': 0,
+                  'raw_bytes': 0, 'stored_bytes': 0}
+        started = time.monotonic()
+        while args.max_batches is None or totals['batches'] < args.max_batches:
+            stats = tiering_service.tier_batch(args.batch_size, args.age_days)
+            if not stats['conversations']:
+                break
+            totals['batches'] += 1
+            for key, value in stats.items():
+                totals[key] += value
+            print(f"batch {totals['batches']}: {stats['conversations']} conversations, "
+                  f"{stats['messages']} messages", flush=True)
+            if args.pause:
+                time.sleep(args.pause)
+
+        totals['seconds'] = round(time.monotonic() - started, 2)
+        totals['cold_storage'] = tiering_service.stats()
+        print(json.dumps(totals, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,25 +2,64 @@
 Services Package
 
 This package contains various backend services for the application,
-including AI, email, memory, and workflow automation services.
+including AI, email, memory, conversation context, agent tools,
+metrics, pub/sub, background jobs, search, message tiering, bulk import, export, lead scoring, deduplication, call analytics, telephony webhooks, call transcripts, outbound campaigns, call recordings, voice agent configuration and workflow automation services.
 """
 
+import os
+
 # Import service instances
 from .n8n_service import N8NService
 from .openai_service import OpenAIService, openai_service
 from .email_service import EmailService, email_service
 from .memory_service import MemoryService, memory_service
+from .context_service import ContextService, context_service
+from .metrics_service import MetricsService, metrics_service
+from .tool_service import ToolService, tool_service
+from .pubsub_service import PubSubService, pubsub_service
+from .job_queue import JobQueue, job_queue
+from .agent_reply_service import AgentReplyService, agent_reply_service
+from .search_service import SearchService, search_service
+from .tiering_service import TieringService, tiering_service
+from .import_service import ImportService, import_service
+from .export_service import ExportService, export_service
+from .scoring_service import ScoringService, scoring_service
+from .dedup_service import DedupService, dedup_service
+from .analytics_service import AnalyticsService, analytics_service
+from .telephony_service import TelephonyService, telephony_service
+from .transcript_service import TranscriptService, transcript_service
+from .campaign_service import CampaignService, campaign_service
+from .recording_service import RecordingService, recording_service
+from .agent_config_service import AgentConfigService, agent_config_service
 
-# Initialize service instances
+# Initialize service instances. The other services share their module
+# singletons so that routes and callers see the initialized instance.
 n8n_service = N8NService()
-openai_service = OpenAIService()
-email_service = EmailService()
-memory_service = MemoryService()
 
 def init_services(app):
     """Initialize all services with the Flask app"""
     # Initialize each service with the app
+    metrics_service.init_app(app)
     n8n_service.init_app(app)
-    openai_service.init_app(app)
+    # As in app.py: workers that never call OpenAI still start without a key
+    if os.getenv('OPENAI_API_KEY'):
+        openai_service.init_app(app)
     email_service.init_app(app)
     memory_service.init_app(app)
+    context_service.init_app(app)
+    tool_service.init_app(app)
+    pubsub_service.init_app(app)
+    job_queue.init_app(app)
+    agent_reply_service.init_app(app)
+    search_service.init_app(app)
+    tiering_service.init_app(app)
+    import_service.init_app(app)
+    export_service.init_app(app)
+    scoring_service.init_app(app)
+    dedup_service.init_app(app)
+    analytics_service.init_app(app)
+    telephony_service.init_app(app)
+    transcript_service.init_app(app)
+    campaign_service.init_app(app)
+    recording_service.init_app(app)
+    agent_config_service.init_app(app)
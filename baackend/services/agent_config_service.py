@@ -0,0 +1,313 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from string import Template
+from typing import Any, Dict, Iterable, List, Optional
+
+from models import db, VoiceAgent
+from .pubsub_service import pubsub_service
+
+# Published with an agent's new updated_at whenever its configuration changes
+VERSION_TOPIC = 'voice_agent_config'
+
+DEFAULT_SYSTEM_PROMPT = (
+    "You are $agent_name, a voice assistant on a phone call. Speak $language. "
+    "Keep replies short and conversational, ask one question at a time and "
+    "never read out lists or links."
+)
+DEFAULT_GREETING = "Hi, this is $agent_name."
+
+# Known when the agent is compiled; the only ones the system prompt may use,
+# so the prompt prefix is identical for every call and turn
+AGENT_VARIABLES = ('agent_name', 'agent_description', 'language')
+# Filled in per call, in the greeting and the call context
+CALL_VARIABLES = ('lead_name', 'lead_company', 'lead_email', 'lead_phone', 'lead_status', 'lead_source',
+                  'to_number', 'from_number')
+VARIABLE_NAME = re.compile(r'^[a-z][a-z0-9_]{0,39}$')
+
+# field -> maximum length of the template
+TEMPLATE_FIELDS = {'system_prompt': 20000, 'greeting': 1000, 'context_template': 4000}
+CONFIG_FIELDS = tuple(TEMPLATE_FIELDS) + ('model', 'temperature', 'max_tokens', 'variables')
+
+
+class InvalidAgentConfig(ValueError):
+    """Raised for a voice agent configuration that cannot be used"""
+
+
+class CompiledTemplate:
+    """A string.Template ($name, ${name}, $$) split once into literal text and variable names"""
+
+    def __init__(self, parts: List[tuple]):
+        self.parts = parts
+
+    @classmethod
+    def compile(cls, source: str, field: str, allowed: Iterable[str]) -> 'CompiledTemplate':
+        allowed = set(allowed)
+        parts, literal, position = [], '', 0
+        for match in Template.pattern.finditer(source):
+            literal += source[position:match.start()]
+            position = match.end()
+            if match.group('escaped') is not None:
+                literal += '$'
+                continue
+            if match.group('invalid') is not None:
+                raise InvalidAgentConfig(f'{field} has a stray $ at position {match.start()}; write $$ for a dollar sign')
+            name = match.group('named') or match.group('braced')
+            if name not in allowed:
+                raise InvalidAgentConfig(f'{field} cannot use ${name}; available: {", ".join(sorted(allowed))}')
+            parts.append((literal, name))
+            literal = ''
+        parts.append((literal + source[position:], None))
+        return cls(parts)
+
+    def bind(self, values: Dict[str, str]) -> 'CompiledTemplate':
+        """Substitute the variables in `values` now, keeping the others for render"""
+        parts, literal = [], ''
+        for text, name in self.parts:
+            literal += text
+            if name is None:
+                continue
+            if name in values:
+                literal += values[name]
+            else:
+                parts.append((literal, name))
+                literal = ''
+        parts.append((literal, None))
+        return CompiledTemplate(parts)
+
+    def render(self, values: Dict[str, Any]) -> str:
+        return ''.join(text + (str(values.get(name) or '') if name else '') for text, name in self.parts)
+
+
+def validate_config(config: Any) -> Dict[str, Any]:
+    """
+    Check a voice agent config from a request; returns it cleaned. Templates
+    use $name placeholders: the system prompt the agent variables, the
+    greeting and context_template the call variables too.
+    """
+    if config is None:
+        return {}
+    if not isinstance(config, dict):
+        raise InvalidAgentConfig('config must be an object')
+    unknown = set(config) - set(CONFIG_FIELDS)
+    if unknown:
+        raise InvalidAgentConfig(f'Unknown config fields: {", ".join(sorted(unknown))}')
+    cleaned = {}
+    variables = config.get('variables') or {}
+    if not isinstance(variables, dict) or len(variables) > 50:
+        raise InvalidAgentConfig('config.variables must be an object with at most 50 entries')
+    for name, value in variables.items():
+        if not VARIABLE_NAME.match(name) or name in AGENT_VARIABLES + CALL_VARIABLES:
+            raise InvalidAgentConfig(f'config.variables.{name} is not a usable variable name')
+        if not isinstance(value, str) or len(value) > 2000:
+            raise InvalidAgentConfig(f'config.variables.{name} must be a string of at most 2000 characters')
+    if variables:
+        cleaned['variables'] = dict(variables)
+
+    agent_names = AGENT_VARIABLES + tuple(variables)
+    for field, max_length in TEMPLATE_FIELDS.items():
+        if config.get(field) is None:
+            continue
+        value = config[field]
+        if not isinstance(value, str) or not value.strip() or len(value) > max_length:
+            raise InvalidAgentConfig(f'config.{field} must be non-empty text of at most {max_length} characters')
+        CompiledTemplate.compile(value, f'config.{field}',
+                                 agent_names if field == 'system_prompt' else agent_names + CALL_VARIABLES)
+        cleaned[field] = value
+    if config.get('model') is not None:
+        if not isinstance(config['model'], str) or not 0 < len(config['model']) <= 100:
+            raise InvalidAgentConfig('config.model must be a model name')
+        cleaned['model'] = config['model']
+    if config.get('temperature') is not None:
+        value = config['temperature']
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or not 0 <= value <= 2:
+            raise InvalidAgentConfig('config.temperature must be a number from 0 to 2')
+        cleaned['temperature'] = float(value)
+    if config.get('max_tokens') is not None:
+        value = config['max_tokens']
+        if not isinstance(value, int) or isinstance(value, bool) or not 1 <= value <= 4096:
+            raise InvalidAgentConfig('config.max_tokens must be an integer from 1 to 4096')
+        cleaned['max_tokens'] = value
+    return cleaned
+
+
+class CompiledAgentConfig:
+    """
+    Everything an agent turn needs from a VoiceAgent, prepared once.
+
+    prompt_prefix is the rendered system prompt. It depends only on the
+    agent, so every call and turn sends the same leading bytes and
+    providers that cache prompt prefixes can reuse it; prefix_hash
+    identifies it. Per-call details follow in a second system message.
+    """
+
+    def __init__(self, agent, config: Dict[str, Any]):
+        self.agent_id = agent.id
+        self.user_id = agent.user_id
+        self.updated_at = agent.updated_at
+        self.name = agent.name
+        self.voice_id = agent.voice_id
+        self.language = agent.language
+        self.is_active = agent.is_active
+        self.config = config
+
+        agent_values = {'agent_name': agent.name or '', 'agent_description': agent.description or '',
+                        'language': agent.language or 'en', **config.get('variables', {})}
+        self.prompt_prefix = CompiledTemplate.compile(
+            config.get('system_prompt', DEFAULT_SYSTEM_PROMPT), 'config.system_prompt', agent_values
+        ).render(agent_values)
+        self.prefix_hash = hashlib.sha256(self.prompt_prefix.encode()).hexdigest()[:16]
+        call_names = tuple(agent_values) + CALL_VARIABLES
+        self._greeting = CompiledTemplate.compile(
+            config.get('greeting', DEFAULT_GREETING), 'config.greeting', call_names).bind(agent_values)
+        self._context = CompiledTemplate.compile(
+            config['context_template'], 'config.context_template', call_names
+        ).bind(agent_values) if config.get('context_template') else None
+
+    def greeting(self, variables: Dict[str, Any]) -> str:
+        return self._greeting.render(variables)
+
+    def call_context(self, variables: Dict[str, Any]) -> Optional[str]:
+        """The per-call system message; without a context_template, the call variables that are set"""
+        if self._context is not None:
+            return self._context.render(variables)
+        known = [f'- {name}: {variables[name]}' for name in CALL_VARIABLES if variables.get(name)]
+        return 'About this call:\n' + '\n'.join(known) if known else None
+
+    def messages(self, variables: Dict[str, Any], history: Iterable[Dict[str, str]] = ()) -> List[Dict[str, str]]:
+        """Chat messages for a turn: the cached prefix, the call context, then the conversation"""
+        messages = [{'role': 'system', 'content': self.prompt_prefix}]
+        context = self.call_context(variables)
+        if context:
+            messages.append({'role': 'system', 'content': context})
+        messages.extend(history)
+        return messages
+
+    def completion_options(self) -> Dict[str, Any]:
+        """model/temperature/max_tokens set on the agent, for openai_service.chat_completion"""
+        return {field: self.config[field] for field in ('model', 'temperature', 'max_tokens') if field in self.config}
+
+    def call_payload(self, variables: Dict[str, Any]) -> Dict[str, Any]:
+        """What the telephony provider runs a call with: voice, greeting, prompt and model options"""
+        return {'voice_id': self.voice_id, 'language': self.language, 'greeting': self.greeting(variables),
+                'messages': self.messages(variables), **self.completion_options()}
+
+
+def call_variables(lead, to_number: str, from_number: str) -> Dict[str, Any]:
+    """CALL_VARIABLES for a call to `lead` (a Lead or a row with its columns; may be None)"""
+    values = {'to_number': to_number, 'from_number': from_number}
+    if lead is not None:
+        values.update({'lead_name': lead.name, 'lead_company': lead.company, 'lead_email': lead.email,
+                       'lead_phone': lead.phone, 'lead_status': lead.status, 'lead_source': lead.source})
+    return values
+
+
+class AgentConfigService:
+    """
+    Per-process cache of compiled voice agent configurations.
+
+    Entries are keyed by agent id and updated_at. A turn normally touches
+    no database at all: changes made through the API publish the agent's
+    new updated_at on the voice_agent_config pub/sub topic, which reaches
+    every worker through the broker (PUBSUB_BROKER_URL), and each lookup
+    first applies any versions that arrived. As a safety net for missed
+    messages or writes that bypass the API, an entry older than max_age
+    seconds is checked against voice_agents.updated_at (one indexed read)
+    and recompiled only if that changed.
+    """
+
+    def __init__(self, app=None):
+        self.cache_size = 1000
+        self.max_age = 60.0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._subscription = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize the cache with app configuration and follow config changes"""
+        self.cache_size = int(app.config.get(
+            'AGENT_CONFIG_CACHE_SIZE', os.getenv('AGENT_CONFIG_CACHE_SIZE', self.cache_size)))
+        self.max_age = float(app.config.get(
+            'AGENT_CONFIG_MAX_AGE', os.getenv('AGENT_CONFIG_MAX_AGE', self.max_age)))
+        if self._subscription is None:
+            self._subscription = pubsub_service.subscribe(VERSION_TOPIC, maxsize=10000)
+
+    def get(self, agent_id: int) -> Optional[CompiledAgentConfig]:
+        """
+        The agent's compiled configuration, or None if it does not exist.
+        Raises InvalidAgentConfig if the stored config cannot be used.
+        """
+        self._apply_versions()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(agent_id)
+            if entry is not None and now - entry[1] < self.max_age:
+                self._entries.move_to_end(agent_id)
+                return entry[0]
+
+        agents = VoiceAgent.__table__
+        if entry is not None:
+            updated_at = db.session.execute(
+                db.select(agents.c.updated_at).where(agents.c.id == agent_id)
+            ).scalar()
+            if updated_at == entry[0].updated_at:
+                self._store(entry[0], now)
+                return entry[0]
+
+        agent = db.session.execute(db.select(agents).where(agents.c.id == agent_id)).first()
+        if agent is None:
+            self.invalidate(agent_id)
+            return None
+        compiled = CompiledAgentConfig(agent, self._stored_config(agent.config))
+        self._store(compiled, now)
+        return compiled
+
+    def _stored_config(self, config: Any) -> Dict[str, Any]:
+        # Configs written before validation may carry other fields; ignore those
+        if isinstance(config, dict):
+            config = {field: value for field, value in config.items() if field in CONFIG_FIELDS}
+        return validate_config(config)
+
+    def _store(self, compiled: CompiledAgentConfig, checked: float):
+        with self._lock:
+            self._entries[compiled.agent_id] = (compiled, checked)
+            self._entries.move_to_end(compiled.agent_id)
+            while len(self._entries) > self.cache_size:
+                self._entries.popitem(last=False)
+
+    def _apply_versions(self):
+        subscription = self._subscription
+        if subscription is None:
+            return
+        if subscription.overflowed:
+            subscription.overflowed = False
+            with self._lock:
+                self._entries.clear()
+        while True:
+            event = subscription.get(timeout=0)
+            if event is None:
+                return
+            data = event[1]
+            with self._lock:
+                entry = self._entries.get(data['id'])
+                if entry is not None and entry[0].updated_at.isoformat() != data['updated_at']:
+                    del self._entries[data['id']]
+
+    def invalidate(self, agent_id: int):
+        """Drop the agent's entry in this process"""
+        with self._lock:
+            self._entries.pop(agent_id, None)
+
+    def changed(self, agent: VoiceAgent):
+        """Call after committing a change to an agent: drops its entry in every worker"""
+        self.invalidate(agent.id)
+        pubsub_service.publish(VERSION_TOPIC, {'id': agent.id, 'updated_at': agent.updated_at.isoformat()})
+
+# Initialize the service instance
+agent_config_service = AgentConfigService()
@@ -0,0 +1,85 @@
+import os
+from datetime import datetime
+from typing import Optional
+
+from models import db, Conversation, Message, Job
+from .job_queue import job_queue, PermanentJobError
+
+AGENT_REPLY_JOB = 'agent_reply'
+
+DEFAULT_SYSTEM_PROMPT = (
+    "You are a helpful sales assistant. Answer the customer's questions "
+    "accurately and concisely, and move the conversation toward a next step."
+)
+
+
+class AgentReplyService:
+    """Generates bot replies to user messages on the background job queue"""
+
+    def __init__(self, app=None):
+        self.system_prompt = DEFAULT_SYSTEM_PROMPT
+        self.model = None
+        self.max_attempts = 3
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize the reply pipeline with app configuration"""
+        self.system_prompt = app.config.get(
+            'AGENT_SYSTEM_PROMPT', os.getenv('AGENT_SYSTEM_PROMPT', self.system_prompt))
+        self.model = app.config.get('AGENT_REPLY_MODEL', os.getenv('AGENT_REPLY_MODEL')) or None
+        self.max_attempts = int(app.config.get(
+            'AGENT_REPLY_MAX_ATTEMPTS', os.getenv('AGENT_REPLY_MAX_ATTEMPTS', self.max_attempts)))
+
+        job_queue.register(AGENT_REPLY_JOB, self.generate_reply)
+
+    def enqueue(self, message: Message) -> Job:
+        """
+        Queue a reply to a flushed user message. Replies within a conversation
+        are generated one at a time, in the order the messages arrived.
+        """
+        return job_queue.enqueue(
+            AGENT_REPLY_JOB,
+            {'conversation_id': message.conversation_id, 'message_id': message.id},
+            queue_key=f"conversation:{message.conversation_id}",
+            max_attempts=self.max_attempts
+        )
+
+    def generate_reply(self, job: Job) -> Optional[Message]:
+        """Job handler: build context, call the model and add the bot message"""
+        from . import openai_service, context_service
+
+        conversation = db.session.get(Conversation, job.payload['conversation_id'])
+        message = db.session.get(Message, job.payload['message_id'])
+        if conversation is None or message is None:
+            raise PermanentJobError('Conversation or message no longer exists')
+
+        context = context_service.build_context(conversation, self.system_prompt, query=message.content)
+        result = openai_service.chat_completion(
+            messages=context['messages'],
+            model=self.model,
+            user_id=conversation.user_id
+        )
+        if not result['success']:
+            raise RuntimeError(result['error'])
+
+        completion = result['data']
+        reply = Message(
+            conversation_id=conversation.id,
+            sender_type='bot',
+            content=completion['choices'][0]['message'].get('content') or '',
+            message_metadata={
+                'in_reply_to': message.id,
+                'model': completion['model'],
+                'usage': completion['usage'],
+                'context_tokens': context['token_count']
+            }
+        )
+        db.session.add(reply)
+        conversation.updated_at = datetime.utcnow()
+        # Committed by the job queue together with marking the job done
+        return reply
+
+# Initialize the service instance
+agent_reply_service = AgentReplyService()
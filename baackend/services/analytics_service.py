@@ -0,0 +1,383 @@
+import os
+import math
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import attributes
+
+from models import db, CallLog, CallRollup, CallDurationBin
+from models.counters import add_counts
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_PERIODS = ('hour', 'day')
+# Calls still in these states have no outcome yet and stay out of the answer rate
+IN_FLIGHT_STATUSES = ('queued', 'initiated', 'ringing', 'in-progress')
+ANSWERED_STATUS = 'completed'
+QUANTILES = (0.5, 0.9, 0.99)
+
+# Duration sketch: bin i > 0 holds durations in (GAMMA**(i-2), GAMMA**(i-1)]
+# seconds and bin 0 zero-length calls, so a bin's midpoint is within
+# SKETCH_ACCURACY of every duration in it. Changing it invalidates stored bins.
+SKETCH_ACCURACY = 0.02
+GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+
+# Call fields a rollup depends on
+ROLLUP_FIELDS = ('user_id', 'voice_agent_id', 'created_at', 'status', 'duration')
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_HOUR = EPOCH.toordinal() * 24
+# Backfill grouping keys: hours since EPOCH, then 33 bits of agent id and
+# 10 bits of status code or sketch bin
+KEY_LOW_BITS = 10
+KEY_LOW_MASK = (1 << KEY_LOW_BITS) - 1
+KEY_AGENT_SHIFT = 33
+KEY_AGENT_MASK = (1 << KEY_AGENT_SHIFT) - 1
+
+# (old values, new values) of one call; None for a created or deleted call
+CallChange = Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+
+class InvalidAnalyticsRequest(ValueError):
+    """Raised when a report's period, range or filters cannot be used"""
+
+
+def duration_bins(seconds) -> np.ndarray:
+    """Sketch bin of each duration in an array of seconds"""
+    seconds = np.asarray(seconds, dtype=np.float64)
+    bins = np.zeros(len(seconds), dtype=np.int64)
+    positive = seconds > 0
+    bins[positive] = np.ceil(np.log(seconds[positive]) / LOG_GAMMA - 1e-9).astype(np.int64) + 1
+    return bins
+
+
+def duration_bin(seconds) -> int:
+    # Same arithmetic as the backfill, so a call always leaves the bin it was counted in
+    return int(duration_bins([seconds or 0])[0])
+
+
+def bin_value(index: int) -> float:
+    """Representative duration of a bin"""
+    if index <= 0:
+        return 0.0
+    return 2 * GAMMA ** (index - 1) / (GAMMA + 1)
+
+
+def sketch_quantiles(bins: Dict[int, int], quantiles: Sequence[float] = QUANTILES) -> Dict[str, Optional[float]]:
+    """Approximate duration quantiles from summed bin counts"""
+    labels = [f'p{round(q * 100):d}' for q in quantiles]
+    indexes = sorted(index for index, count in bins.items() if count > 0)
+    total = sum(bins[index] for index in indexes)
+    if not total:
+        return dict.fromkeys(labels)
+    cumulative = np.cumsum([bins[index] for index in indexes])
+    result = {}
+    for label, q in zip(labels, quantiles):
+        position = int(np.searchsorted(cumulative, q * (total - 1), side='right'))
+        result[label] = round(bin_value(indexes[min(position, len(indexes) - 1)]), 1)
+    return result
+
+
+def bucket_start(at: datetime, period: str) -> datetime:
+    if period == 'hour':
+        return at.replace(minute=0, second=0, microsecond=0)
+    return at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class AnalyticsService:
+    """
+    Call analytics from incrementally maintained rollups.
+
+    Every call log counts once in an hourly and a daily CallRollup row for
+    its user, voice agent, start bucket and current status; completed calls
+    also add their duration and a CallDurationBin count. ORM writes are
+    picked up after each flush and turned into +1/-1 adjustments (a status
+    change moves the call from one status row to another) applied with an
+    upsert in the same transaction. Core writers of call_logs pass their
+    changes to apply_changes().
+
+    Reports only read rollups: counts and durations are summed per bucket
+    and agent, and duration percentiles come from the summed sketch bins.
+    rebuild() recomputes a user's rollups from call_logs for backfills.
+    """
+
+    def __init__(self, app=None):
+        self.batch_size = 10000
+        self.max_buckets = 1000
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize analytics with app configuration and follow ORM writes"""
+        self.batch_size = int(app.config.get(
+            'CALL_ROLLUP_BATCH_SIZE', os.getenv('CALL_ROLLUP_BATCH_SIZE', self.batch_size)))
+        self.max_buckets = int(app.config.get(
+            'CALL_ANALYTICS_MAX_BUCKETS', os.getenv('CALL_ANALYTICS_MAX_BUCKETS', self.max_buckets)))
+
+        if not db.event.contains(db.session, 'before_flush', self._snapshot_deleted):
+            db.event.listen(db.session, 'before_flush', self._snapshot_deleted)
+        if not db.event.contains(db.session, 'after_flush', self._collect_changes):
+            db.event.listen(db.session, 'after_flush', self._collect_changes)
+
+    def apply_changes(self, connection, changes: Iterable[CallChange]) -> int:
+        """
+        Fold call changes into the rollups with one upsert per table, on
+        `connection` inside the caller's transaction. Each change is the
+        call's (old, new) ROLLUP_FIELDS values, None on the side where the
+        call did not exist.
+
+        Returns:
+            int: rollup and bin rows adjusted
+        """
+        rollups = defaultdict(lambda: [0, 0])
+        bins = defaultdict(int)
+        for old, new in changes:
+            if old == new:
+                continue
+            for values, sign in ((old, -1), (new, 1)):
+                if values is None or values.get('created_at') is None:
+                    continue
+                agent_id = values.get('voice_agent_id') or 0
+                status = values.get('status') or 'unknown'
+                duration = max(values.get('duration') or 0, 0)
+                for period in ROLLUP_PERIODS:
+                    bucket = bucket_start(values['created_at'], period)
+                    counts = rollups[(values['user_id'], period, bucket, agent_id, status)]
+                    counts[0] += sign
+                    counts[1] += sign * duration
+                    if status == ANSWERED_STATUS:
+                        bins[(values['user_id'], period, bucket, agent_id, duration_bin(duration))] += sign
+
+        rollup_rows = [
+            {'user_id': user_id, 'period': period, 'bucket_start': bucket, 'voice_agent_id': agent_id,
+             'status': status, 'calls': calls, 'duration': duration}
+            for (user_id, period, bucket, agent_id, status), (calls, duration) in rollups.items()
+            if calls or duration
+        ]
+        bin_rows = [
+            {'user_id': user_id, 'period': period, 'bucket_start': bucket, 'voice_agent_id': agent_id,
+             'bin': index, 'calls': calls}
+            for (user_id, period, bucket, agent_id, index), calls in bins.items() if calls
+        ]
+        add_counts(connection, CallRollup.__table__,
+                   ('user_id', 'period', 'bucket_start', 'voice_agent_id', 'status'), rollup_rows)
+        add_counts(connection, CallDurationBin.__table__,
+                   ('user_id', 'period', 'bucket_start', 'voice_agent_id', 'bin'), bin_rows)
+        return len(rollup_rows) + len(bin_rows)
+
+    def _values(self, call, old=False) -> Dict[str, Any]:
+        values = {}
+        for field in ROLLUP_FIELDS:
+            history = attributes.get_history(call, field)
+            values[field] = history.deleted[0] if old and history.deleted else getattr(call, field)
+        return values
+
+    def _snapshot_deleted(self, session, flush_context, instances):
+        # Deleted calls cannot load their columns once the row is gone
+        deleted = [self._values(obj) for obj in session.deleted if isinstance(obj, CallLog)]
+        if deleted:
+            session.info['call_rollups_deleted'] = deleted
+
+    def _collect_changes(self, session, flush_context):
+        changes = [(old, None) for old in session.info.pop('call_rollups_deleted', [])]
+        for obj in session.new:
+            if isinstance(obj, CallLog):
+                changes.append((None, self._values(obj)))
+        for obj in session.dirty:
+            if isinstance(obj, CallLog) and any(
+                    attributes.get_history(obj, field).has_changes() for field in ROLLUP_FIELDS):
+                changes.append((self._values(obj, old=True), self._values(obj)))
+        if changes:
+            self.apply_changes(session.connection(), changes)
+
+    def rebuild(self, user_id: int) -> Dict[str, int]:
+        """
+        Recompute a user's rollups from their call logs and replace the
+        stored ones in one transaction. Calls are read batch_size at a time
+        and aggregated in NumPy; memory grows with the number of buckets,
+        not calls. Writes to the user's calls while it runs can be lost, so
+        backfill during a quiet period.
+
+        Returns:
+            dict: calls read and rollup/bin rows written
+        """
+        calls = CallLog.__table__
+        user_id = int(user_id)
+        # Sums per (period, packed key); keys are unpacked once at the end
+        rollups = defaultdict(lambda: [0, 0])
+        bins = defaultdict(int)
+        status_codes: Dict[str, int] = {}
+        read = 0
+
+        result = db.session.execute(
+            db.select(calls.c.voice_agent_id, calls.c.created_at, calls.c.status, calls.c.duration)
+            .where(calls.c.user_id == user_id, calls.c.created_at.isnot(None))
+            .execution_options(yield_per=self.batch_size)
+        )
+        try:
+            for rows in result.partitions():
+                read += len(rows)
+                agents = np.fromiter((row.voice_agent_id or 0 for row in rows), dtype=np.int64, count=len(rows))
+                durations = np.fromiter((max(row.duration or 0, 0) for row in rows), dtype=np.int64, count=len(rows))
+                names, statuses = np.unique([row.status or 'unknown' for row in rows], return_inverse=True)
+                codes = np.array([status_codes.setdefault(str(name), len(status_codes)) for name in names],
+                                 dtype=np.int64)
+                hours = np.fromiter((row.created_at.toordinal() * 24 + row.created_at.hour for row in rows),
+                                    dtype=np.int64, count=len(rows)) - EPOCH_HOUR
+                answered = names[statuses] == ANSWERED_STATUS
+                sketch = duration_bins(durations)
+                for period, buckets in (('hour', hours), ('day', hours // 24 * 24)):
+                    # Pack (bucket, agent, status or sketch bin) into one int64
+                    # so that NumPy groups plain integers
+                    prefix = (buckets << (KEY_AGENT_SHIFT + KEY_LOW_BITS)) | (agents << KEY_LOW_BITS)
+                    keys, inverse = np.unique(prefix | codes[statuses], return_inverse=True)
+                    counts = np.bincount(inverse, minlength=len(keys))
+                    totals = np.bincount(inverse, weights=durations, minlength=len(keys))
+                    for key, count, total in zip(keys.tolist(), counts.tolist(), totals.tolist()):
+                        sums = rollups[(period, key)]
+                        sums[0] += count
+                        sums[1] += int(total)
+                    keys, counts = np.unique(prefix[answered] | sketch[answered], return_counts=True)
+                    for key, count in zip(keys.tolist(), counts.tolist()):
+                        bins[(period, key)] += count
+        finally:
+            result.close()
+
+        statuses = {code: status for status, code in status_codes.items()}
+        rollup_rows = [
+            {**self._unpack(user_id, period, key), 'status': statuses[key & KEY_LOW_MASK],
+             'calls': count, 'duration': duration}
+            for (period, key), (count, duration) in rollups.items()
+        ]
+        bin_rows = [
+            {**self._unpack(user_id, period, key), 'bin': key & KEY_LOW_MASK, 'calls': count}
+            for (period, key), count in bins.items()
+        ]
+        db.session.execute(CallRollup.__table__.delete().where(CallRollup.user_id == user_id))
+        db.session.execute(CallDurationBin.__table__.delete().where(CallDurationBin.user_id == user_id))
+        for table, rows in ((CallRollup.__table__, rollup_rows), (CallDurationBin.__table__, bin_rows)):
+            for start in range(0, len(rows), self.batch_size):
+                db.session.execute(table.insert(), rows[start:start + self.batch_size])
+        db.session.commit()
+        return {'calls': read, 'rollups': len(rollup_rows), 'bins': len(bin_rows)}
+
+    def _unpack(self, user_id, period, key):
+        return {
+            'user_id': user_id,
+            'period': period,
+            'bucket_start': EPOCH + timedelta(hours=key >> (KEY_AGENT_SHIFT + KEY_LOW_BITS)),
+            'voice_agent_id': (key >> KEY_LOW_BITS) & KEY_AGENT_MASK
+        }
+
+    def report(self, user_id: int, period: str = 'day', start: Optional[datetime] = None,
+               end: Optional[datetime] = None, agent_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Summarize a user's calls from the rollups: totals, a series with
+        one entry per bucket that had calls, and a breakdown per agent.
+        `end` is exclusive and both ends are rounded down to the period.
+        """
+        if period not in ROLLUP_PERIODS:
+            raise InvalidAnalyticsRequest('period must be hour or day')
+        step = timedelta(hours=1) if period == 'hour' else timedelta(days=1)
+        if end is None:
+            # Up to and including the current bucket
+            end = bucket_start(datetime.utcnow(), period) + step
+        else:
+            end = bucket_start(end, period)
+        start = bucket_start(start, period) if start else end - step * (48 if period == 'hour' else 30)
+        if start >= end:
+            raise InvalidAnalyticsRequest('from must be before to')
+        if (end - start) / step > self.max_buckets:
+            raise InvalidAnalyticsRequest(f'At most {self.max_buckets} {period}s per report')
+
+        conditions = [CallRollup.user_id == int(user_id), CallRollup.period == period,
+                      CallRollup.bucket_start >= start, CallRollup.bucket_start < end]
+        bin_conditions = [CallDurationBin.user_id == int(user_id), CallDurationBin.period == period,
+                          CallDurationBin.bucket_start >= start, CallDurationBin.bucket_start < end]
+        if agent_id is not None:
+            conditions.append(CallRollup.voice_agent_id == agent_id)
+            bin_conditions.append(CallDurationBin.voice_agent_id == agent_id)
+
+        totals, series, agents = _Summary(), defaultdict(_Summary), defaultdict(_Summary)
+        # A bucket holds a row per agent and status plus a bin row per agent
+        # and distinct duration, so the database sums them per breakdown
+        calls, duration = db.func.sum(CallRollup.calls), db.func.sum(CallRollup.duration)
+        for row in db.session.execute(
+            db.select(CallRollup.bucket_start, CallRollup.status, calls, duration)
+            .where(*conditions).group_by(CallRollup.bucket_start, CallRollup.status)
+        ).all():
+            series[row[0]].add_calls(*row[1:])
+            totals.add_calls(*row[1:])
+        for row in db.session.execute(
+            db.select(CallRollup.voice_agent_id, CallRollup.status, calls, duration)
+            .where(*conditions).group_by(CallRollup.voice_agent_id, CallRollup.status)
+        ).all():
+            agents[row[0]].add_calls(*row[1:])
+        binned = db.func.sum(CallDurationBin.calls)
+        for row in db.session.execute(
+            db.select(CallDurationBin.bucket_start, CallDurationBin.bin, binned)
+            .where(*bin_conditions).group_by(CallDurationBin.bucket_start, CallDurationBin.bin)
+        ).all():
+            series[row[0]].add_bin(row[1], row[2])
+            totals.add_bin(row[1], row[2])
+        for row in db.session.execute(
+            db.select(CallDurationBin.voice_agent_id, CallDurationBin.bin, binned)
+            .where(*bin_conditions).group_by(CallDurationBin.voice_agent_id, CallDurationBin.bin)
+        ).all():
+            agents[row[0]].add_bin(row[1], row[2])
+
+        return {
+            'period': period,
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'voice_agent_id': agent_id,
+            'totals': totals.to_dict(),
+            'series': [{'bucket_start': bucket.isoformat(), **series[bucket].to_dict()}
+                       for bucket in sorted(series) if series[bucket].calls],
+            'agents': [{'voice_agent_id': agent or None, **agents[agent].to_dict()}
+                       for agent in sorted(agents) if agents[agent].calls]
+        }
+
+
+class _Summary:
+    """Running sums for one report row"""
+
+    def __init__(self):
+        self.calls = 0
+        self.duration = 0
+        self.answered_duration = 0
+        self.by_status: Dict[str, int] = defaultdict(int)
+        self.bins: Dict[int, int] = defaultdict(int)
+
+    def add_calls(self, status, calls, duration):
+        self.calls += calls
+        self.duration += duration
+        self.by_status[status] += calls
+        if status == ANSWERED_STATUS:
+            self.answered_duration += duration
+
+    def add_bin(self, index, calls):
+        self.bins[index] += calls
+
+    def to_dict(self) -> Dict[str, Any]:
+        answered = self.by_status.get(ANSWERED_STATUS, 0)
+        finished = self.calls - sum(self.by_status.get(status, 0) for status in IN_FLIGHT_STATUSES)
+        return {
+            'calls': self.calls,
+            'by_status': {status: count for status, count in sorted(self.by_status.items()) if count},
+            'answered': answered,
+            'answer_rate': round(answered / finished, 4) if finished > 0 else None,
+            'duration': {
+                'total': self.duration,
+                'average': round(self.answered_duration / answered, 1) if answered else None,
+                **sketch_quantiles(self.bins)
+            }
+        }
+
+# Initialize the service instance
+analytics_service = AnalyticsService()
@@ -0,0 +1,533 @@
+import os
+import re
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from werkzeug.datastructures import MultiDict
+
+from models import db, Campaign, CampaignLead, CallLog, Lead
+from .agent_config_service import agent_config_service, call_variables, InvalidAgentConfig
+from .analytics_service import analytics_service, ROLLUP_FIELDS
+from .export_service import lead_filters, InvalidExportRequest
+from .telephony_service import telephony_service, TelephonyProviderError, STATUS_RANK, TERMINAL_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Campaigns the dialer looks after; a paused or canceled campaign still has
+# its live calls followed up until they end
+DIALER_STATUSES = ('running', 'paused', 'canceled')
+# Call statuses that occupy one of the agent's concurrent call slots
+LIVE_CALL_STATUSES = tuple(STATUS_RANK)
+DEFAULT_RETRY_STATUSES = ['busy', 'no-answer', 'failed']
+RETRYABLE_STATUSES = tuple(status for status in TERMINAL_STATUSES if status != 'completed')
+LEAD_FILTER_KEYS = ('status', 'source', 'min_score', 'max_score', 'contacted_after', 'contacted_before', 'q')
+CLOCK = re.compile(r'^([01]\d|2[0-3]):([0-5]\d)$')
+
+# (lower, upper) bounds of the numeric campaign settings
+LIMITS = {
+    'calls_per_minute': (1, 600),
+    'max_concurrent_calls': (1, 100),
+    'max_attempts': (1, 10),
+    'retry_delay_minutes': (0, 7 * 24 * 60)
+}
+
+
+class InvalidCampaign(ValueError):
+    """Raised for campaign settings or a state change that cannot be used"""
+
+
+def _clock(value: Any, name: str) -> Tuple[int, int]:
+    match = CLOCK.match(value) if isinstance(value, str) else None
+    if not match:
+        raise InvalidCampaign(f'calling_hours.{name} must be HH:MM')
+    return int(match.group(1)), int(match.group(2))
+
+
+def in_calling_hours(campaign: Campaign, now: datetime) -> bool:
+    """Whether naive UTC `now` falls in the campaign's calling hours (always, without any)"""
+    hours = campaign.calling_hours
+    if not hours:
+        return True
+    local = now.replace(tzinfo=timezone.utc).astimezone(ZoneInfo(campaign.timezone or 'UTC'))
+    if local.weekday() not in hours.get('days', range(7)):
+        return False
+    minute = local.hour * 60 + local.minute
+    start, end = (h * 60 + m for h, m in (_clock(hours['start'], 'start'), _clock(hours['end'], 'end')))
+    # A window like 20:00-02:00 runs past midnight
+    return start <= minute < end if start <= end else (minute >= start or minute < end)
+
+
+def validate_campaign(data: Dict[str, Any], partial: bool = False) -> Dict[str, Any]:
+    """
+    Check campaign settings from a request and return the ones given.
+    Name and voice_agent_id are required unless `partial` (an update).
+    """
+    values = {}
+    for field in ('name', 'voice_agent_id'):
+        if field not in data and not partial:
+            raise InvalidCampaign(f'{field} is required')
+    if 'name' in data:
+        if not isinstance(data['name'], str) or not data['name'].strip():
+            raise InvalidCampaign('name must be a non-empty string')
+        values['name'] = data['name'].strip()[:100]
+    if 'voice_agent_id' in data:
+        if not isinstance(data['voice_agent_id'], int) or isinstance(data['voice_agent_id'], bool):
+            raise InvalidCampaign('voice_agent_id must be an integer')
+        values['voice_agent_id'] = data['voice_agent_id']
+    for field, (lower, upper) in LIMITS.items():
+        if field in data:
+            value = data[field]
+            if not isinstance(value, int) or isinstance(value, bool) or not lower <= value <= upper:
+                raise InvalidCampaign(f'{field} must be an integer from {lower} to {upper}')
+            values[field] = value
+    if 'from_number' in data:
+        if data['from_number'] is not None and (not isinstance(data['from_number'], str)
+                                               or len(data['from_number']) > 20):
+            raise InvalidCampaign('from_number must be a phone number')
+        values['from_number'] = data['from_number'] or None
+    if 'lead_filter' in data:
+        values['lead_filter'] = _validate_lead_filter(data['lead_filter'])
+    if 'timezone' in data:
+        try:
+            ZoneInfo(data['timezone'])
+        except (ZoneInfoNotFoundError, ValueError, TypeError):
+            raise InvalidCampaign('timezone must be an IANA time zone name')
+        values['timezone'] = data['timezone']
+    if 'calling_hours' in data:
+        values['calling_hours'] = _validate_calling_hours(data['calling_hours'])
+    if 'retry_statuses' in data:
+        statuses = data['retry_statuses']
+        if not isinstance(statuses, list) or not set(statuses) <= set(RETRYABLE_STATUSES):
+            raise InvalidCampaign(f'retry_statuses must be a list of: {", ".join(RETRYABLE_STATUSES)}')
+        values['retry_statuses'] = sorted(set(statuses))
+    return values
+
+
+def _validate_lead_filter(lead_filter: Any) -> Optional[Dict[str, Any]]:
+    if lead_filter is None:
+        return None
+    if not isinstance(lead_filter, dict) or not set(lead_filter) <= set(LEAD_FILTER_KEYS):
+        raise InvalidCampaign(f'lead_filter may only contain: {", ".join(LEAD_FILTER_KEYS)}')
+    cleaned = {}
+    for key, value in lead_filter.items():
+        if isinstance(value, list):
+            value = ','.join(str(item) for item in value)
+        if value is None or value == '':
+            continue
+        if key in ('min_score', 'max_score') and (not isinstance(value, int) or isinstance(value, bool)):
+            raise InvalidCampaign(f'lead_filter.{key} must be an integer')
+        cleaned[key] = value
+    try:
+        lead_filters(MultiDict(cleaned))
+    except InvalidExportRequest as e:
+        raise InvalidCampaign(f'lead_filter: {e}')
+    return cleaned
+
+
+def _validate_calling_hours(hours: Any) -> Optional[Dict[str, Any]]:
+    if hours is None:
+        return None
+    if not isinstance(hours, dict) or 'start' not in hours or 'end' not in hours:
+        raise InvalidCampaign('calling_hours needs a start and an end')
+    _clock(hours['start'], 'start')
+    _clock(hours['end'], 'end')
+    cleaned = {'start': hours['start'], 'end': hours['end']}
+    if 'days' in hours:
+        days = hours['days']
+        if not isinstance(days, list) or not days or not all(isinstance(day, int) and 0 <= day <= 6 for day in days):
+            raise InvalidCampaign('calling_hours.days must list weekdays from 0 (Monday) to 6')
+        cleaned['days'] = sorted(set(days))
+    return cleaned
+
+
+class CampaignService:
+    """
+    Runs outbound calling campaigns.
+
+    Starting a campaign enrolls every matching lead with a phone number
+    into campaign_leads with one INSERT ... SELECT. The dialer then works
+    through them tick by tick: for each running campaign inside its
+    calling hours it claims as many due leads as pacing (calls_per_minute),
+    the agent's free call slots (max_concurrent_calls minus its live
+    calls) and free dispatch workers allow, creates their call logs with
+    one batched INSERT and hands them to a bounded pool that places them
+    with the telephony provider. Each call carries the agent's compiled
+    prompt and greeting (agent_config_service) filled in for its lead. Call outcomes arrive through the
+    telephony webhooks; each tick moves leads whose call has ended to
+    completed, back to pending after retry_delay_minutes (for the
+    retry_statuses, up to max_attempts calls) or to failed.
+
+    Run one dialer (scripts/campaign_dialer.py); pacing is kept in it.
+    """
+
+    def __init__(self, app=None):
+        self.tick_interval = 1.0
+        self.dispatch_workers = 16
+        self.claim_limit = 500
+        self.call_timeout = 3600.0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize the dialer with app configuration"""
+        self.tick_interval = float(app.config.get(
+            'CAMPAIGN_TICK_SECONDS', os.getenv('CAMPAIGN_TICK_SECONDS', self.tick_interval)))
+        self.dispatch_workers = int(app.config.get(
+            'CAMPAIGN_DISPATCH_WORKERS', os.getenv('CAMPAIGN_DISPATCH_WORKERS', self.dispatch_workers)))
+        self.claim_limit = int(app.config.get(
+            'CAMPAIGN_CLAIM_LIMIT', os.getenv('CAMPAIGN_CLAIM_LIMIT', self.claim_limit)))
+        self.call_timeout = float(app.config.get(
+            'CAMPAIGN_CALL_TIMEOUT', os.getenv('CAMPAIGN_CALL_TIMEOUT', self.call_timeout)))
+
+    def start(self, campaign: Campaign) -> int:
+        """Start a draft campaign (enrolling its leads) or resume a paused one; returns leads enrolled"""
+        if campaign.status not in ('draft', 'paused'):
+            raise InvalidCampaign(f'A {campaign.status} campaign cannot be started')
+        if not (campaign.from_number or telephony_service.from_number):
+            raise InvalidCampaign('Set the campaign from_number or TELEPHONY_FROM_NUMBER')
+        enrolled = self.enroll(campaign) if campaign.status == 'draft' else 0
+        campaign.status = 'running'
+        campaign.started_at = campaign.started_at or datetime.utcnow()
+        db.session.commit()
+        return enrolled
+
+    def pause(self, campaign: Campaign):
+        if campaign.status != 'running':
+            raise InvalidCampaign(f'A {campaign.status} campaign cannot be paused')
+        campaign.status = 'paused'
+        db.session.commit()
+
+    def cancel(self, campaign: Campaign):
+        """Stop dialing for good; calls already placed are still followed up"""
+        if campaign.status in ('completed', 'canceled'):
+            raise InvalidCampaign(f'A {campaign.status} campaign cannot be canceled')
+        campaign.status = 'canceled'
+        if campaign.started_at is None:
+            campaign.completed_at = datetime.utcnow()
+        db.session.commit()
+
+    def enroll(self, campaign: Campaign) -> int:
+        """Add the campaign's matching leads that have a phone number, in the session's transaction"""
+        leads, enrolled = Lead.__table__, CampaignLead.__table__
+        now = datetime.utcnow()
+        matching = db.select(
+            db.literal(campaign.id), leads.c.id, leads.c.phone, db.literal('pending'), db.literal(0),
+            db.literal(now), db.literal(now)
+        ).where(
+            leads.c.user_id == campaign.user_id,
+            leads.c.phone.isnot(None), leads.c.phone != '',
+            *lead_filters(MultiDict(campaign.lead_filter or {}))
+        )
+        result = db.session.execute(enrolled.insert().from_select(
+            ['campaign_id', 'lead_id', 'to_number', 'status', 'attempts', 'next_attempt_at', 'updated_at'],
+            matching
+        ))
+        return result.rowcount
+
+    def progress(self, campaign_id: int) -> Dict[str, int]:
+        """Leads per status, all leads and calls placed so far"""
+        enrolled = CampaignLead.__table__
+        progress = {'total': 0, 'pending': 0, 'dialing': 0, 'completed': 0, 'failed': 0, 'calls': 0}
+        for status, leads, calls in db.session.execute(
+            db.select(enrolled.c.status, db.func.count(), db.func.sum(enrolled.c.attempts))
+            .where(enrolled.c.campaign_id == campaign_id)
+            .group_by(enrolled.c.status)
+        ):
+            progress[status] = leads
+            progress['total'] += leads
+            progress['calls'] += calls or 0
+        return progress
+
+    def active_campaigns(self) -> List[Campaign]:
+        campaigns = Campaign.query.filter(Campaign.status.in_(DIALER_STATUSES), Campaign.completed_at.is_(None)).all()
+        return sorted(campaigns, key=lambda campaign: campaign.id)
+
+    def live_calls(self, voice_agent_id: int, now: datetime) -> int:
+        """The agent's calls that have not ended, ignoring ones past the call timeout"""
+        calls = CallLog.__table__
+        return db.session.execute(
+            db.select(db.func.count()).where(
+                calls.c.voice_agent_id == voice_agent_id,
+                calls.c.status.in_(LIVE_CALL_STATUSES),
+                calls.c.created_at > now - timedelta(seconds=self.call_timeout)
+            )
+        ).scalar()
+
+    def reconcile(self, campaign: Campaign, now: datetime) -> int:
+        """Settle the campaign's dialing leads whose calls have ended (or timed out); returns how many"""
+        enrolled, calls = CampaignLead.__table__, CallLog.__table__
+        rows = db.session.execute(
+            db.select(enrolled.c.id, enrolled.c.attempts, calls.c.status, calls.c.created_at)
+            .join(calls, calls.c.id == enrolled.c.call_log_id)
+            .where(enrolled.c.campaign_id == campaign.id, enrolled.c.status == 'dialing')
+        ).all()
+        retry_statuses = campaign.retry_statuses if campaign.retry_statuses is not None else DEFAULT_RETRY_STATUSES
+        timeout = now - timedelta(seconds=self.call_timeout)
+        updates = []
+        for row in rows:
+            if row.status in TERMINAL_STATUSES:
+                outcome = row.status
+            elif row.created_at < timeout:
+                # No final status from the provider; treat it as a failed call
+                outcome = 'failed'
+            else:
+                continue
+            update = {'lead': row.id, 'new_status': 'failed', 'due': now, 'outcome': outcome, 'now': now}
+            if outcome == 'completed':
+                update['new_status'] = 'completed'
+            elif outcome in retry_statuses and row.attempts < campaign.max_attempts and campaign.status != 'canceled':
+                update['new_status'] = 'pending'
+                update['due'] = now + timedelta(minutes=campaign.retry_delay_minutes)
+            updates.append(update)
+        if updates:
+            db.session.execute(
+                enrolled.update().where(enrolled.c.id == db.bindparam('lead'))
+                .values(status=db.bindparam('new_status'), next_attempt_at=db.bindparam('due'),
+                        last_call_status=db.bindparam('outcome'), updated_at=db.bindparam('now')),
+                updates
+            )
+        db.session.commit()
+        return len(updates)
+
+    def dial(self, campaign: Campaign, limit: int, now: datetime) -> List[Dict[str, Any]]:
+        """
+        Claim up to `limit` due leads, create their call logs in one batch
+        and commit. Returns the calls to place, oldest due lead first.
+        Nothing is claimed while the campaign's agent is missing or its
+        config cannot be used.
+        """
+        try:
+            agent = agent_config_service.get(campaign.voice_agent_id)
+        except InvalidAgentConfig as e:
+            logger.error(f'Campaign {campaign.id} cannot dial: voice agent {campaign.voice_agent_id}: {e}')
+            return []
+        if agent is None:
+            logger.error(f'Campaign {campaign.id} cannot dial: voice agent {campaign.voice_agent_id} does not exist')
+            return []
+
+        enrolled, calls, leads = CampaignLead.__table__, CallLog.__table__, Lead.__table__
+        claim = db.select(enrolled.c.id, enrolled.c.lead_id, enrolled.c.to_number,
+                          leads.c.name, leads.c.company, leads.c.email, leads.c.phone,
+                          leads.c.status, leads.c.source)\
+                  .join(leads, leads.c.id == enrolled.c.lead_id)\
+                  .where(enrolled.c.campaign_id == campaign.id, enrolled.c.status == 'pending',
+                         enrolled.c.next_attempt_at <= now)\
+                  .order_by(enrolled.c.next_attempt_at, enrolled.c.id).limit(limit)
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'postgresql':
+            claim = claim.with_for_update(of=enrolled, skip_locked=True)
+        claimed = db.session.execute(claim).all()
+        if not claimed:
+            db.session.rollback()
+            return []
+
+        from_number = campaign.from_number or telephony_service.from_number
+        new_calls = [{
+            'user_id': campaign.user_id, 'lead_id': row.lead_id, 'voice_agent_id': campaign.voice_agent_id,
+            'from_number': from_number, 'to_number': row.to_number, 'direction': 'outbound',
+            'status': 'queued', 'duration': 0, 'created_at': now
+        } for row in claimed]
+        if dialect in ('sqlite', 'postgresql'):
+            ids = db.session.execute(
+                calls.insert().returning(calls.c.id, sort_by_parameter_order=True), new_calls
+            ).scalars().all()
+        else:
+            ids = [db.session.execute(calls.insert().values(**call)).inserted_primary_key[0] for call in new_calls]
+
+        db.session.execute(
+            enrolled.update().where(enrolled.c.id == db.bindparam('lead'))
+            .values(status='dialing', attempts=enrolled.c.attempts + 1,
+                    call_log_id=db.bindparam('call'), updated_at=now),
+            [{'lead': row.id, 'call': call_id} for row, call_id in zip(claimed, ids)]
+        )
+        # Core inserts skip the ORM hooks that keep the call rollups current
+        analytics_service.apply_changes(db.session.connection(), [
+            (None, {field: call[field] for field in ROLLUP_FIELDS}) for call in new_calls
+        ])
+        db.session.commit()
+
+        return [{'id': call_id, 'from_number': call['from_number'], 'to_number': call['to_number'],
+                 'voice_agent_id': call['voice_agent_id'],
+                 'agent': agent.call_payload(call_variables(row, call['to_number'], call['from_number']))}
+                for row, call_id, call in zip(claimed, ids, new_calls)]
+
+    def record_dispatches(self, results: List[Tuple[int, Optional[str], Optional[str]]]):
+        """
+        Store what the provider said about placed calls: (call id, provider
+        call id, error). Calls it refused are marked failed, which the next
+        reconcile treats like any other failed call.
+        """
+        if not results:
+            return
+        calls = CallLog.__table__
+        now = datetime.utcnow()
+        placed = [{'call': call_id, 'provider_id': provider_id} for call_id, provider_id, error in results
+                  if provider_id is not None]
+        if placed:
+            db.session.execute(
+                calls.update().where(calls.c.id == db.bindparam('call'), calls.c.provider_call_id.is_(None))
+                .values(provider_call_id=db.bindparam('provider_id')),
+                placed
+            )
+        refused = {call_id: error for call_id, provider_id, error in results if provider_id is None}
+        if refused:
+            rows = db.session.execute(
+                db.select(calls.c.id, *[calls.c[field] for field in ROLLUP_FIELDS])
+                .where(calls.c.id.in_(list(refused)), calls.c.status == 'queued')
+            ).all()
+            if rows:
+                db.session.execute(
+                    calls.update().where(calls.c.id == db.bindparam('call'))
+                    .values({calls.c.status: 'failed', calls.c.ended_at: now,
+                             calls.c['metadata']: db.bindparam('dispatch_error')}),
+                    [{'call': row.id, 'dispatch_error': {'dispatch_error': refused[row.id][:500]}} for row in rows]
+                )
+                analytics_service.apply_changes(db.session.connection(), [
+                    ({field: getattr(row, field) for field in ROLLUP_FIELDS},
+                     {**{field: getattr(row, field) for field in ROLLUP_FIELDS}, 'status': 'failed'})
+                    for row in rows
+                ])
+        db.session.commit()
+
+    def finish(self, campaign: Campaign, now: datetime) -> bool:
+        """Mark the campaign completed once nothing is left to dial or follow up"""
+        if campaign.status == 'paused':
+            return False
+        enrolled = CampaignLead.__table__
+        open_statuses = ('pending', 'dialing') if campaign.status == 'running' else ('dialing',)
+        left = db.session.execute(
+            db.select(enrolled.c.id)
+            .where(enrolled.c.campaign_id == campaign.id, enrolled.c.status.in_(open_statuses))
+            .limit(1)
+        ).first()
+        if left is not None:
+            return False
+        if campaign.status == 'running':
+            campaign.status = 'completed'
+        campaign.completed_at = now
+        db.session.commit()
+        return True
+
+    def start_dialer(self, app) -> 'CampaignDialer':
+        """Start the dialer on a thread in this process"""
+        dialer = CampaignDialer(app, self)
+        dialer.start()
+        return dialer
+
+
+class CampaignDialer:
+    """
+    The campaign scheduler loop and its bounded dispatch pool.
+
+    All database work happens on the scheduler thread; the pool threads
+    only talk to the provider and hand their results back for the next
+    tick. At most dispatch_workers calls are waiting for the provider at
+    any time, so a slow provider slows the dialing instead of queueing
+    calls without bound.
+    """
+
+    def __init__(self, app, service: CampaignService):
+        self.app = app
+        self.service = service
+        self.stats = {'ticks': 0, 'calls': 0, 'settled': 0, 'refused': 0, 'completed_campaigns': 0}
+        self._pool = ThreadPoolExecutor(max_workers=service.dispatch_workers, thread_name_prefix='campaign-dispatch')
+        self._results = deque()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._credit = {}
+        self._last_tick = None
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='campaign-dialer', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop after the tick in progress and wait for calls being placed"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._pool.shutdown(wait=True)
+        with self.app.app_context():
+            self.service.record_dispatches(self._take_results())
+            db.session.remove()
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stopping.is_set():
+                started = time.monotonic()
+                try:
+                    self.tick()
+                except Exception:
+                    logger.exception('Campaign dialer tick failed')
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+                self._stopping.wait(max(0.0, self.service.tick_interval - (time.monotonic() - started)))
+
+    def tick(self, now: Optional[datetime] = None):
+        """One scheduling pass over the active campaigns"""
+        now = now or datetime.utcnow()
+        elapsed = (now - self._last_tick).total_seconds() if self._last_tick else self.service.tick_interval
+        self._last_tick = now
+
+        results = self._take_results()
+        self.service.record_dispatches(results)
+        self.stats['refused'] += sum(1 for _, provider_id, _ in results if provider_id is None)
+
+        for campaign in self.service.active_campaigns():
+            self.stats['settled'] += self.service.reconcile(campaign, now)
+            if campaign.status == 'running' and in_calling_hours(campaign, now):
+                # Pacing: calls_per_minute accrue continuously, with at most one second's worth banked
+                rate = campaign.calls_per_minute / 60.0
+                credit = min(self._credit.get(campaign.id, 0.0) + rate * elapsed, max(1.0, rate))
+                slots = campaign.max_concurrent_calls - self.service.live_calls(campaign.voice_agent_id, now)
+                with self._lock:
+                    free_workers = self.service.dispatch_workers - self._in_flight
+                limit = min(int(credit), slots, free_workers, self.service.claim_limit)
+                calls = self.service.dial(campaign, limit, now) if limit > 0 else []
+                self._credit[campaign.id] = credit - len(calls)
+                self._dispatch(calls)
+            else:
+                self._credit.pop(campaign.id, None)
+            if self.service.finish(campaign, now):
+                self.stats['completed_campaigns'] += 1
+                self._credit.pop(campaign.id, None)
+        self.stats['ticks'] += 1
+
+    def _dispatch(self, calls: List[Dict[str, Any]]):
+        with self._lock:
+            self._in_flight += len(calls)
+        self.stats['calls'] += len(calls)
+        for call in calls:
+            self._pool.submit(self._place, call)
+
+    def _place(self, call: Dict[str, Any]):
+        try:
+            result = (call['id'], telephony_service.place_call(call), None)
+        except TelephonyProviderError as e:
+            logger.warning(str(e))
+            result = (call['id'], None, str(e))
+        except Exception as e:
+            logger.exception(f"Placing call {call['id']} failed")
+            result = (call['id'], None, str(e))
+        with self._lock:
+            self._results.append(result)
+            self._in_flight -= 1
+
+    def _take_results(self) -> List[Tuple[int, Optional[str], Optional[str]]]:
+        with self._lock:
+            results = list(self._results)
+            self._results.clear()
+        return results
+
+# Initialize the service instance
+campaign_service = CampaignService()
@@ -0,0 +1,263 @@
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Dict, Any, Optional
+from flask import current_app
+
+from models import db, Conversation, Message
+
+# Optional exact tokenizer; falls back to a character heuristic
+try:
+    import tiktoken
+    HAS_TIKTOKEN = True
+except ImportError:
+    HAS_TIKTOKEN = False
+
+# Approximate per-message overhead of the chat format (role, separators)
+MESSAGE_TOKEN_OVERHEAD = 4
+
+SENDER_ROLES = {
+    'user': 'user',
+    'lead': 'user',
+    'bot': 'assistant',
+}
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a sales conversation. "
+    "Update the existing summary with the new messages. Keep names, "
+    "requirements, objections, commitments and open questions. "
+    "Reply with the updated summary only."
+)
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    """Return a cached tiktoken encoding for the model"""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding('cl100k_base')
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str, model: str = 'gpt-4o') -> int:
+    """Count tokens in a text, cached by content"""
+    if not text:
+        return 0
+    if HAS_TIKTOKEN:
+        return len(_get_encoding(model).encode(text))
+    # Roughly four characters per token for English text
+    return max(1, (len(text) + 3) // 4)
+
+
+class ContextService:
+    def __init__(self, app=None):
+        self.token_budget = 3000
+        self.recent_messages = 12
+        self.summary_interval = 20
+        self.memory_limit = 5
+        self.memory_threshold = 0.7
+        self.tokenizer_model = 'gpt-4o'
+        self.cache_size = 1000
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize the context builder with app configuration"""
+        self.token_budget = int(app.config.get(
+            'CONTEXT_TOKEN_BUDGET', os.getenv('CONTEXT_TOKEN_BUDGET', self.token_budget)))
+        self.recent_messages = int(app.config.get(
+            'CONTEXT_RECENT_MESSAGES', os.getenv('CONTEXT_RECENT_MESSAGES', self.recent_messages)))
+        self.summary_interval = int(app.config.get(
+            'CONTEXT_SUMMARY_INTERVAL', os.getenv('CONTEXT_SUMMARY_INTERVAL', self.summary_interval)))
+        self.memory_limit = int(app.config.get(
+            'CONTEXT_MEMORY_LIMIT', os.getenv('CONTEXT_MEMORY_LIMIT', self.memory_limit)))
+        self.tokenizer_model = app.config.get(
+            'OPENAI_DEFAULT_MODEL', os.getenv('OPENAI_DEFAULT_MODEL', self.tokenizer_model))
+        self.cache_size = int(app.config.get(
+            'CONTEXT_CACHE_SIZE', os.getenv('CONTEXT_CACHE_SIZE', self.cache_size)))
+
+    def invalidate(self, conversation_id: int):
+        """Forget the cached context build for a conversation"""
+        with self._lock:
+            self._cache.pop(conversation_id, None)
+
+    def message_tokens(self, message: Dict[str, str]) -> int:
+        """Token cost of a chat message including format overhead"""
+        return count_tokens(message['content'], self.tokenizer_model) + MESSAGE_TOKEN_OVERHEAD
+
+    def update_summary(self, conversation: Conversation, force: bool = False) -> bool:
+        """
+        Fold messages that have left the recent window into the running summary.
+
+        The summary is only refreshed once at least `summary_interval` such
+        messages have accumulated (or when forced), so the LLM is called once
+        every N messages rather than on every turn. The change is flushed,
+        not committed; the caller commits it with the rest of its work.
+
+        Returns:
+            bool: True if the summary was updated
+        """
+        from . import openai_service
+
+        pending = Message.query.filter(Message.conversation_id == conversation.id)
+        if conversation.summary_message_id:
+            pending = pending.filter(Message.id > conversation.summary_message_id)
+
+        # Everything except the recent window is eligible for summarization
+        foldable = pending.count() - self.recent_messages
+        if foldable <= 0 or (foldable < self.summary_interval and not force):
+            return False
+
+        to_fold = pending.order_by(Message.id.asc()).limit(foldable).all()
+        transcript = '\n'.join(f"{msg.sender_type}: {msg.content}" for msg in to_fold)
+
+        result = openai_service.chat_completion(
+            messages=[
+                {'role': 'system', 'content': SUMMARY_PROMPT},
+                {'role': 'user', 'content': (
+                    f"Existing summary:\n{conversation.summary or '(none)'}\n\n"
+                    f"New messages:\n{transcript}"
+                )}
+            ],
+            temperature=0.2
+        )
+        if not result.get('success'):
+            current_app.logger.warning(
+                f"Summary update failed for conversation {conversation.id}: {result.get('error')}"
+            )
+            return False
+
+        conversation.summary = result['data']['choices'][0]['message']['content']
+        conversation.summary_message_id = to_fold[-1].id
+        db.session.flush()
+        self.invalidate(conversation.id)
+        return True
+
+    def build_context(
+        self,
+        conversation: Conversation,
+        system_prompt: str,
+        query: Optional[str] = None,
+        token_budget: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Assemble the chat messages for an agent reply within a token budget.
+
+        Layout is system prompt, running summary, retrieved memories and then
+        as many of the last K messages as fit, newest first. The latest
+        message is always kept.
+
+        Returns:
+            dict: 'messages' ready for chat_completion plus token accounting
+        """
+        budget = token_budget or self.token_budget
+        # Messages are written by other processes too (the web app adds user
+        # messages, job workers build context), so a build is reused only
+        # while the conversation's maintained counters and summary point are
+        # unchanged rather than relying on an in-process insert hook
+        cache_key = (system_prompt, query, budget, conversation.message_count,
+                     conversation.last_message_at, conversation.summary_message_id)
+
+        with self._lock:
+            cached = self._cache.get(conversation.id)
+            if cached and cached['key'] == cache_key:
+                self._cache.move_to_end(conversation.id)
+                return cached['context']
+
+        # A new summary is not committed yet, so a build using it is not cached
+        summarized = self.update_summary(conversation)
+
+        recent = Message.query.filter_by(conversation_id=conversation.id)\
+                              .order_by(Message.id.desc())\
+                              .limit(self.recent_messages)\
+                              .all()
+        if conversation.summary_message_id:
+            recent = [msg for msg in recent if msg.id > conversation.summary_message_id]
+
+        system = {'role': 'system', 'content': system_prompt}
+        used = self.message_tokens(system)
+        header = [system]
+
+        if conversation.summary:
+            summary = {'role': 'system', 'content': f"Conversation so far:\n{conversation.summary}"}
+            cost = self.message_tokens(summary)
+            if used + cost <= budget:
+                header.append(summary)
+                used += cost
+
+        history = []
+        if recent:
+            latest = self._to_chat_message(recent[0])
+            history.append(latest)
+            used += self.message_tokens(latest)
+
+        memories = []
+        search_text = query or (recent[0].content if recent else None)
+        if search_text and self.memory_limit:
+            for memory in self._retrieve_memories(search_text, conversation.user_id):
+                cost = count_tokens(memory, self.tokenizer_model) + 1
+                if used + cost + MESSAGE_TOKEN_OVERHEAD > budget:
+                    break
+                memories.append(memory)
+                used += cost
+        if memories:
+            used += MESSAGE_TOKEN_OVERHEAD
+            header.append({
+                'role': 'system',
+                'content': "Relevant memories:\n" + '\n'.join(f"- {m}" for m in memories)
+            })
+
+        for msg in recent[1:]:
+            chat_message = self._to_chat_message(msg)
+            cost = self.message_tokens(chat_message)
+            if used + cost > budget:
+                break
+            history.append(chat_message)
+            used += cost
+
+        context = {
+            'messages': header + list(reversed(history)),
+            'token_count': used,
+            'token_budget': budget,
+            'history_messages': len(history),
+            'memories': len(memories),
+            'has_summary': bool(conversation.summary)
+        }
+
+        if not summarized:
+            with self._lock:
+                self._cache[conversation.id] = {'key': cache_key, 'context': context}
+                self._cache.move_to_end(conversation.id)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return context
+
+    def _to_chat_message(self, message: Message) -> Dict[str, str]:
+        return {
+            'role': SENDER_ROLES.get(message.sender_type, 'user'),
+            'content': message.content
+        }
+
+    def _retrieve_memories(self, query: str, user_id: int) -> List[str]:
+        from . import memory_service
+
+        try:
+            # Memories store user_id as a string
+            results = memory_service.search(
+                query=query,
+                user_id=str(user_id),
+                limit=self.memory_limit,
+                threshold=self.memory_threshold
+            )
+        except Exception as e:
+            current_app.logger.error(f"Memory retrieval failed: {str(e)}")
+            return []
+        return [result.item.content for result in results]
+
+# Initialize the service instance
+context_service = ContextService()
@@ -0,0 +1,523 @@
+import os
+import re
+import time
+import difflib
+import logging
+import unicodedata
+from array import array
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from models import db, Lead, Conversation, CallLog, CampaignLead, LeadMergeSuggestion, Job
+from models.lead_facet import FACET_FIELDS, adjust_lead_facets, facet_changes
+from .job_queue import job_queue
+
+# Optional faster similarity; difflib gives close enough scores
+try:
+    from rapidfuzz import fuzz
+    HAS_RAPIDFUZZ = True
+except ImportError:
+    HAS_RAPIDFUZZ = False
+
+logger = logging.getLogger(__name__)
+
+LEAD_DEDUP_JOB = 'lead_dedup_scan'
+
+NON_WORD = re.compile(r'[^\w\s]')
+NON_DIGIT = re.compile(r'\D')
+PHONE_EXTENSION = re.compile(r'(?i)\s*(?:ext\.?|x|#)\s*\d+\s*$')
+
+# Dropped from company names before comparing
+COMPANY_SUFFIXES = frozenset((
+    'the', 'inc', 'incorporated', 'llc', 'llp', 'ltd', 'limited', 'corp', 'corporation', 'co',
+    'company', 'gmbh', 'plc', 'sa', 'ag', 'bv', 'pty', 'group', 'holdings'
+))
+# Shared mailboxes say nothing about who the lead is
+GENERIC_LOCAL_PARTS = frozenset((
+    'info', 'sales', 'contact', 'admin', 'hello', 'support', 'office', 'team', 'mail',
+    'enquiries', 'inquiries', 'noreply', 'no-reply'
+))
+# The merged lead keeps the most advanced status of the group
+STATUS_RANK = {'lost': 0, 'new': 1, 'contacted': 2, 'qualified': 3, 'converted': 4}
+# Lead columns rewritten on the kept lead by a merge
+MERGED_FIELDS = ('email', 'phone', 'company', 'source', 'status', 'score', 'notes', 'last_contacted',
+                 'created_at', 'updated_at', 'engagement_at')
+
+
+class InvalidMerge(ValueError):
+    """Raised when a merge request names leads that cannot be merged"""
+
+
+def _fold(text: str) -> str:
+    # Drop accents but keep non-Latin letters
+    return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    """Lowercase, drop +tags, and ignore dots in Gmail addresses"""
+    if not email:
+        return None
+    local, at, domain = email.strip().lower().rpartition('@')
+    if not at or not local or not domain:
+        return None
+    local = local.split('+', 1)[0]
+    if domain in ('gmail.com', 'googlemail.com'):
+        local, domain = local.replace('.', ''), 'gmail.com'
+    return f'{local}@{domain}'
+
+
+def normalize_phone(phone: Optional[str], digits: int = 10) -> Optional[str]:
+    """The last `digits` digits, without formatting or extension; None if too short"""
+    if not phone:
+        return None
+    number = NON_DIGIT.sub('', PHONE_EXTENSION.sub('', phone))
+    return number[-digits:] if len(number) >= 7 else None
+
+
+def normalize_company(company: Optional[str]) -> Optional[str]:
+    if not company:
+        return None
+    words = [w for w in NON_WORD.sub(' ', _fold(company.lower())).split() if w not in COMPANY_SUFFIXES]
+    return ' '.join(words) or None
+
+
+def normalize_name(name: Optional[str]) -> Optional[str]:
+    """Lowercased words in sorted order, so 'Smith, John' equals 'John Smith'"""
+    if not name:
+        return None
+    return ' '.join(sorted(NON_WORD.sub(' ', _fold(name.lower())).split())) or None
+
+
+def similarity(a: Optional[str], b: Optional[str], floor: float = 0.0) -> float:
+    """
+    Edit similarity of two strings, 0..1. Returns 0 without the full
+    comparison when a cheap upper bound is already below `floor`.
+    """
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    if HAS_RAPIDFUZZ:
+        return fuzz.ratio(a, b, score_cutoff=floor * 100) / 100.0
+    matcher = difflib.SequenceMatcher(None, a, b)
+    if floor > 0 and matcher.quick_ratio() < floor - 1e-9:
+        return 0.0
+    return matcher.ratio()
+
+
+class LeadProfile:
+    """Normalized fields of one account's leads, by position"""
+
+    def __init__(self):
+        self.ids = []
+        self.names = []
+        self.companies = []
+        self.emails = []
+        self.phones = []
+        self.locals = []
+
+
+class DedupService:
+    """
+    Finds leads that are probably the same person and merges them.
+
+    A scan normalizes every lead of an account (email, phone, name and
+    company) and gives it a few blocking keys: exact email, phone, full
+    name, email mailbox, and company plus a name prefix. Only leads that
+    share a key are compared, so the work grows with the number of
+    candidate pairs instead of n². Blocking is done in NumPy by sorting
+    the key hashes; blocks larger than max_block (placeholder phones,
+    very common names) are skipped. Candidate pairs are scored with string
+    similarity and linked into groups, which are stored as merge
+    suggestions for review.
+
+    merge() folds duplicates into the lead to keep with set-based UPDATEs:
+    conversations and call logs are re-pointed, empty fields are filled
+    from the duplicates, and the duplicates are deleted.
+    """
+
+    def __init__(self, app=None):
+        self.min_score = 0.8
+        self.max_block = 50
+        self.batch_size = 1000
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize deduplication with app configuration"""
+        self.min_score = float(app.config.get(
+            'LEAD_DEDUP_MIN_SCORE', os.getenv('LEAD_DEDUP_MIN_SCORE', self.min_score)))
+        self.max_block = int(app.config.get(
+            'LEAD_DEDUP_MAX_BLOCK', os.getenv('LEAD_DEDUP_MAX_BLOCK', self.max_block)))
+
+        job_queue.register(LEAD_DEDUP_JOB, self._run_scan_job)
+
+    def enqueue_scan(self, user_id: int) -> Job:
+        """Queue a scan of the user's leads; one scan per user runs at a time"""
+        return job_queue.enqueue(LEAD_DEDUP_JOB, {'user_id': int(user_id)}, queue_key=f'lead_dedup:{int(user_id)}')
+
+    def _run_scan_job(self, job: Job):
+        self.scan(job.payload['user_id'], heartbeat=lambda: job_queue.renew(job), commit=False)
+
+    def _load(self, user_id: int) -> LeadProfile:
+        leads = Lead.__table__
+        profile = LeadProfile()
+        result = db.session.execute(
+            db.select(leads.c.id, leads.c.name, leads.c.email, leads.c.phone, leads.c.company)
+            .where(leads.c.user_id == user_id).order_by(leads.c.id)
+            .execution_options(yield_per=10000)
+        )
+        for rows in result.partitions():
+            for lead_id, name, email, phone, company in rows:
+                email = normalize_email(email)
+                local = email.split('@', 1)[0] if email else None
+                profile.ids.append(lead_id)
+                profile.names.append(normalize_name(name))
+                profile.companies.append(normalize_company(company))
+                profile.emails.append(email)
+                profile.phones.append(normalize_phone(phone))
+                profile.locals.append(local if local and len(local) >= 5 and local not in GENERIC_LOCAL_PARTS else None)
+        return profile
+
+    def _blocking_keys(self, profile: LeadProfile, i: int) -> set:
+        keys = set()
+        name, company = profile.names[i], profile.companies[i]
+        if profile.emails[i]:
+            keys.add('e' + profile.emails[i])
+        if profile.phones[i]:
+            keys.add('p' + profile.phones[i])
+        if profile.locals[i]:
+            keys.add('l' + profile.locals[i])
+        if name and ' ' in name:
+            keys.add('n' + name)
+        if name and company:
+            # One typo-free word of the name is enough within a company
+            keys.update(f'c{company}|{word[:3]}' for word in name.split())
+        return keys
+
+    def candidate_pairs(self, profile: LeadProfile) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Positions of lead pairs that share a blocking key, each pair once.
+
+        Returns:
+            tuple: (left positions, right positions, number of skipped oversized blocks)
+        """
+        # Typed arrays: millions of keys as Python ints would not fit comfortably
+        key_hashes, owners = array('q'), array('q')
+        for i in range(len(profile.ids)):
+            for key in self._blocking_keys(profile, i):
+                key_hashes.append(hash(key))
+                owners.append(i)
+        if not key_hashes:
+            return np.empty(0, np.int64), np.empty(0, np.int64), 0
+
+        keys = np.frombuffer(key_hashes, dtype=np.int64)
+        members = np.frombuffer(owners, dtype=np.int64)
+        order = np.lexsort((members, keys))
+        keys, members = keys[order], members[order]
+
+        boundaries = np.flatnonzero(np.diff(keys)) + 1
+        starts = np.concatenate(([0], boundaries))
+        sizes = np.diff(np.concatenate((starts, [len(keys)])))
+
+        n = len(profile.ids)
+        encoded = []
+        for size in np.unique(sizes[(sizes >= 2) & (sizes <= self.max_block)]):
+            # Every pair within every block of this size, in one shot
+            block = members[starts[sizes == size][:, None] + np.arange(size)]
+            left, right = np.triu_indices(size, 1)
+            encoded.append(block[:, left].ravel() * n + block[:, right].ravel())
+        oversized = int((sizes > self.max_block).sum())
+        if not encoded:
+            return np.empty(0, np.int64), np.empty(0, np.int64), oversized
+
+        pairs = np.unique(np.concatenate(encoded))
+        left, right = pairs // n, pairs % n
+        # Two keys of one lead can collide on their hash
+        distinct = left != right
+        return left[distinct], right[distinct], oversized
+
+    def score_pair(self, profile: LeadProfile, i: int, j: int) -> Tuple[float, List[str]]:
+        """
+        Likelihood (0..1) that two leads are the same person, with the
+        evidence. Scores below min_score are not exact.
+        """
+        email_i, email_j = profile.emails[i], profile.emails[j]
+        phone_i, phone_j = profile.phones[i], profile.phones[j]
+        if email_i and email_i == email_j:
+            name_score = similarity(profile.names[i], profile.names[j])
+            return 0.95 + 0.05 * name_score, ['email'] + (['name'] if name_score >= 0.85 else [])
+        if phone_i and phone_j and phone_i == phone_j:
+            name_score = similarity(profile.names[i], profile.names[j])
+            return 0.75 + 0.25 * name_score, ['phone'] + (['name'] if name_score >= 0.85 else [])
+
+        # Different contact details make a name match less convincing
+        penalty = (0.85 if email_i and email_j else 1.0) * (0.85 if phone_i and phone_j else 1.0)
+        bonus = 0.1 if profile.locals[i] and profile.locals[i] == profile.locals[j] else 0.0
+        company_i, company_j = profile.companies[i], profile.companies[j]
+        reasons = []
+        if company_i and company_j:
+            company_score = similarity(company_i, company_j)
+            # The name similarity this pair needs to reach min_score
+            floor = (self.min_score / penalty - bonus - 0.4 * company_score) / 0.6
+            name_score = similarity(profile.names[i], profile.names[j], floor)
+            score = 0.6 * name_score + 0.4 * company_score
+            if company_score >= 0.85:
+                reasons.append('company')
+        else:
+            name_score = similarity(profile.names[i], profile.names[j], self.min_score / penalty - bonus)
+            score = name_score
+        if name_score >= 0.85:
+            reasons.insert(0, 'name')
+        if bonus:
+            reasons.append('email_mailbox')
+        return min((score + bonus) * penalty, 1.0), reasons
+
+    def find_duplicates(self, user_id: int, heartbeat: Optional[Callable[[], Any]] = None) -> Dict[str, Any]:
+        """
+        Group the user's leads that are probably duplicates. Pairs the user
+        dismissed before are left out.
+
+        Returns:
+            dict: 'suggestions' as (lead to keep, duplicate, score, reasons)
+                  tuples and scan statistics
+        """
+        user_id = int(user_id)
+        started = time.monotonic()
+        profile = self._load(user_id)
+        # Renewing a job lease writes on another connection, so only between queries
+        if heartbeat:
+            heartbeat()
+        left, right, oversized = self.candidate_pairs(profile)
+        if heartbeat:
+            heartbeat()
+
+        dismissed = set()
+        for lead_id, duplicate_id in db.session.execute(
+            db.select(LeadMergeSuggestion.lead_id, LeadMergeSuggestion.duplicate_id)
+            .where(LeadMergeSuggestion.user_id == user_id, LeadMergeSuggestion.status == 'dismissed')
+        ).all():
+            dismissed.add((min(lead_id, duplicate_id), max(lead_id, duplicate_id)))
+
+        # Union-find over the pairs that pass, keeping each lead's best match
+        parent = {}
+
+        def find(i):
+            while parent.setdefault(i, i) != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        best = {}
+        ids = profile.ids
+        for start in range(0, len(left), 100000):
+            for i, j in zip(left[start:start + 100000].tolist(), right[start:start + 100000].tolist()):
+                if dismissed and (ids[i], ids[j]) in dismissed:
+                    continue
+                score, reasons = self.score_pair(profile, i, j)
+                if score < self.min_score:
+                    continue
+                parent[find(i)] = find(j)
+                for member in (i, j):
+                    if member not in best or score > best[member][0]:
+                        best[member] = (score, reasons)
+            if heartbeat:
+                heartbeat()
+
+        groups = defaultdict(list)
+        for i in parent:
+            groups[find(i)].append(i)
+        suggestions = []
+        for members in groups.values():
+            # Keep the oldest lead; positions follow id order
+            members.sort()
+            for member in members[1:]:
+                score, reasons = best[member]
+                suggestions.append((ids[members[0]], ids[member], round(score, 4), reasons))
+
+        return {
+            'suggestions': suggestions,
+            'stats': {
+                'leads': len(ids),
+                'candidate_pairs': int(len(left)),
+                'oversized_blocks': oversized,
+                'groups': len(groups),
+                'duplicates': len(suggestions),
+                'seconds': round(time.monotonic() - started, 2)
+            }
+        }
+
+    def scan(self, user_id: int, heartbeat: Optional[Callable[[], Any]] = None, commit: bool = True) -> Dict[str, Any]:
+        """Find duplicates and replace the user's open suggestions with them"""
+        user_id = int(user_id)
+        found = self.find_duplicates(user_id, heartbeat)
+        suggestions = LeadMergeSuggestion.__table__
+        db.session.execute(suggestions.delete().where(
+            suggestions.c.user_id == user_id, suggestions.c.status == 'open'))
+        now = datetime.utcnow()
+        rows = [{'user_id': user_id, 'lead_id': lead_id, 'duplicate_id': duplicate_id, 'score': score,
+                 'reasons': reasons, 'status': 'open', 'created_at': now}
+                for lead_id, duplicate_id, score, reasons in found['suggestions']]
+        for start in range(0, len(rows), 5000):
+            db.session.execute(suggestions.insert(), rows[start:start + 5000])
+        if commit:
+            db.session.commit()
+        logger.info(f"Lead dedup scan for user {user_id}: {found['stats']}")
+        return found['stats']
+
+    def merge_suggestions(self, user_id: int, suggestion_ids: Iterable[int]) -> Dict[str, int]:
+        """Merge the leads of the given open suggestions"""
+        groups = defaultdict(list)
+        suggestion_ids = [int(i) for i in suggestion_ids]
+        for start in range(0, len(suggestion_ids), 5000):
+            for lead_id, duplicate_id in db.session.execute(
+                db.select(LeadMergeSuggestion.lead_id, LeadMergeSuggestion.duplicate_id)
+                .where(LeadMergeSuggestion.user_id == int(user_id), LeadMergeSuggestion.status == 'open',
+                       LeadMergeSuggestion.id.in_(suggestion_ids[start:start + 5000]))
+            ).all():
+                groups[lead_id].append(duplicate_id)
+        return self.merge(user_id, groups)
+
+    def merge(self, user_id: int, groups: Dict[int, List[int]]) -> Dict[str, int]:
+        """
+        Merge each group's duplicates into its lead to keep, batch_size
+        groups per transaction.
+
+        The kept lead gets the duplicates' conversations, call logs and
+        campaign enrollments, any field it is missing, the most advanced status and the highest score;
+        contact details that do not survive are appended to its notes.
+
+        Returns:
+            dict: leads kept, leads merged away, conversations and calls moved
+        """
+        user_id = int(user_id)
+        groups = {int(primary): sorted({int(d) for d in duplicates} - {int(primary)})
+                  for primary, duplicates in groups.items()}
+        groups = {primary: duplicates for primary, duplicates in groups.items() if duplicates}
+        duplicate_ids = [d for duplicates in groups.values() for d in duplicates]
+        if len(duplicate_ids) != len(set(duplicate_ids)):
+            raise InvalidMerge('A lead can only be merged into one other lead')
+        if set(duplicate_ids) & set(groups):
+            raise InvalidMerge('A lead cannot be both kept and merged away')
+
+        stats = {'leads': 0, 'merged': 0, 'conversations': 0, 'calls': 0}
+        primaries = list(groups)
+        for start in range(0, len(primaries), self.batch_size):
+            batch = {primary: groups[primary] for primary in primaries[start:start + self.batch_size]}
+            for key, value in self._merge_batch(user_id, batch).items():
+                stats[key] += value
+        return stats
+
+    def _merge_batch(self, user_id: int, groups: Dict[int, List[int]]) -> Dict[str, int]:
+        leads, conversations, calls = Lead.__table__, Conversation.__table__, CallLog.__table__
+        suggestions = LeadMergeSuggestion.__table__
+        all_ids = list(groups) + [d for duplicates in groups.values() for d in duplicates]
+        rows = {row.id: row for row in db.session.execute(
+            db.select(leads).where(leads.c.user_id == user_id, leads.c.id.in_(all_ids))
+        ).all()}
+        missing = set(all_ids) - set(rows)
+        if missing:
+            raise InvalidMerge(f'Leads not found: {sorted(missing)[:10]}')
+
+        moves = [{'duplicate': d, 'primary': primary} for primary, duplicates in groups.items() for d in duplicates]
+        duplicate_ids = [move['duplicate'] for move in moves]
+        moved_conversations = db.session.execute(
+            db.select(db.func.count()).where(conversations.c.lead_id.in_(duplicate_ids))).scalar()
+        moved_calls = db.session.execute(
+            db.select(db.func.count()).where(calls.c.lead_id.in_(duplicate_ids))).scalar()
+        for table in (conversations, calls):
+            db.session.execute(
+                table.update().where(table.c.lead_id == db.bindparam('duplicate'))
+                .values(lead_id=db.bindparam('primary')),
+                moves
+            )
+        self._merge_enrollments(groups)
+
+        updates = [self._merged_values(rows[primary], [rows[d] for d in duplicates])
+                   for primary, duplicates in groups.items()]
+        facets = Counter()
+        for update in updates:
+            old = rows[update['lead_id']]._mapping
+            facets.update(facet_changes(old, {field: update[f'new_{field}'] for field in FACET_FIELDS}))
+        for duplicate_id in duplicate_ids:
+            facets.update(facet_changes(rows[duplicate_id]._mapping, None))
+        db.session.execute(suggestions.delete().where(db.or_(
+            suggestions.c.lead_id.in_(duplicate_ids), suggestions.c.duplicate_id.in_(duplicate_ids))))
+        # Duplicates go first so their emails can move to the kept lead
+        db.session.execute(leads.delete().where(leads.c.id.in_(duplicate_ids)))
+        db.session.execute(
+            leads.update().where(leads.c.id == db.bindparam('lead_id'))
+            .values(**{field: db.bindparam(f'new_{field}') for field in MERGED_FIELDS}),
+            updates
+        )
+        adjust_lead_facets(db.session.connection(), user_id, facets)
+        db.session.commit()
+        return {'leads': len(groups), 'merged': len(duplicate_ids),
+                'conversations': moved_conversations, 'calls': moved_calls}
+
+    def _merge_enrollments(self, groups: Dict[int, List[int]]):
+        """
+        Move the duplicates' campaign enrollments to the kept lead. A lead is
+        enrolled in a campaign once, so where the group already has an
+        enrollment in that campaign (the kept lead's first) the others go.
+        """
+        enrolled = CampaignLead.__table__
+        primary_of = {d: primary for primary, duplicates in groups.items() for d in duplicates}
+        primary_of.update({primary: primary for primary in groups})
+        rows = db.session.execute(
+            db.select(enrolled.c.id, enrolled.c.campaign_id, enrolled.c.lead_id)
+            .where(enrolled.c.lead_id.in_(list(primary_of)))
+            .order_by(enrolled.c.id)
+        ).all()
+        kept, moves, dropped = {}, [], []
+        for row in sorted(rows, key=lambda row: row.lead_id != primary_of[row.lead_id]):
+            key = (primary_of[row.lead_id], row.campaign_id)
+            if key in kept:
+                dropped.append(row.id)
+                continue
+            kept[key] = row.id
+            if row.lead_id != key[0]:
+                moves.append({'enrollment': row.id, 'primary': key[0]})
+        if dropped:
+            db.session.execute(enrolled.delete().where(enrolled.c.id.in_(dropped)))
+        if moves:
+            db.session.execute(
+                enrolled.update().where(enrolled.c.id == db.bindparam('enrollment'))
+                .values(lead_id=db.bindparam('primary')),
+                moves
+            )
+
+    def _merged_values(self, primary, duplicates) -> Dict[str, Any]:
+        group = [primary] + duplicates
+        values = {
+            'email': primary.email, 'phone': primary.phone, 'company': primary.company,
+            'source': primary.source,
+            'status': max((lead.status for lead in group), key=lambda status: STATUS_RANK.get(status, 1)),
+            'score': max(lead.score or 0 for lead in group),
+            'last_contacted': max((lead.last_contacted for lead in group if lead.last_contacted), default=None),
+            'created_at': min((lead.created_at for lead in group if lead.created_at), default=primary.created_at),
+            'updated_at': datetime.utcnow(),
+            # Scoring restarts from the merged score at the next event
+            'engagement_at': None
+        }
+        notes = [primary.notes] if primary.notes else []
+        for duplicate in duplicates:
+            for field in ('email', 'phone', 'company', 'source'):
+                if not values[field]:
+                    values[field] = getattr(duplicate, field)
+            if duplicate.notes and duplicate.notes not in notes:
+                notes.append(duplicate.notes)
+            lost = [value for field, value in (('email', duplicate.email), ('phone', duplicate.phone))
+                    if value and value != values[field]]
+            if lost:
+                notes.append(f"Merged lead {duplicate.id} ({duplicate.name}): {', '.join(lost)}")
+        values['notes'] = '\n\n'.join(notes) or None
+        return {'lead_id': primary.id, **{f'new_{field}': values[field] for field in MERGED_FIELDS}}
+
+
+# Initialize the service instance
+dedup_service = DedupService()
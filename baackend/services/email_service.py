@@ -1,5 +1,9 @@
 import os
+import time
 import smtplib
+import threading
+from collections import deque
+from contextlib import contextmanager
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
@@ -8,6 +12,118 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from email.utils import formataddr
 import logging
 
+logger = logging.getLogger(__name__)
+
+# Errors after which a reused connection is assumed to have gone stale and
+# the message is tried once more on a new one
+STALE_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError)
+
+
+class SMTPPoolTimeout(smtplib.SMTPException):
+    """Raised when no pooled SMTP connection frees up in time"""
+
+
+class SMTPConnectionPool:
+    """
+    Thread-safe pool of logged-in SMTP sessions.
+
+    At most `size` connections are open at once; a thread that needs one
+    while all are busy waits up to `timeout` seconds. Idle connections are
+    reused most-recently-used first, so a quiet period lets the extra ones
+    age out. On checkout a connection idle longer than `max_idle` is closed
+    instead of reused (servers drop idle sessions after a while), one idle
+    longer than `noop_after` is health-checked with NOOP first, and one that
+    has sent `max_messages` messages is replaced, since providers limit
+    messages per session. With size 0 every checkout opens a new
+    connection and closes it afterwards.
+    """
+
+    def __init__(self, connect, size=4, max_idle=30.0, noop_after=5.0, max_messages=100, timeout=30.0):
+        self.connect = connect
+        self.size = size
+        self.max_idle = max_idle
+        self.noop_after = noop_after
+        self.max_messages = max_messages
+        self.timeout = timeout
+        # (server, messages sent, monotonic time it was returned)
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size) if size > 0 else None
+
+    @contextmanager
+    def connection(self):
+        """
+        Yield (server, reused) and return the connection afterwards. It is
+        discarded if the block raised anything but a command the server
+        refused with the session still usable.
+        """
+        if self._slots is not None and not self._slots.acquire(timeout=self.timeout):
+            raise SMTPPoolTimeout(f'No SMTP connection became free within {self.timeout}s')
+        try:
+            server, sent, reused = self._checkout()
+            try:
+                yield server, reused
+            except smtplib.SMTPResponseException as e:
+                # smtplib has already sent RSET; 421 means the server is closing the session
+                if e.smtp_code == 421 or self._slots is None:
+                    self._close(server)
+                else:
+                    self._checkin(server, sent + 1)
+                raise
+            except BaseException:
+                self._close(server)
+                raise
+            if self._slots is None:
+                self._close(server)
+            else:
+                self._checkin(server, sent + 1)
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, sent, returned = self._idle.pop()
+            idle = time.monotonic() - returned
+            if idle > self.max_idle or sent >= self.max_messages:
+                self._close(server)
+                continue
+            if idle > self.noop_after and not self._alive(server):
+                self._close(server)
+                continue
+            return server, sent, True
+        return self.connect(), 0, False
+
+    def _checkin(self, server, sent):
+        if sent >= self.max_messages:
+            self._close(server)
+            return
+        with self._lock:
+            self._idle.append((server, sent, time.monotonic()))
+
+    def _alive(self, server):
+        try:
+            return server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _close(self, server):
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    def close(self):
+        """Close the idle connections; ones in use close when they are returned"""
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for server, _, _ in idle:
+            self._close(server)
+
+
 class EmailService:
     def __init__(self, app=None):
         self.smtp_server = None
@@ -16,6 +132,8 @@ class EmailService:
         self.smtp_password = None
         self.default_sender = None
         self.use_tls = True
+        self.timeout = 10.0
+        self._pool = None
         
         if app is not None:
             self.init_app(app)
@@ -30,6 +148,21 @@ class EmailService:
                                            os.getenv('DEFAULT_EMAIL_SENDER'))
         self.use_tls = app.config.get('SMTP_USE_TLS', 
                                      os.getenv('SMTP_USE_TLS', 'true').lower() == 'true')
+        self.timeout = float(app.config.get('SMTP_TIMEOUT', os.getenv('SMTP_TIMEOUT', self.timeout)))
+        
+        # Sessions are kept open and reused across emails; SMTP_POOL_SIZE=0
+        # connects for every email instead
+        if self._pool is not None:
+            self._pool.close()
+        self._pool = SMTPConnectionPool(
+            self._get_smtp_connection,
+            size=int(app.config.get('SMTP_POOL_SIZE', os.getenv('SMTP_POOL_SIZE', 4))),
+            max_idle=float(app.config.get('SMTP_MAX_IDLE', os.getenv('SMTP_MAX_IDLE', 30))),
+            noop_after=float(app.config.get('SMTP_NOOP_AFTER', os.getenv('SMTP_NOOP_AFTER', 5))),
+            max_messages=int(app.config.get('SMTP_MAX_MESSAGES_PER_CONNECTION',
+                                            os.getenv('SMTP_MAX_MESSAGES_PER_CONNECTION', 100))),
+            timeout=float(app.config.get('SMTP_POOL_TIMEOUT', os.getenv('SMTP_POOL_TIMEOUT', 30)))
+        )
         
         # Test connection on startup
         if app.config.get('TEST_EMAIL_ON_STARTUP', False):
@@ -48,7 +181,7 @@ class EmailService:
     def _get_smtp_connection(self):
         """Create and return an SMTP connection"""
         try:
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=10)
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=self.timeout)
             server.ehlo()
             
             if self.use_tls:
@@ -61,7 +194,7 @@ class EmailService:
             return server
             
         except Exception as e:
-            current_app.logger.error(f"Failed to create SMTP connection: {str(e)}")
+            logger.error(f"Failed to create SMTP connection: {str(e)}")
             raise
     
     def send_email(self, to_emails, subject, body, 
@@ -136,8 +269,7 @@ class EmailService:
         all_recipients = to_emails + cc_emails + bcc_emails
         
         try:
-            with self._get_smtp_connection() as server:
-                server.send_message(msg, from_addr=from_email, to_addrs=all_recipients)
+            self._send(msg, from_email, all_recipients)
                 
             return {
                 'success': True,
@@ -149,13 +281,32 @@ class EmailService:
             }
             
         except Exception as e:
-            current_app.logger.error(f"Failed to send email: {str(e)}")
+            logger.error(f"Failed to send email: {str(e)}")
             return {
                 'success': False,
                 'error': f'Failed to send email: {str(e)}',
                 'to': to_emails
             }
 
+    def _send(self, msg, from_email, recipients):
+        """Send on a pooled connection, moving on to another if a reused one had gone stale"""
+        attempts = self._pool.size + 1
+        while True:
+            reused = False
+            try:
+                with self._pool.connection() as (server, reused):
+                    server.send_message(msg, from_addr=from_email, to_addrs=recipients)
+                    return
+            except STALE_CONNECTION_ERRORS:
+                attempts -= 1
+                if not reused or not attempts:
+                    raise
+
+    def close(self):
+        """Close the pooled SMTP connections"""
+        if self._pool is not None:
+            self._pool.close()
+
 # Initialize the service instance
 email_service = EmailService()
 
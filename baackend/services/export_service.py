@@ -0,0 +1,213 @@
+import io
+import os
+import csv
+import json
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+from models import db, Lead, CallLog
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+LEAD_EXPORT_COLUMNS = ('id', 'name', 'email', 'phone', 'company', 'status', 'source', 'score',
+                       'notes', 'last_contacted', 'created_at', 'updated_at')
+CALL_EXPORT_COLUMNS = ('id', 'lead_id', 'voice_agent_id', 'from_number', 'to_number', 'direction',
+                       'status', 'duration', 'recording_url', 'transcription', 'metadata',
+                       'created_at', 'ended_at')
+
+
+class InvalidExportRequest(ValueError):
+    """Raised when an export's format or filters cannot be used"""
+
+
+def parse_date(value: Optional[str], name: str) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise InvalidExportRequest(f'{name} must be an ISO 8601 date or timestamp')
+    # Stored naive in UTC like the rest of the schema
+    if parsed.tzinfo is not None:
+        parsed = (parsed - parsed.utcoffset()).replace(tzinfo=None)
+    return parsed
+
+
+def lead_filters(args) -> list:
+    """
+    Lead list filter conditions from request args (or a MultiDict of a
+    stored filter); raises InvalidExportRequest on a bad date.
+    """
+    conditions = []
+    for field in ('status', 'source'):
+        values = [value for value in args.get(field, '').split(',') if value]
+        if values:
+            conditions.append(getattr(Lead, field).in_(values))
+    min_score = args.get('min_score', type=int)
+    max_score = args.get('max_score', type=int)
+    if min_score is not None:
+        conditions.append(Lead.score >= min_score)
+    if max_score is not None:
+        conditions.append(Lead.score <= max_score)
+    contacted_after = parse_date(args.get('contacted_after'), 'contacted_after')
+    contacted_before = parse_date(args.get('contacted_before'), 'contacted_before')
+    if contacted_after is not None:
+        conditions.append(Lead.last_contacted >= contacted_after)
+    if contacted_before is not None:
+        conditions.append(Lead.last_contacted < contacted_before)
+    prefix = args.get('q', '').strip()
+    if prefix:
+        pattern = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        conditions.append(db.or_(*[column.ilike(pattern, escape='\\')
+                                   for column in (Lead.name, Lead.company, Lead.email)]))
+    return conditions
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(',', ':'))
+    # Spreadsheets run text starting with these as a formula; a leading '
+    # keeps it text (phone numbers like +1555... included)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class ExportService:
+    """
+    Streams a user's leads and call logs as CSV or NDJSON.
+
+    Rows are read with a server-side cursor in batches of batch_size and
+    encoded batch by batch, so an export runs in constant memory no matter
+    how many rows match. With gzip the output goes through one incremental
+    compressor that is flushed after every batch, so the client keeps
+    receiving bytes while the export runs.
+    """
+
+    def __init__(self, app=None):
+        self.batch_size = 1000
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize exports with app configuration"""
+        self.batch_size = int(app.config.get(
+            'EXPORT_BATCH_SIZE', os.getenv('EXPORT_BATCH_SIZE', self.batch_size)))
+
+    def leads_query(self, user_id: int, filters: Dict[str, Any]):
+        """
+        Select the user's leads, oldest change first.
+
+        Filters: status, source, from/to (created_at, to is exclusive) and
+        agent_id (leads with at least one call handled by that voice agent).
+        """
+        leads = Lead.__table__
+        statement = db.select(*[leads.c[column] for column in LEAD_EXPORT_COLUMNS])\
+                      .where(leads.c.user_id == int(user_id))
+        if filters.get('status'):
+            statement = statement.where(leads.c.status == filters['status'])
+        if filters.get('source'):
+            statement = statement.where(leads.c.source == filters['source'])
+        statement = self._date_range(statement, leads.c.created_at, filters)
+        if filters.get('agent_id'):
+            calls = CallLog.__table__
+            statement = statement.where(leads.c.id.in_(
+                db.select(calls.c.lead_id).where(calls.c.user_id == int(user_id),
+                                                 calls.c.voice_agent_id == self._int(filters, 'agent_id'))
+            ))
+        # (user_id, updated_at, id) is indexed, so the scan needs no sort
+        return statement.order_by(leads.c.updated_at, leads.c.id)
+
+    def calls_query(self, user_id: int, filters: Dict[str, Any]):
+        """
+        Select the user's call logs, oldest first.
+
+        Filters: status, direction, from/to (created_at, to is exclusive),
+        agent_id and lead_id.
+        """
+        calls = CallLog.__table__
+        statement = db.select(*[calls.c[column] for column in CALL_EXPORT_COLUMNS])\
+                      .where(calls.c.user_id == int(user_id))
+        if filters.get('status'):
+            statement = statement.where(calls.c.status == filters['status'])
+        if filters.get('direction'):
+            statement = statement.where(calls.c.direction == filters['direction'])
+        if filters.get('agent_id'):
+            statement = statement.where(calls.c.voice_agent_id == self._int(filters, 'agent_id'))
+        if filters.get('lead_id'):
+            statement = statement.where(calls.c.lead_id == self._int(filters, 'lead_id'))
+        statement = self._date_range(statement, calls.c.created_at, filters)
+        return statement.order_by(calls.c.created_at, calls.c.id)
+
+    def _int(self, filters, name):
+        try:
+            return int(filters[name])
+        except (TypeError, ValueError):
+            raise InvalidExportRequest(f'{name} must be an integer')
+
+    def _date_range(self, statement, column, filters):
+        start = parse_date(filters.get('from'), 'from')
+        end = parse_date(filters.get('to'), 'to')
+        if start is not None:
+            statement = statement.where(column >= start)
+        if end is not None:
+            statement = statement.where(column < end)
+        return statement
+
+    def stream(self, statement, columns: Sequence[str], fmt: str = 'csv',
+               compress: bool = False) -> Iterator[bytes]:
+        """
+        Encode the rows of `statement` as CSV (with a header row) or NDJSON.
+
+        The CSV header is yielded before the query runs so that the response
+        starts immediately. Must be consumed inside an app context.
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise InvalidExportRequest('format must be csv or ndjson')
+        chunks = self._encode(statement, columns, fmt)
+        return self._gzip(chunks) if compress else chunks
+
+    def _encode(self, statement, columns, fmt):
+        if fmt == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            yield buffer.getvalue().encode()
+
+        result = db.session.execute(statement.execution_options(yield_per=self.batch_size))
+        try:
+            for rows in result.partitions():
+                if fmt == 'csv':
+                    buffer = io.StringIO()
+                    writer = csv.writer(buffer)
+                    writer.writerows([_csv_value(value) for value in row] for row in rows)
+                    yield buffer.getvalue().encode()
+                else:
+                    yield ''.join(
+                        json.dumps(dict(zip(columns, map(_json_value, row))), default=str) + '\n'
+                        for row in rows
+                    ).encode()
+        finally:
+            result.close()
+
+    def _gzip(self, chunks):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+# Initialize the service instance
+export_service = ExportService()
@@ -0,0 +1,564 @@
+import io
+import os
+import csv
+import json
+import time
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Conversation, Message, Lead
+from models.message import PREVIEW_LENGTH
+from models.conversation import ARCHIVED_STATUSES
+from models.lead_facet import FACET_FIELDS, adjust_lead_facets, facet_changes
+
+logger = logging.getLogger(__name__)
+
+# Line-level problems reported back in full; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+LEAD_FIELDS = ('name', 'email', 'phone', 'company', 'status', 'source', 'score', 'notes')
+LEAD_STATUSES = ('new', 'contacted', 'qualified', 'converted', 'lost')
+
+
+class InvalidImportRecord(ValueError):
+    """Raised for an import line that cannot be used; the line is skipped"""
+
+
+def parse_timestamp(value: Any, default: datetime) -> datetime:
+    if value in (None, ''):
+        return default
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        raise InvalidImportRecord(f"Invalid timestamp {value!r}")
+    # Stored naive in UTC like the rest of the schema
+    if parsed.tzinfo is not None:
+        parsed = (parsed - parsed.utcoffset()).replace(tzinfo=None)
+    return parsed
+
+
+class ConversationImport:
+    """State of one NDJSON conversation/message import"""
+
+    def __init__(self, user_id: int, batch_size: int):
+        self.user_id = int(user_id)
+        self.batch_size = batch_size
+        # External conversation id from the file -> conversations.id
+        self.conversation_ids = {}
+        self.owned_ids = set()
+        self.pending_conversations = []
+        self.pending_messages = []
+        self.stats = {
+            'lines': 0,
+            'conversations_created': 0,
+            'conversations_matched': 0,
+            'messages_inserted': 0,
+            'batches': 0,
+            'errors': 0
+        }
+        self.errors = []
+        self.started = time.monotonic()
+
+    def error(self, line_number: int, message: str):
+        self.stats['errors'] += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, 'error': message})
+
+    def report(self, done: bool = False) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        return {
+            'done': done,
+            **self.stats,
+            'seconds': round(elapsed, 3),
+            'messages_per_second': round(self.stats['messages_inserted'] / elapsed) if elapsed else None,
+            'error_details': self.errors
+        }
+
+
+def read_records(stream, fmt: str) -> Iterator[Tuple[int, Any]]:
+    """
+    Lazily parse a binary CSV or NDJSON stream into (line number, record)
+    pairs. CSV headers are matched case-insensitively; a record that cannot
+    be parsed comes back as an InvalidImportRecord instead of a dict.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+    if fmt == 'csv':
+        reader = csv.reader(text)
+        header = next(reader, None)
+        if header is None:
+            return
+        columns = [column.strip().lower() for column in header]
+        for values in reader:
+            if not any(value.strip() for value in values):
+                continue
+            yield reader.line_num, dict(zip(columns, values))
+        return
+
+    for line_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise InvalidImportRecord('Line is not a JSON object')
+        except ValueError as e:
+            record = InvalidImportRecord(str(e))
+        yield line_number, record
+
+
+class LeadImport:
+    """State of one lead import"""
+
+    def __init__(self, user_id: int, chunk_size: int, on_duplicate: str):
+        self.user_id = int(user_id)
+        self.chunk_size = chunk_size
+        self.on_duplicate = on_duplicate
+        self.stats = {'rows': 0, 'created': 0, 'updated': 0, 'skipped': 0, 'invalid': 0, 'chunks': 0}
+        self.errors = []
+        self.started = time.monotonic()
+
+    def error(self, line_number: int, message: str):
+        self.stats['invalid'] += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, 'error': message})
+
+    def report(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        return {
+            **self.stats,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(self.stats['rows'] / elapsed) if elapsed else None,
+            'error_details': self.errors
+        }
+
+
+class ImportService:
+    def __init__(self, app=None):
+        self.batch_size = 5000
+        self.lead_chunk_size = 2000
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize bulk import with app configuration"""
+        self.batch_size = int(app.config.get(
+            'IMPORT_BATCH_SIZE', os.getenv('IMPORT_BATCH_SIZE', self.batch_size)))
+        self.lead_chunk_size = int(app.config.get(
+            'LEAD_IMPORT_CHUNK_SIZE', os.getenv('LEAD_IMPORT_CHUNK_SIZE', self.lead_chunk_size)))
+
+    def import_conversations(self, lines: Iterable, user_id: int, batch_size: Optional[int] = None,
+                             progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Import conversations and messages from NDJSON lines for one user.
+
+        Calls `progress` with the running report after every committed
+        batch; see iter_import_conversations for the format.
+
+        Returns:
+            dict: Counts, throughput and the first line errors
+        """
+        for report in self.iter_import_conversations(lines, user_id, batch_size):
+            if progress and not report['done']:
+                progress(report)
+        return report
+
+    def iter_import_conversations(self, lines: Iterable, user_id: int,
+                                  batch_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Import conversations and messages from NDJSON lines, yielding a
+        report after every committed batch and a final one with done=True.
+
+        Each line is an object with a "type":
+
+            {"type": "conversation", "id": "legacy-42", "title": "...", "channel": "chat",
+             "status": "closed", "lead_id": 7, "created_at": "2024-03-01T10:00:00Z",
+             "messages": [{"sender_type": "lead", "content": "...", "created_at": "..."}]}
+            {"type": "message", "conversation": "legacy-42", "sender_type": "bot", "content": "..."}
+
+        "id" is the conversation's id on the old platform; re-importing it
+        matches the existing conversation instead of creating a new one.
+        A message may instead name an existing "conversation_id". Messages
+        are written with Core executemany in transactions of `batch_size`
+        rows, and each touched conversation's counters are updated once per
+        batch. Bad lines are skipped and reported.
+        """
+        state = ConversationImport(user_id, batch_size or self.batch_size)
+
+        for line_number, line in enumerate(lines, 1):
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if not line.strip():
+                continue
+            state.stats['lines'] += 1
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise InvalidImportRecord('Line is not a JSON object')
+                self._add_record(state, record, line_number)
+            except (ValueError, InvalidImportRecord) as e:
+                state.error(line_number, str(e))
+                continue
+
+            if len(state.pending_messages) >= state.batch_size or \
+                    len(state.pending_conversations) >= state.batch_size:
+                self._flush(state)
+                yield state.report()
+
+        self._flush(state)
+        report = state.report(done=True)
+        logger.info(f"Imported {report['messages_inserted']} messages into "
+                    f"{report['conversations_created']} new conversations for user {state.user_id} "
+                    f"in {report['seconds']}s")
+        yield report
+
+    def _add_record(self, state: ConversationImport, record: Dict[str, Any], line_number: int):
+        kind = record.get('type')
+        now = datetime.utcnow()
+
+        if kind == 'conversation':
+            external_id = record.get('id')
+            if external_id in (None, ''):
+                raise InvalidImportRecord('Conversation is missing "id"')
+            external_id = str(external_id)
+            if external_id not in state.conversation_ids:
+                created_at = parse_timestamp(record.get('created_at'), now)
+                status = record.get('status') or 'active'
+                state.conversation_ids[external_id] = None
+                state.pending_conversations.append({
+                    'user_id': state.user_id,
+                    'external_id': external_id,
+                    'lead_id': record.get('lead_id'),
+                    'title': record.get('title') or 'Imported conversation',
+                    'channel': record.get('channel') or 'chat',
+                    'status': status,
+                    'archived_at': created_at if status in ARCHIVED_STATUSES else None,
+                    'message_count': 0,
+                    'created_at': created_at,
+                    'updated_at': created_at
+                })
+            for message in record.get('messages') or []:
+                self._add_message(state, {**message, 'conversation': external_id}, now, line_number)
+
+        elif kind == 'message':
+            self._add_message(state, record, now, line_number)
+
+        else:
+            raise InvalidImportRecord(f"Unknown record type {kind!r}")
+
+    def _add_message(self, state: ConversationImport, record: Dict[str, Any], now: datetime, line_number: int):
+        content = record.get('content')
+        if not isinstance(content, str) or not content:
+            raise InvalidImportRecord('Message is missing "content"')
+        sender_type = record.get('sender_type') or 'lead'
+        if sender_type not in ('user', 'bot', 'lead'):
+            raise InvalidImportRecord(f"Unknown sender_type {sender_type!r}")
+
+        if record.get('conversation') not in (None, ''):
+            target = ('external', str(record['conversation']))
+            if target[1] not in state.conversation_ids:
+                raise InvalidImportRecord(f"Unknown conversation {record['conversation']!r}; list it before its messages")
+        elif record.get('conversation_id') is not None:
+            target = ('id', int(record['conversation_id']))
+        else:
+            raise InvalidImportRecord('Message needs "conversation" or "conversation_id"')
+
+        state.pending_messages.append((line_number, target, {
+            'sender_type': sender_type,
+            'content': content,
+            'metadata': record.get('metadata'),
+            'created_at': parse_timestamp(record.get('created_at'), now)
+        }))
+
+    def _flush(self, state: ConversationImport):
+        """Write the buffered conversations and messages in one transaction"""
+        if not state.pending_conversations and not state.pending_messages:
+            return
+
+        conversations = Conversation.__table__
+        messages = Message.__table__
+        try:
+            self._insert_conversations(state)
+
+            # Existing conversations named by id must belong to the importing user
+            direct_ids = {target[1] for _, target, _ in state.pending_messages
+                          if target[0] == 'id'} - state.owned_ids
+            if direct_ids:
+                state.owned_ids.update(db.session.execute(
+                    db.select(conversations.c.id)
+                    .where(conversations.c.id.in_(direct_ids), conversations.c.user_id == state.user_id)
+                ).scalars())
+
+            rows = []
+            touched = {}
+            for line_number, (kind, ref), message in state.pending_messages:
+                conversation_id = state.conversation_ids[ref] if kind == 'external' else ref
+                if conversation_id not in state.owned_ids:
+                    state.error(line_number, f"Conversation {ref} not found")
+                    continue
+                rows.append({**message, 'conversation_id': conversation_id})
+
+                # Per-conversation count and newest message for the counter fixup
+                summary = touched.setdefault(conversation_id, {'count': 0, 'latest': None})
+                summary['count'] += 1
+                if summary['latest'] is None or message['created_at'] >= summary['latest']['created_at']:
+                    summary['latest'] = message
+
+            if rows:
+                db.session.execute(messages.insert(), rows)
+            if touched:
+                self._update_counters(touched)
+            db.session.commit()
+
+        except Exception:
+            db.session.rollback()
+            raise
+
+        state.stats['messages_inserted'] += len(rows)
+        state.stats['batches'] += 1
+        state.pending_messages = []
+
+    def _insert_conversations(self, state: ConversationImport):
+        if not state.pending_conversations:
+            return
+        conversations = Conversation.__table__
+        pending = {row['external_id']: row for row in state.pending_conversations}
+        state.pending_conversations = []
+
+        # Conversations imported before are matched, not duplicated
+        for external_id, conversation_id in db.session.execute(
+            db.select(conversations.c.external_id, conversations.c.id)
+            .where(conversations.c.user_id == state.user_id, conversations.c.external_id.in_(list(pending)))
+        ).all():
+            state.conversation_ids[external_id] = conversation_id
+            state.owned_ids.add(conversation_id)
+            state.stats['conversations_matched'] += 1
+            del pending[external_id]
+
+        if pending:
+            # Drop links to leads the user does not own
+            lead_ids = {row['lead_id'] for row in pending.values() if row['lead_id'] is not None}
+            if lead_ids:
+                owned_leads = set(db.session.execute(
+                    db.select(Lead.id).where(Lead.id.in_(lead_ids), Lead.user_id == state.user_id)
+                ).scalars())
+                for row in pending.values():
+                    if row['lead_id'] not in owned_leads:
+                        row['lead_id'] = None
+
+            db.session.execute(conversations.insert(), list(pending.values()))
+            for external_id, conversation_id in db.session.execute(
+                db.select(conversations.c.external_id, conversations.c.id)
+                .where(conversations.c.user_id == state.user_id, conversations.c.external_id.in_(list(pending)))
+            ).all():
+                state.conversation_ids[external_id] = conversation_id
+                state.owned_ids.add(conversation_id)
+            state.stats['conversations_created'] += len(pending)
+
+    def _update_counters(self, touched: Dict[int, Dict[str, Any]]):
+        """One executemany UPDATE for every conversation the batch touched"""
+        conversations = Conversation.__table__
+        is_latest = db.or_(
+            conversations.c.last_message_at.is_(None),
+            conversations.c.last_message_at <= db.bindparam('latest_at')
+        )
+        db.session.execute(
+            conversations.update()
+            .where(conversations.c.id == db.bindparam('conversation_id'))
+            .values(
+                message_count=conversations.c.message_count + db.bindparam('added'),
+                last_message_at=db.case((is_latest, db.bindparam('latest_at')),
+                                        else_=conversations.c.last_message_at),
+                last_message_preview=db.case((is_latest, db.bindparam('preview')),
+                                             else_=conversations.c.last_message_preview),
+                updated_at=db.case((conversations.c.updated_at < db.bindparam('latest_at'),
+                                    db.bindparam('latest_at')),
+                                   else_=conversations.c.updated_at),
+                # Imported closed conversations age for tiering from their last message
+                archived_at=db.case((conversations.c.archived_at < db.bindparam('latest_at'),
+                                     db.bindparam('latest_at')),
+                                    else_=conversations.c.archived_at)
+            ),
+            [{
+                'conversation_id': conversation_id,
+                'added': summary['count'],
+                'latest_at': summary['latest']['created_at'],
+                'preview': summary['latest']['content'][:PREVIEW_LENGTH]
+            } for conversation_id, summary in touched.items()]
+        )
+
+    def import_leads(self, records: Iterable[Tuple[int, Any]], user_id: int, on_duplicate: str = 'update',
+                     chunk_size: Optional[int] = None,
+                     progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Import leads from (line number, record) pairs, e.g. read_records().
+
+        Records are processed in chunks. Each chunk is deduplicated by email
+        in memory (later rows win) and against the database with a single
+        IN query, then written with one executemany INSERT for new leads and
+        one UPDATE for existing ones. Duplicates across chunks are found by
+        that same query, so memory does not grow with the file. With
+        on_duplicate='skip', existing leads are left untouched.
+
+        Returns:
+            dict: created/updated/skipped/invalid counts and the first errors
+        """
+        if on_duplicate not in ('update', 'skip'):
+            raise ValueError("on_duplicate must be 'update' or 'skip'")
+        state = LeadImport(user_id, chunk_size or self.lead_chunk_size, on_duplicate)
+
+        chunk = []
+        for line_number, record in records:
+            state.stats['rows'] += 1
+            if isinstance(record, InvalidImportRecord):
+                state.error(line_number, str(record))
+                continue
+            try:
+                chunk.append((line_number, self._clean_lead(record), str(record.get('email') or '').strip()))
+            except InvalidImportRecord as e:
+                state.error(line_number, str(e))
+                continue
+
+            if len(chunk) >= state.chunk_size:
+                self._write_leads(state, chunk)
+                chunk = []
+                if progress:
+                    progress(state.report())
+
+        if chunk:
+            self._write_leads(state, chunk)
+        report = state.report()
+        logger.info(f"Lead import for user {state.user_id}: {report['created']} created, "
+                    f"{report['updated']} updated, {report['skipped']} skipped, {report['invalid']} invalid")
+        return report
+
+    def _clean_lead(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Keep known fields with values, normalized; blank cells mean 'not provided'"""
+        lead = {}
+        for field in LEAD_FIELDS:
+            value = record.get(field)
+            if isinstance(value, str):
+                value = value.strip()
+            if value in (None, ''):
+                continue
+            lead[field] = value
+
+        if 'email' in lead:
+            lead['email'] = str(lead['email']).lower()
+            if '@' not in lead['email'] or len(lead['email']) > 120:
+                raise InvalidImportRecord(f"Invalid email {record.get('email')!r}")
+        if 'status' in lead:
+            lead['status'] = str(lead['status']).lower()
+            if lead['status'] not in LEAD_STATUSES:
+                raise InvalidImportRecord(f"Unknown status {record.get('status')!r}")
+        if 'score' in lead:
+            try:
+                lead['score'] = int(float(lead['score']))
+            except (TypeError, ValueError):
+                raise InvalidImportRecord(f"Invalid score {record.get('score')!r}")
+        for field, length in (('name', 100), ('phone', 20), ('company', 100), ('source', 50)):
+            if field in lead:
+                lead[field] = str(lead[field])[:length]
+        return lead
+
+    def _write_leads(self, state: LeadImport, chunk: List[Tuple[int, Dict[str, Any], str]]):
+        leads = Lead.__table__
+        for attempt in range(2):
+            inserts, updates, facets, skipped, errors = self._plan_leads(state, chunk)
+            try:
+                if inserts:
+                    db.session.execute(leads.insert(), inserts)
+                if updates:
+                    # Fields missing from a row keep their current value
+                    db.session.execute(
+                        leads.update()
+                        .where(leads.c.id == db.bindparam('lead_id'))
+                        .values(updated_at=db.bindparam('now'), **{
+                            field: db.func.coalesce(db.bindparam(f'new_{field}'), leads.c[field])
+                            for field in LEAD_FIELDS if field != 'email'
+                        }),
+                        updates
+                    )
+                adjust_lead_facets(db.session.connection(), state.user_id, facets)
+                db.session.commit()
+                break
+            except IntegrityError:
+                # A concurrent writer created one of these emails; plan the
+                # chunk again against what now exists
+                db.session.rollback()
+                if attempt:
+                    raise
+
+        # Only the plan that was written counts, so a retried chunk reports
+        # its rows once
+        for line_number, message in errors:
+            state.error(line_number, message)
+        state.stats['created'] += len(inserts)
+        state.stats['updated'] += len(updates)
+        state.stats['skipped'] += skipped
+        state.stats['chunks'] += 1
+
+    def _plan_leads(self, state: LeadImport, chunk: List[Tuple[int, Dict[str, Any], str]]):
+        """Split a chunk into insert and update rows, facet changes, skips and row errors"""
+        leads = Lead.__table__
+        now = datetime.utcnow()
+
+        # Dedupe within the chunk: later rows fill in and override earlier
+        # ones. Rows without an email cannot be matched and are all created.
+        by_email = {}
+        spellings = set()
+        without_email = []
+        skipped = 0
+        for line_number, lead, email_as_given in chunk:
+            if 'email' in lead:
+                if lead['email'] in by_email:
+                    skipped += 1
+                    lead = {**by_email[lead['email']][1], **lead}
+                by_email[lead['email']] = (line_number, lead)
+                spellings.update((lead['email'], email_as_given))
+            else:
+                without_email.append((line_number, lead))
+
+        # One query for the whole chunk. Older leads may keep the case they
+        # were entered with, so match the spelling in the file as well.
+        existing = {}
+        if by_email:
+            for row in db.session.execute(
+                db.select(leads.c.id, leads.c.email, *[leads.c[field] for field in FACET_FIELDS])
+                .where(leads.c.user_id == state.user_id, leads.c.email.in_(spellings))
+            ).all():
+                existing[row.email.lower()] = row
+
+        inserts, updates, errors = [], [], []
+        facets = Counter()
+        for line_number, lead in list(by_email.values()) + without_email:
+            row = existing.get(lead.get('email'))
+            if row is None:
+                if 'name' not in lead:
+                    errors.append((line_number, 'Name is required for a new lead'))
+                    continue
+                inserts.append({
+                    **{field: None for field in LEAD_FIELDS},
+                    'status': 'new', 'source': 'import', 'score': 0,
+                    **lead,
+                    'user_id': state.user_id, 'created_at': now, 'updated_at': now
+                })
+                facets.update(facet_changes(None, inserts[-1]))
+            elif state.on_duplicate == 'skip':
+                skipped += 1
+            else:
+                updates.append({
+                    **{f'new_{field}': lead.get(field) for field in LEAD_FIELDS if field != 'email'},
+                    'lead_id': row.id, 'now': now
+                })
+                old = {field: row._mapping[field] for field in FACET_FIELDS}
+                facets.update(facet_changes(old, {field: lead.get(field) or old[field] for field in FACET_FIELDS}))
+
+        return inserts, updates, facets, skipped, errors
+
+# Initialize the service instance
+import_service = ImportService()
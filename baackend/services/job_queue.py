@@ -0,0 +1,266 @@
+import os
+import time
+import uuid
+import random
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from models import db, Job
+
+logger = logging.getLogger(__name__)
+
+# Ready jobs looked at per claim attempt
+CLAIM_BATCH = 10
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying the job cannot succeed"""
+
+
+class JobQueue:
+    """
+    Durable job queue stored in the application database.
+
+    Jobs are added to the caller's session with enqueue() and become visible
+    when it commits. Workers claim a job by flipping it from queued to
+    running under a lease. Jobs that share a queue_key run one at a time in
+    enqueue order; a failed attempt is retried with exponential backoff and
+    keeps later jobs with the same key waiting until it succeeds or gives up.
+    """
+
+    def __init__(self, app=None):
+        self.handlers = {}
+        self.concurrency = 4
+        self.max_attempts = 5
+        self.retry_backoff = 2.0
+        self.max_backoff = 300.0
+        self.lease = 120.0
+        self.poll_interval = 1.0
+        self._last_reap = 0.0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize the queue with app configuration"""
+        self.concurrency = int(app.config.get(
+            'JOB_WORKER_CONCURRENCY', os.getenv('JOB_WORKER_CONCURRENCY', self.concurrency)))
+        self.max_attempts = int(app.config.get(
+            'JOB_MAX_ATTEMPTS', os.getenv('JOB_MAX_ATTEMPTS', self.max_attempts)))
+        self.retry_backoff = float(app.config.get(
+            'JOB_RETRY_BACKOFF', os.getenv('JOB_RETRY_BACKOFF', self.retry_backoff)))
+        self.max_backoff = float(app.config.get(
+            'JOB_MAX_BACKOFF', os.getenv('JOB_MAX_BACKOFF', self.max_backoff)))
+        self.lease = float(app.config.get(
+            'JOB_LEASE_SECONDS', os.getenv('JOB_LEASE_SECONDS', self.lease)))
+        self.poll_interval = float(app.config.get(
+            'JOB_POLL_INTERVAL', os.getenv('JOB_POLL_INTERVAL', self.poll_interval)))
+
+        # Wake idle workers (in any process, via pub/sub) once new jobs commit
+        if not db.event.contains(db.session, 'after_commit', self._notify_workers):
+            db.event.listen(db.session, 'after_commit', self._notify_workers)
+            db.event.listen(db.session, 'after_rollback', self._discard_notification)
+
+    def register(self, kind: str, handler: Callable[[Job], Any]):
+        """
+        Register the handler for a job kind. It is called as handler(job)
+        inside an app context; anything it adds to db.session is committed
+        together with the job being marked done.
+        """
+        self.handlers[kind] = handler
+
+    def enqueue(self, kind: str, payload: Optional[Dict[str, Any]] = None, queue_key: Optional[str] = None,
+                max_attempts: Optional[int] = None, delay: float = 0) -> Job:
+        """Add a job to the current session; workers see it once the session commits"""
+        job = Job(
+            kind=kind,
+            payload=payload or {},
+            queue_key=queue_key,
+            max_attempts=max_attempts or self.max_attempts,
+            run_at=datetime.utcnow() + timedelta(seconds=delay)
+        )
+        db.session.add(job)
+        db.session.info['jobs_enqueued'] = True
+        return job
+
+    def _notify_workers(self, session):
+        if session.info.pop('jobs_enqueued', False):
+            from .pubsub_service import pubsub_service
+            pubsub_service.publish('jobs', {})
+
+    def _discard_notification(self, session):
+        session.info.pop('jobs_enqueued', None)
+
+    def claim(self) -> Optional[Job]:
+        """
+        Claim the oldest ready job whose queue_key has no earlier unfinished job.
+
+        Returns:
+            Job: The claimed job (status running, locked_by set), or None
+        """
+        now = datetime.utcnow()
+        if time.monotonic() - self._last_reap > self.lease / 4:
+            self._last_reap = time.monotonic()
+            self.requeue_expired(now)
+
+        earlier = db.aliased(Job)
+        blocked = db.exists().where(
+            earlier.queue_key == Job.queue_key,
+            earlier.status.in_(('queued', 'running')),
+            earlier.id < Job.id
+        )
+        candidates = db.session.execute(
+            db.select(Job.id)
+            .where(Job.status == 'queued', Job.run_at <= now, ~blocked)
+            .order_by(Job.id)
+            .limit(CLAIM_BATCH)
+        ).scalars().all()
+
+        token = uuid.uuid4().hex
+        for job_id in candidates:
+            # Only one worker can move the row out of 'queued'
+            claimed = Job.query.filter_by(id=job_id, status='queued').update({
+                'status': 'running',
+                'locked_by': token,
+                'locked_until': now + timedelta(seconds=self.lease),
+                'attempts': Job.attempts + 1
+            }, synchronize_session=False)
+            db.session.commit()
+            if claimed:
+                return db.session.get(Job, job_id)
+        db.session.rollback()
+        return None
+
+    def run(self, job: Job) -> bool:
+        """Run a claimed job and record the outcome. Returns True if it succeeded."""
+        job_id, token, kind = job.id, job.locked_by, job.kind
+        attempts, max_attempts = job.attempts, job.max_attempts
+        started = time.monotonic()
+        try:
+            handler = self.handlers.get(kind)
+            if handler is None:
+                raise PermanentJobError(f"No handler registered for job kind {kind}")
+            handler(job)
+
+            # Commit the handler's writes only if we still hold the lease
+            finished = Job.query.filter_by(id=job_id, status='running', locked_by=token).update({
+                'status': 'done',
+                'locked_by': None,
+                'locked_until': None,
+                'last_error': None
+            }, synchronize_session=False)
+            if not finished:
+                db.session.rollback()
+                logger.warning(f"Job {job_id} lost its lease; discarding its result")
+                return False
+            db.session.commit()
+            logger.info(f"Job {job_id} ({kind}) done in {time.monotonic() - started:.2f}s")
+            return True
+
+        except Exception as e:
+            db.session.rollback()
+            retry = not isinstance(e, PermanentJobError) and attempts < max_attempts
+            values = {'locked_by': None, 'locked_until': None, 'last_error': f"{type(e).__name__}: {str(e)}"}
+            if retry:
+                backoff = min(self.max_backoff, self.retry_backoff * 2 ** (attempts - 1))
+                values.update(status='queued',
+                              run_at=datetime.utcnow() + timedelta(seconds=backoff * random.uniform(0.5, 1.0)))
+            else:
+                values['status'] = 'failed'
+            Job.query.filter_by(id=job_id, locked_by=token).update(values, synchronize_session=False)
+            db.session.commit()
+            logger.error(f"Job {job_id} ({kind}) attempt {attempts}/{max_attempts} failed: {str(e)}"
+                         + ('; will retry' if retry else ''))
+            return False
+
+    def renew(self, job: Job, seconds: Optional[float] = None) -> bool:
+        """
+        Extend a running job's lease; long handlers call this periodically.
+        Runs on its own connection so the handler's pending writes are not
+        committed. Returns False if the lease was already lost.
+        """
+        jobs = Job.__table__
+        with db.engine.begin() as connection:
+            renewed = connection.execute(
+                jobs.update()
+                .where(jobs.c.id == job.id, jobs.c.status == 'running', jobs.c.locked_by == job.locked_by)
+                .values(locked_until=datetime.utcnow() + timedelta(seconds=seconds or self.lease))
+            ).rowcount
+        return bool(renewed)
+
+    def requeue_expired(self, now: Optional[datetime] = None) -> int:
+        """Return jobs whose worker stopped renewing the lease to the queue"""
+        now = now or datetime.utcnow()
+        count = Job.query.filter(Job.status == 'running', Job.locked_until < now).update({
+            'status': db.case((Job.attempts >= Job.max_attempts, 'failed'), else_='queued'),
+            'locked_by': None,
+            'locked_until': None,
+            'run_at': now,
+            'last_error': 'Lease expired'
+        }, synchronize_session=False)
+        db.session.commit()
+        return count
+
+    def start_workers(self, app, concurrency: Optional[int] = None) -> 'JobWorker':
+        """Start a pool of worker threads in this process"""
+        worker = JobWorker(app, self, concurrency or self.concurrency)
+        worker.start()
+        return worker
+
+
+class JobWorker:
+    """A pool of threads that claim and run jobs until stopped"""
+
+    def __init__(self, app, queue: JobQueue, concurrency: int):
+        self.app = app
+        self.queue = queue
+        self.concurrency = concurrency
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._subscription = None
+
+    def start(self):
+        from .pubsub_service import pubsub_service
+
+        self._subscription = pubsub_service.subscribe('jobs')
+        listener = threading.Thread(target=self._listen, name='job-wakeup', daemon=True)
+        listener.start()
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._run, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop claiming jobs and wait for the ones in progress to finish"""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        if self._subscription is not None:
+            self._subscription.close()
+
+    def _listen(self):
+        while not self._stopping.is_set():
+            if self._subscription.get(timeout=self.queue.poll_interval) is not None:
+                self._wakeup.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            with self.app.app_context():
+                try:
+                    job = self.queue.claim()
+                    if job is not None:
+                        self.queue.run(job)
+                        continue
+                except Exception as e:
+                    # Database hiccups must not kill the worker thread
+                    db.session.rollback()
+                    logger.error(f"Job worker error: {str(e)}")
+            self._wakeup.wait(self.queue.poll_interval)
+            self._wakeup.clear()
+
+# Initialize the service instance
+job_queue = JobQueue()
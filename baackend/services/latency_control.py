@@ -0,0 +1,254 @@
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Any, Optional
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when no attempt finished before the call deadline"""
+
+
+def percentile(values, pct: float) -> Optional[float]:
+    """Nearest-rank percentile of a sequence, None when empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class LatencyWindow:
+    """Rolling window of recent latencies (seconds) with percentile queries"""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, latency: float):
+        with self._lock:
+            self._samples.append(latency)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            samples = list(self._samples)
+        return percentile(samples, pct)
+
+
+class CircuitBreaker:
+    """
+    Per-model breaker that opens on a high error rate or a slow p95.
+
+    While open, callers should route to a fallback. After `cooldown`
+    seconds a single trial request is let through (half-open); its outcome
+    closes or re-opens the breaker.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, error_rate: float = 0.5, latency_threshold: Optional[float] = None,
+                 window: int = 50, min_samples: int = 10, cooldown: float = 30.0):
+        self.error_rate = error_rate
+        self.latency_threshold = latency_threshold
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.trips = 0
+        self._outcomes = deque(maxlen=window)
+        self._latencies = deque(maxlen=window)
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a request may be sent to this model right now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record(self, success: bool, latency: Optional[float] = None):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._trial_in_flight = False
+                if success and not self._too_slow([latency] if latency is not None else []):
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                    self._latencies.clear()
+                else:
+                    self._trip()
+                return
+
+            self._outcomes.append(success)
+            if latency is not None:
+                self._latencies.append(latency)
+            if self.state == self.CLOSED and len(self._outcomes) >= self.min_samples:
+                failures = self._outcomes.count(False) / len(self._outcomes)
+                if failures >= self.error_rate or self._too_slow(self._latencies):
+                    self._trip()
+
+    def _too_slow(self, latencies) -> bool:
+        if not self.latency_threshold or not latencies:
+            return False
+        return percentile(list(latencies), 95) > self.latency_threshold
+
+    def _trip(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self.state,
+                'trips': self.trips,
+                'recent_error_rate': (
+                    self._outcomes.count(False) / len(self._outcomes) if self._outcomes else 0.0
+                )
+            }
+
+
+class HedgeStats:
+    """Counters and end-to-end latency window for one model"""
+
+    def __init__(self, window: int = 1000):
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+        self.failovers = 0
+        self.latency = LatencyWindow(window)
+        self._lock = threading.Lock()
+
+    def incr(self, **counters):
+        with self._lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        p50, p95, p99 = (self.latency.percentile(p) for p in (50, 95, 99))
+        return {
+            'calls': self.calls,
+            'hedged': self.hedged,
+            'hedge_rate': self.hedged / self.calls if self.calls else 0.0,
+            'hedge_wins': self.hedge_wins,
+            'deadline_exceeded': self.deadline_exceeded,
+            'failovers': self.failovers,
+            'latency_ms': {
+                'p50': round(p50 * 1000, 1) if p50 is not None else None,
+                'p95': round(p95 * 1000, 1) if p95 is not None else None,
+                'p99': round(p99 * 1000, 1) if p99 is not None else None,
+            }
+        }
+
+
+class HedgedCaller:
+    """
+    Runs a blocking call with a deadline and an optional hedged duplicate.
+
+    The duplicate is sent once the primary has been outstanding longer than
+    the model's recent p95 latency. Whichever attempt finishes first wins.
+    The loser is cancelled if it has not started yet; otherwise its
+    result is discarded and its own request timeout bounds how long it can
+    hold a pool thread.
+    """
+
+    def __init__(self, max_workers: int = 32, hedge_percentile: float = 95,
+                 min_samples: int = 20, default_delay: float = 2.0, min_delay: float = 0.05):
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='openai-hedge')
+        self._windows = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def window(self, key: str) -> LatencyWindow:
+        with self._lock:
+            if key not in self._windows:
+                self._windows[key] = LatencyWindow()
+            return self._windows[key]
+
+    def stats(self, key: str) -> HedgeStats:
+        with self._lock:
+            if key not in self._stats:
+                self._stats[key] = HedgeStats()
+            return self._stats[key]
+
+    def hedge_delay(self, key: str) -> float:
+        window = self.window(key)
+        if len(window) < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, window.percentile(self.hedge_percentile))
+
+    def call(self, key: str, fn: Callable[[float], Any], deadline: float, hedge: bool = True):
+        """
+        Call `fn(timeout)` and return its result within `deadline` seconds.
+
+        Raises:
+            DeadlineExceeded: if no attempt finished in time
+            Exception: the last attempt's error if every attempt failed
+        """
+        stats = self.stats(key)
+        started = time.monotonic()
+        expires = started + deadline
+        stats.incr(calls=1)
+
+        primary = self._executor.submit(self._timed, fn, deadline)
+        pending = {primary}
+        hedge_future = None
+
+        if hedge:
+            delay = min(self.hedge_delay(key), deadline)
+            done, _ = wait(pending, timeout=delay)
+            remaining = expires - time.monotonic()
+            if not done and remaining > 0:
+                hedge_future = self._executor.submit(self._timed, fn, remaining)
+                pending.add(hedge_future)
+                stats.incr(hedged=1)
+
+        error = None
+        while pending:
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result, latency = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                for loser in pending:
+                    loser.cancel()
+                self.window(key).add(latency)
+                stats.latency.add(time.monotonic() - started)
+                if future is hedge_future:
+                    stats.incr(hedge_wins=1)
+                return result
+
+        for loser in pending:
+            loser.cancel()
+        if error is not None and not pending:
+            raise error
+        stats.incr(deadline_exceeded=1)
+        raise DeadlineExceeded(f"No response within {deadline:.2f}s")
+
+    @staticmethod
+    def _timed(fn, timeout):
+        started = time.monotonic()
+        result = fn(timeout)
+        return result, time.monotonic() - started
@@ -0,0 +1,271 @@
+import os
+import hmac
+import json
+import queue
+import logging
+import logging.handlers
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+from flask import jsonify, request, current_app, has_request_context, Response
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536)
+THROUGHPUT_BUCKETS = (5, 10, 20, 40, 80, 160, 320)
+
+
+class Histogram:
+    """Fixed-bucket histogram; recording is a bisect and two additions"""
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by linear interpolation inside its bucket"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= target and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (target - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 4),
+            'mean': round(self.sum / self.count, 4) if self.count else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99)
+        }
+
+
+class CallMetrics:
+    """All histograms and counters for one (kind, model, route) series"""
+
+    __slots__ = ('latency', 'ttft', 'prompt_tokens', 'completion_tokens',
+                 'tokens_per_second', 'errors')
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.ttft = Histogram(LATENCY_BUCKETS)
+        self.prompt_tokens = Histogram(TOKEN_BUCKETS)
+        self.completion_tokens = Histogram(TOKEN_BUCKETS)
+        self.tokens_per_second = Histogram(THROUGHPUT_BUCKETS)
+        self.errors = defaultdict(int)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'latency_seconds': self.latency.to_dict(),
+            'time_to_first_token_seconds': self.ttft.to_dict(),
+            'prompt_tokens': self.prompt_tokens.to_dict(),
+            'completion_tokens': self.completion_tokens.to_dict(),
+            'tokens_per_second': self.tokens_per_second.to_dict(),
+            'errors': dict(self.errors)
+        }
+
+
+class MetricsService:
+    def __init__(self, app=None):
+        self.series = {}
+        self.usage = defaultdict(lambda: {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0})
+        self.log_sink = None
+        self._listener = None
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize the metrics registry and the optional log sink"""
+        log_path = app.config.get('LLM_METRICS_LOG', os.getenv('LLM_METRICS_LOG'))
+        if log_path and self._listener is None:
+            # The hot path only enqueues; a listener thread does the I/O
+            handler = (logging.StreamHandler() if log_path == '-'
+                       else logging.FileHandler(log_path))
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            log_queue = queue.SimpleQueue()
+            self._listener = logging.handlers.QueueListener(log_queue, handler)
+            self._listener.start()
+
+            self.log_sink = logging.getLogger('vly_agentflow.llm_metrics')
+            self.log_sink.setLevel(logging.INFO)
+            self.log_sink.propagate = False
+            self.log_sink.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    def record_llm_call(
+        self,
+        kind: str,
+        model: str,
+        latency: float,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        ttft: Optional[float] = None,
+        error_type: Optional[str] = None,
+        user_id: Any = None,
+        route: Optional[str] = None
+    ):
+        """Record one chat or embedding call"""
+        route = route or self._current_route()
+        if user_id is None:
+            user_id = self._current_user()
+
+        with self._lock:
+            key = (kind, model, route)
+            metrics = self.series.get(key)
+            if metrics is None:
+                metrics = self.series[key] = CallMetrics()
+
+            metrics.latency.observe(latency)
+            if error_type:
+                metrics.errors[error_type] += 1
+            else:
+                if ttft is not None:
+                    metrics.ttft.observe(ttft)
+                metrics.prompt_tokens.observe(prompt_tokens)
+                if kind == 'chat':
+                    metrics.completion_tokens.observe(completion_tokens)
+                    if latency > 0:
+                        metrics.tokens_per_second.observe(completion_tokens / latency)
+
+            if user_id is not None:
+                usage = self.usage[(str(user_id), model)]
+                usage['calls'] += 1
+                usage['prompt_tokens'] += prompt_tokens
+                usage['completion_tokens'] += completion_tokens
+
+        if self.log_sink is not None:
+            self.log_sink.info(json.dumps({
+                'ts': datetime.utcnow().isoformat(),
+                'kind': kind,
+                'model': model,
+                'route': route,
+                'user_id': user_id,
+                'latency': round(latency, 4),
+                'ttft': round(ttft, 4) if ttft is not None else None,
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'error_type': error_type
+            }))
+
+    def _current_route(self) -> str:
+        if has_request_context():
+            return request.endpoint or request.path
+        return 'background'
+
+    def _current_user(self):
+        if not has_request_context():
+            return None
+        try:
+            return get_jwt_identity()
+        except RuntimeError:
+            # Route is not JWT protected
+            return None
+
+    def snapshot(self, user_id: Any = None) -> Dict[str, Any]:
+        """
+        JSON view of every series and all usage or, for one user, only that
+        user's usage; the series mix every user's calls
+        """
+        with self._lock:
+            usage = [{
+                'user_id': uid,
+                'model': model,
+                **counters
+            } for (uid, model), counters in self.usage.items()
+              if user_id is None or uid == str(user_id)]
+            if user_id is not None:
+                return {'usage': usage}
+            series = [{
+                'kind': kind,
+                'model': model,
+                'route': route,
+                **metrics.to_dict()
+            } for (kind, model, route), metrics in self.series.items()]
+        return {'series': series, 'usage': usage}
+
+    def prometheus(self) -> str:
+        """Render histograms in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, attr in (
+                ('llm_latency_seconds', 'latency'),
+                ('llm_time_to_first_token_seconds', 'ttft'),
+                ('llm_prompt_tokens', 'prompt_tokens'),
+                ('llm_completion_tokens', 'completion_tokens'),
+                ('llm_tokens_per_second', 'tokens_per_second'),
+            ):
+                lines.append(f"# TYPE {name} histogram")
+                for (kind, model, route), metrics in self.series.items():
+                    hist = getattr(metrics, attr)
+                    labels = f'kind="{kind}",model="{model}",route="{route}"'
+                    cumulative = 0
+                    for bound, bucket_count in zip(hist.buckets, hist.counts):
+                        cumulative += bucket_count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {hist.count}')
+                    lines.append(f'{name}_sum{{{labels}}} {hist.sum}')
+                    lines.append(f'{name}_count{{{labels}}} {hist.count}')
+
+            lines.append("# TYPE llm_errors_total counter")
+            for (kind, model, route), metrics in self.series.items():
+                for error_type, count in metrics.errors.items():
+                    lines.append(
+                        f'llm_errors_total{{kind="{kind}",model="{model}",route="{route}",'
+                        f'error_type="{error_type}"}} {count}'
+                    )
+
+            lines.append("# TYPE llm_user_tokens_total counter")
+            for (uid, model), counters in self.usage.items():
+                for token_kind in ('prompt_tokens', 'completion_tokens'):
+                    lines.append(
+                        f'llm_user_tokens_total{{user_id="{uid}",model="{model}",'
+                        f'type="{token_kind}"}} {counters[token_kind]}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+# Initialize the service instance
+metrics_service = MetricsService()
+
+def create_metrics_routes(bp):
+    """Create metrics API routes"""
+
+    @bp.route('/metrics/llm', methods=['GET'])
+    @jwt_required()
+    def llm_metrics():
+        """The caller's own token usage per model"""
+        return jsonify({
+            'success': True,
+            'data': metrics_service.snapshot(user_id=get_jwt_identity())
+        })
+
+    @bp.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        # Scrapers authenticate with a static token instead of a JWT; the
+        # output has every user's usage, so without a token it is not served
+        token = current_app.config.get('METRICS_TOKEN', os.getenv('METRICS_TOKEN'))
+        if not token:
+            return jsonify({'message': 'Metrics are disabled until METRICS_TOKEN is set'}), 403
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return jsonify({'message': 'Unauthorized'}), 401
+        return Response(metrics_service.prometheus(), mimetype='text/plain; version=0.0.4')
+
+    return bp
@@ -10,20 +10,24 @@ def init_n8n_service(app):
     app.config['N8N_WEBHOOK_SECRET'] = os.getenv('N8N_WEBHOOK_SECRET', 'your-secret-key')
 
 class N8NService:
+    def init_app(self, app):
+        """Initialize n8n configuration for the app"""
+        init_n8n_service(app)
+    
     @staticmethod
-    @jwt_required()
-    def execute_workflow(workflow_id, payload=None):
+    def execute_workflow(workflow_id, payload=None, timeout=None):
         """
         Execute an n8n workflow
         
         Args:
             workflow_id (str): The ID of the workflow to execute
             payload (dict): Optional payload to send to the workflow
+            timeout (float): Optional request timeout in seconds
             
         Returns:
             dict: Response from n8n
         """
-        n8n_url = f"{current_app.config['N8N_BASE_URL']}/webhook/{workhook_id}"
+        n8n_url = f"{current_app.config['N8N_BASE_URL']}/webhook/{workflow_id}"
         
         try:
             headers = {
@@ -34,7 +38,8 @@ class N8NService:
             response = requests.post(
                 n8n_url,
                 json=payload or {},
-                headers=headers
+                headers=headers,
+                timeout=timeout
             )
             
             if response.status_code == 200:
@@ -1,12 +1,21 @@
 import os
+import threading
+import time
 import openai
 from flask import jsonify, request, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from openai import OpenAI
+from .latency_control import HedgedCaller, CircuitBreaker
+from .metrics_service import metrics_service
 
 class OpenAIService:
     def __init__(self, app=None):
         self.client = None
+        self.fallback_model = None
+        self.hedger = None
+        self.breakers = {}
+        self._breaker_config = {}
+        self._lock = threading.Lock()
         if app is not None:
             self.init_app(app)
     
@@ -16,18 +25,59 @@ class OpenAIService:
         if not api_key:
             raise ValueError("OPENAI_API_KEY environment variable is not set")
             
-        self.client = OpenAI(api_key=api_key)
+        # Any OpenAI-compatible endpoint, e.g. the local stub in scripts/openai_stub.py
+        base_url = os.getenv('OPENAI_BASE_URL') or None
+        
+        # Retries are handled by hedging and failover, not inside the client
+        self.client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
         app.config['OPENAI_DEFAULT_MODEL'] = os.getenv('OPENAI_DEFAULT_MODEL', 'gpt-4o')
         app.config['OPENAI_MAX_TOKENS'] = int(os.getenv('OPENAI_MAX_TOKENS', 2000))
         app.config['OPENAI_TEMPERATURE'] = float(os.getenv('OPENAI_TEMPERATURE', 0.7))
+        app.config['OPENAI_TIMEOUT'] = float(os.getenv('OPENAI_TIMEOUT', 30))
+        app.config['OPENAI_HEDGE_ENABLED'] = os.getenv('OPENAI_HEDGE_ENABLED', 'true').lower() == 'true'
+        
+        self.fallback_model = os.getenv('OPENAI_FALLBACK_MODEL')
+        self.hedger = HedgedCaller(
+            max_workers=int(os.getenv('OPENAI_HEDGE_POOL_SIZE', 32)),
+            hedge_percentile=float(os.getenv('OPENAI_HEDGE_PERCENTILE', 95)),
+            default_delay=float(os.getenv('OPENAI_HEDGE_DEFAULT_DELAY', 2.0))
+        )
+        latency_threshold = os.getenv('OPENAI_BREAKER_LATENCY')
+        self._breaker_config = {
+            'error_rate': float(os.getenv('OPENAI_BREAKER_ERROR_RATE', 0.5)),
+            'latency_threshold': float(latency_threshold) if latency_threshold else None,
+            'cooldown': float(os.getenv('OPENAI_BREAKER_COOLDOWN', 30))
+        }
     
-    def chat_completion(self, messages, model=None, **kwargs):
+    def _breaker(self, model):
+        with self._lock:
+            if model not in self.breakers:
+                self.breakers[model] = CircuitBreaker(**self._breaker_config)
+            return self.breakers[model]
+    
+    def _route_model(self, model):
+        """Pick the requested model, or the fallback while its breaker is open"""
+        if self._breaker(model).allow():
+            return model
+        if self.fallback_model and self.fallback_model != model and self._breaker(self.fallback_model).allow():
+            self.hedger.stats(model).incr(failovers=1)
+            return self.fallback_model
+        # Nothing healthier to send to; let the request through
+        return model
+    
+    def chat_completion(self, messages, model=None, deadline=None, hedge=None, user_id=None, **kwargs):
         """
         Generate chat completion using OpenAI's API
         
         Args:
             messages (list): List of message dictionaries with 'role' and 'content'
             model (str, optional): Model to use. Defaults to configured default.
+            deadline (float, optional): Seconds before the call gives up.
+                Defaults to OPENAI_TIMEOUT.
+            hedge (bool, optional): Send a duplicate request when the first is
+                slower than the model's recent p95. Defaults to OPENAI_HEDGE_ENABLED.
+            user_id (optional): User to attribute usage to. Defaults to the
+                JWT identity of the current request.
             **kwargs: Additional parameters for the API call
             
         Returns:
@@ -36,29 +86,56 @@ class OpenAIService:
         if not self.client:
             raise RuntimeError("OpenAIService not initialized with app")
             
+        requested_model = model or current_app.config['OPENAI_DEFAULT_MODEL']
+        target_model = self._route_model(requested_model)
+        deadline = deadline or current_app.config['OPENAI_TIMEOUT']
+        if hedge is None:
+            hedge = current_app.config['OPENAI_HEDGE_ENABLED']
+        params = dict(
+            model=target_model,
+            messages=messages,
+            max_tokens=kwargs.get('max_tokens', current_app.config['OPENAI_MAX_TOKENS']),
+            temperature=kwargs.get('temperature', current_app.config['OPENAI_TEMPERATURE']),
+            **{k: v for k, v in kwargs.items() 
+               if k not in ['max_tokens', 'temperature']}
+        )
+        
+        started = time.monotonic()
         try:
-            response = self.client.chat.completions.create(
-                model=model or current_app.config['OPENAI_DEFAULT_MODEL'],
-                messages=messages,
-                max_tokens=kwargs.get('max_tokens', current_app.config['OPENAI_MAX_TOKENS']),
-                temperature=kwargs.get('temperature', current_app.config['OPENAI_TEMPERATURE']),
-                **{k: v for k, v in kwargs.items() 
-                   if k not in ['max_tokens', 'temperature']}
+            response = self.hedger.call(
+                target_model,
+                lambda timeout: self.client.chat.completions.create(timeout=timeout, **params),
+                deadline=deadline,
+                hedge=hedge
             )
-            return {
+            result = {
                 'success': True,
                 'data': {
                     'id': response.id,
                     'model': response.model,
-                    'usage': dict(response.usage),
+                    'usage': response.usage.model_dump(),
                     'choices': [{
-                        'message': dict(choice.message),
+                        'message': choice.message.model_dump(),
                         'finish_reason': choice.finish_reason
                     } for choice in response.choices]
                 }
             }
+            latency = time.monotonic() - started
+            self._breaker(target_model).record(True, latency)
+            metrics_service.record_llm_call(
+                'chat', target_model, latency,
+                prompt_tokens=getattr(response.usage, 'prompt_tokens', 0),
+                completion_tokens=getattr(response.usage, 'completion_tokens', 0),
+                user_id=user_id
+            )
+            return result
             
         except Exception as e:
+            latency = time.monotonic() - started
+            self._breaker(target_model).record(False, latency)
+            metrics_service.record_llm_call(
+                'chat', target_model, latency, error_type=type(e).__name__, user_id=user_id
+            )
             current_app.logger.error(f"OpenAI API error: {str(e)}")
             return {
                 'success': False,
@@ -66,13 +143,83 @@ class OpenAIService:
                 'type': type(e).__name__
             }
     
-    def generate_embeddings(self, text, model="text-embedding-3-small"):
+    def stream_chat_completion(self, messages, model=None, deadline=None, user_id=None, **kwargs):
+        """
+        Stream a chat completion, yielding content deltas as they arrive
+        
+        Takes the same arguments as chat_completion. Streams are not hedged,
+        but they still honour the deadline and the model's circuit breaker.
+        
+        Yields:
+            str: Content fragments of the assistant message
+        """
+        if not self.client:
+            raise RuntimeError("OpenAIService not initialized with app")
+            
+        target_model = self._route_model(model or current_app.config['OPENAI_DEFAULT_MODEL'])
+        started = time.monotonic()
+        ttft = None
+        usage = None
+        try:
+            stream = self.client.chat.completions.create(
+                model=target_model,
+                messages=messages,
+                max_tokens=kwargs.get('max_tokens', current_app.config['OPENAI_MAX_TOKENS']),
+                temperature=kwargs.get('temperature', current_app.config['OPENAI_TEMPERATURE']),
+                stream=True,
+                stream_options={'include_usage': True},
+                timeout=deadline or current_app.config['OPENAI_TIMEOUT'],
+                **{k: v for k, v in kwargs.items() 
+                   if k not in ['max_tokens', 'temperature']}
+            )
+            for chunk in stream:
+                if chunk.usage:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if ttft is None:
+                        ttft = time.monotonic() - started
+                    yield chunk.choices[0].delta.content
+                    
+        except Exception as e:
+            latency = time.monotonic() - started
+            self._breaker(target_model).record(False, latency)
+            metrics_service.record_llm_call(
+                'chat', target_model, latency, ttft=ttft,
+                error_type=type(e).__name__, user_id=user_id
+            )
+            current_app.logger.error(f"OpenAI streaming error: {str(e)}")
+            raise
+            
+        latency = time.monotonic() - started
+        self._breaker(target_model).record(True, latency)
+        metrics_service.record_llm_call(
+            'chat', target_model, latency, ttft=ttft,
+            prompt_tokens=getattr(usage, 'prompt_tokens', 0),
+            completion_tokens=getattr(usage, 'completion_tokens', 0),
+            user_id=user_id
+        )
+    
+    def get_latency_stats(self):
+        """Hedging, failover and latency percentiles per model"""
+        with self._lock:
+            breakers = dict(self.breakers)
+        return {
+            model: {
+                **(self.hedger.stats(model).to_dict() if self.hedger else {}),
+                'circuit': breaker.to_dict()
+            }
+            for model, breaker in breakers.items()
+        }
+    
+    def generate_embeddings(self, text, model="text-embedding-3-small", user_id=None):
         """
         Generate embeddings for the input text
         
         Args:
             text (str or list): Text or list of texts to generate embeddings for
             model (str): Embedding model to use
+            user_id (optional): User to attribute usage to. Defaults to the
+                JWT identity of the current request.
             
         Returns:
             dict: API response with embeddings
@@ -80,17 +227,17 @@ class OpenAIService:
         if not self.client:
             raise RuntimeError("OpenAIService not initialized with app")
             
+        started = time.monotonic()
         try:
             response = self.client.embeddings.create(
                 input=text,
                 model=model
             )
-            
-            return {
+            result = {
                 'success': True,
                 'data': {
                     'model': response.model,
-                    'usage': dict(response.usage),
+                    'usage': response.usage.model_dump(),
                     'embeddings': [{
                         'object': emb.object,
                         'embedding': emb.embedding,
@@ -98,8 +245,18 @@ class OpenAIService:
                     } for emb in response.data]
                 }
             }
+            metrics_service.record_llm_call(
+                'embedding', model, time.monotonic() - started,
+                prompt_tokens=getattr(response.usage, 'prompt_tokens', 0),
+                user_id=user_id
+            )
+            return result
             
         except Exception as e:
+            metrics_service.record_llm_call(
+                'embedding', model, time.monotonic() - started,
+                error_type=type(e).__name__, user_id=user_id
+            )
             current_app.logger.error(f"OpenAI Embeddings error: {str(e)}")
             return {
                 'success': False,
@@ -153,4 +310,12 @@ def create_openai_routes(bp):
         
         return jsonify(result), 200 if result['success'] else 500
     
+    @bp.route('/openai/latency', methods=['GET'])
+    @jwt_required()
+    def latency_stats():
+        return jsonify({
+            'success': True,
+            'data': openai_service.get_latency_stats()
+        })
+    
     return bp
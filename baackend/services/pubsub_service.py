@@ -0,0 +1,238 @@
+import os
+import json
+import queue
+import socket
+import socketserver
+import threading
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Dict, Optional
+
+from models import db, Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+
+def parse_address(url: str):
+    """Split unix:///path or tcp://host:port into (family, address)"""
+    if url.startswith('unix://'):
+        return socket.AF_UNIX, url[len('unix://'):]
+    if url.startswith('tcp://'):
+        host, _, port = url[len('tcp://'):].rpartition(':')
+        return socket.AF_INET, (host or '127.0.0.1', int(port))
+    raise ValueError(f"Unsupported broker URL: {url}")
+
+
+class Subscription:
+    """A bounded queue of events for one listener"""
+
+    def __init__(self, service, topics, maxsize: int = 1000):
+        self.service = service
+        self.topics = topics
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, topic: str, data: Any):
+        try:
+            self._queue.put_nowait((topic, data))
+        except queue.Full:
+            # A slow consumer must resync from the database instead
+            self.overflowed = True
+
+    def get(self, timeout: Optional[float] = None):
+        """Next (topic, data) pair, or None on timeout"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.service.unsubscribe(self)
+
+
+class BrokerClient:
+    """
+    Connection from one worker process to the local broker.
+
+    Every published event goes to the broker, which echoes it to all
+    connected workers (this one included), so each process delivers to its
+    own subscribers. Reconnects in the background if the broker goes away.
+    """
+
+    def __init__(self, url: str, on_message: Callable[[str, Any], None], retry_interval: float = 2.0):
+        self.family, self.address = parse_address(url)
+        self.on_message = on_message
+        self.retry_interval = retry_interval
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._connected = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='pubsub-broker', daemon=True)
+        self._thread.start()
+
+    def publish(self, topic: str, data: Any) -> bool:
+        if not self._connected.is_set():
+            return False
+        line = (json.dumps({'topic': topic, 'data': data}, default=str) + '\n').encode()
+        try:
+            with self._send_lock:
+                self._sock.sendall(line)
+            return True
+        except OSError:
+            self._connected.clear()
+            return False
+
+    def _run(self):
+        stop = threading.Event()
+        while True:
+            try:
+                sock = socket.socket(self.family, socket.SOCK_STREAM)
+                sock.connect(self.address)
+            except OSError:
+                stop.wait(self.retry_interval)
+                continue
+
+            self._sock = sock
+            self._connected.set()
+            try:
+                for line in sock.makefile('rb'):
+                    event = json.loads(line)
+                    self.on_message(event['topic'], event['data'])
+            except (OSError, ValueError) as e:
+                logger.warning(f"Pub/sub broker connection lost: {str(e)}")
+            finally:
+                self._connected.clear()
+                sock.close()
+            stop.wait(self.retry_interval)
+
+
+class PubSubBroker:
+    """
+    Minimal fan-out broker standing in for Redis pub/sub on one host.
+
+    Workers connect over a Unix or TCP socket and send newline-delimited
+    JSON events; every event is forwarded to every connected worker.
+    """
+
+    def __init__(self, url: str):
+        self.family, self.address = parse_address(url)
+        self.clients = set()
+        self._lock = threading.Lock()
+
+    def serve_forever(self):
+        broker = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                with broker._lock:
+                    broker.clients.add(self.request)
+                try:
+                    for line in self.rfile:
+                        broker.broadcast(line)
+                finally:
+                    with broker._lock:
+                        broker.clients.discard(self.request)
+
+        if self.family == socket.AF_UNIX:
+            if os.path.exists(self.address):
+                os.unlink(self.address)
+            server_class = socketserver.ThreadingUnixStreamServer
+        else:
+            server_class = socketserver.ThreadingTCPServer
+        server_class.daemon_threads = True
+        server_class.allow_reuse_address = True
+        with server_class(self.address, Handler) as server:
+            server.serve_forever()
+
+    def broadcast(self, line: bytes):
+        with self._lock:
+            clients = list(self.clients)
+        for client in clients:
+            try:
+                client.sendall(line)
+            except OSError:
+                with self._lock:
+                    self.clients.discard(client)
+
+
+class PubSubService:
+    def __init__(self, app=None):
+        self._subscriptions = defaultdict(set)
+        self._owners = {}
+        self._lock = threading.Lock()
+        self.broker = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Connect to the broker (if configured) and publish committed messages"""
+        broker_url = app.config.get('PUBSUB_BROKER_URL', os.getenv('PUBSUB_BROKER_URL'))
+        if broker_url and self.broker is None:
+            self.broker = BrokerClient(broker_url, self._deliver)
+
+        if not db.event.contains(db.session, 'after_flush', self._collect_messages):
+            db.event.listen(db.session, 'after_flush', self._collect_messages)
+            db.event.listen(db.session, 'after_commit', self._publish_messages)
+            db.event.listen(db.session, 'after_rollback', self._discard_messages)
+
+    def publish(self, topic: str, data: Any):
+        """Publish to every subscriber of `topic` in every worker"""
+        if self.broker is not None and self.broker.publish(topic, data):
+            return
+        # No broker (or it is down): deliver within this process only
+        self._deliver(topic, data)
+
+    def subscribe(self, *topics: str, maxsize: int = 1000) -> Subscription:
+        subscription = Subscription(self, topics, maxsize)
+        with self._lock:
+            for topic in topics:
+                self._subscriptions[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscriptions[topic].discard(subscription)
+                if not self._subscriptions[topic]:
+                    del self._subscriptions[topic]
+
+    def _deliver(self, topic: str, data: Any):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(topic, ()))
+        for subscription in subscriptions:
+            subscription.put(topic, data)
+
+    def _conversation_owner(self, connection, conversation_id: int) -> int:
+        # Ownership never changes, so one lookup per conversation is enough
+        owner = self._owners.get(conversation_id)
+        if owner is None:
+            owner = connection.execute(
+                db.select(Conversation.user_id).where(Conversation.id == conversation_id)
+            ).scalar()
+            if len(self._owners) > 10000:
+                self._owners.clear()
+            self._owners[conversation_id] = owner
+        return owner
+
+    def _collect_messages(self, session, flush_context):
+        new_messages = [obj for obj in session.new if isinstance(obj, Message)]
+        if not new_messages:
+            return
+        connection = session.connection()
+        pending = session.info.setdefault('pubsub_messages', [])
+        for message in new_messages:
+            pending.append((
+                self._conversation_owner(connection, message.conversation_id),
+                message.to_dict()
+            ))
+
+    def _publish_messages(self, session):
+        for user_id, message in session.info.pop('pubsub_messages', []):
+            self.publish(f"conversation:{message['conversation_id']}", message)
+            self.publish(f"user:{user_id}", message)
+
+    def _discard_messages(self, session):
+        session.info.pop('pubsub_messages', None)
+
+# Initialize the service instance
+pubsub_service = PubSubService()
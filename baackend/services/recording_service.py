@@ -0,0 +1,282 @@
+import os
+import time
+import uuid
+import hashlib
+import ipaddress
+import logging
+import mimetypes
+import shutil
+import socket
+import subprocess
+import threading
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, CallLog, Job, Recording
+from .job_queue import job_queue, PermanentJobError
+
+logger = logging.getLogger(__name__)
+
+RECORDING_FETCH_JOB = 'recording_fetch'
+CHUNK_SIZE = 1024 * 1024
+# Redirects followed when fetching a recording, each checked like the original URL
+MAX_REDIRECTS = 3
+# Transcodes of the same output file in one process run one at a time
+TRANSCODE_LOCKS = 64
+
+# format -> (content type, ffmpeg output options)
+TRANSCODE_FORMATS = {
+    'mp3': ('audio/mpeg', ['-codec:a', 'libmp3lame', '-q:a', '5', '-f', 'mp3']),
+    'ogg': ('audio/ogg', ['-codec:a', 'libopus', '-b:a', '32k', '-f', 'ogg']),
+    'wav': ('audio/wav', ['-codec:a', 'pcm_s16le', '-f', 'wav'])
+}
+# Content types the stored file may already be in for each format
+NATIVE_TYPES = {
+    'mp3': ('audio/mpeg', 'audio/mp3'),
+    'ogg': ('audio/ogg', 'audio/opus'),
+    'wav': ('audio/wav', 'audio/x-wav', 'audio/wave')
+}
+
+
+def format_of(content_type: str) -> Optional[str]:
+    """The TRANSCODE_FORMATS name of a content type, if it is one of them"""
+    return next((fmt for fmt, types in NATIVE_TYPES.items() if content_type in types), None)
+
+
+class InvalidRecordingRequest(ValueError):
+    """Raised for a recording format that cannot be served"""
+
+
+class RecordingTooLarge(PermanentJobError):
+    """Raised when a recording is larger than RECORDING_MAX_BYTES"""
+
+
+class ForbiddenRecordingUrl(PermanentJobError):
+    """Raised for a recording URL the service will not fetch"""
+
+
+class RecordingService:
+    """
+    Keeps call recordings in a local content-addressed store.
+
+    When the telephony writer sees a recording URL for a call it queues a
+    fetch job; a job worker streams the file to disk while hashing it,
+    moves it to objects/<aa>/<bb>/<sha256> and points the call at the
+    Recording row. Files are written once and never modified, so the
+    digest is a strong ETag and responses can be cached indefinitely.
+
+    Recording URLs arrive in webhooks, so they are only fetched over https
+    from hosts in RECORDING_FETCH_ALLOWED_HOSTS that resolve to public
+    addresses. Redirects are followed by hand and each hop is checked the
+    same way. RECORDING_FETCH_ALLOW_INSECURE lifts the https and address
+    checks for local development against the telephony stub.
+
+    Recordings are served with send_file: whole files go out through the
+    server's wsgi.file_wrapper (sendfile under gunicorn), Range requests
+    read only the bytes asked for, and with USE_X_SENDFILE the front end
+    serves the file itself. Other formats are transcoded with ffmpeg on
+    first request and cached under transcoded/; that directory can be
+    cleared at any time.
+    """
+
+    def __init__(self, app=None):
+        self.storage_dir = None
+        self.max_bytes = 512 * 1024 * 1024
+        self.fetch_timeout = 30.0
+        self.max_attempts = 5
+        self.allowed_hosts = ()
+        self.allow_insecure = False
+        self.ffmpeg = None
+        self.transcode_timeout = 300.0
+        self.max_age = 365 * 24 * 3600
+        self._locks = [threading.Lock() for _ in range(TRANSCODE_LOCKS)]
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize the recording store with app configuration"""
+        self.storage_dir = os.path.join(app.root_path, app.config.get(
+            'RECORDING_STORAGE_DIR', os.getenv('RECORDING_STORAGE_DIR', 'recordings')))
+        self.max_bytes = int(app.config.get(
+            'RECORDING_MAX_BYTES', os.getenv('RECORDING_MAX_BYTES', self.max_bytes)))
+        self.fetch_timeout = float(app.config.get(
+            'RECORDING_FETCH_TIMEOUT', os.getenv('RECORDING_FETCH_TIMEOUT', self.fetch_timeout)))
+        self.max_attempts = int(app.config.get(
+            'RECORDING_FETCH_MAX_ATTEMPTS', os.getenv('RECORDING_FETCH_MAX_ATTEMPTS', self.max_attempts)))
+        # Provider hosts recordings may be fetched from; a leading dot also allows subdomains
+        allowed_hosts = app.config.get('RECORDING_FETCH_ALLOWED_HOSTS', os.getenv('RECORDING_FETCH_ALLOWED_HOSTS', ''))
+        if isinstance(allowed_hosts, str):
+            allowed_hosts = allowed_hosts.split(',')
+        self.allowed_hosts = tuple(host.strip().lower() for host in allowed_hosts if host.strip())
+        # Local development only: allow http and private addresses
+        self.allow_insecure = str(app.config.get(
+            'RECORDING_FETCH_ALLOW_INSECURE', os.getenv('RECORDING_FETCH_ALLOW_INSECURE', 'false'))).lower() == 'true'
+        self.ffmpeg = app.config.get('RECORDING_FFMPEG', os.getenv('RECORDING_FFMPEG')) or shutil.which('ffmpeg')
+        self.transcode_timeout = float(app.config.get(
+            'RECORDING_TRANSCODE_TIMEOUT', os.getenv('RECORDING_TRANSCODE_TIMEOUT', self.transcode_timeout)))
+        self.max_age = int(app.config.get(
+            'RECORDING_CACHE_MAX_AGE', os.getenv('RECORDING_CACHE_MAX_AGE', self.max_age)))
+
+        job_queue.register(RECORDING_FETCH_JOB, self._run_fetch_job)
+
+    def enqueue_fetch(self, call_log_id: int, url: str) -> Job:
+        """Queue a download of the call's recording; it commits with the caller's session"""
+        return job_queue.enqueue(RECORDING_FETCH_JOB, {'call_log_id': call_log_id, 'url': url},
+                                 queue_key=f'recording:{call_log_id}', max_attempts=self.max_attempts)
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.storage_dir, 'objects', sha256[:2], sha256[2:4], sha256)
+
+    def store(self, chunks: Iterable[bytes], content_type: str, heartbeat=None) -> Recording:
+        """
+        Write a recording to the store and return its Recording row (added
+        to the session, not committed). Content already stored is kept and
+        the new copy discarded.
+        """
+        digest, size = hashlib.sha256(), 0
+        temp_dir = os.path.join(self.storage_dir, 'tmp')
+        os.makedirs(temp_dir, exist_ok=True)
+        temp_path = os.path.join(temp_dir, uuid.uuid4().hex)
+        last_beat = time.monotonic()
+        try:
+            with open(temp_path, 'wb') as f:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise RecordingTooLarge(f'Recording is larger than {self.max_bytes} bytes')
+                    digest.update(chunk)
+                    f.write(chunk)
+                    if heartbeat and time.monotonic() - last_beat > 30:
+                        heartbeat()
+                        last_beat = time.monotonic()
+                f.flush()
+                os.fsync(f.fileno())
+            sha256 = digest.hexdigest()
+            path = self.path(sha256)
+            if os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return self._recording(sha256, size, content_type)
+
+    def _recording(self, sha256: str, size: int, content_type: str) -> Recording:
+        table = Recording.__table__
+        row = {'sha256': sha256, 'size': size, 'content_type': content_type, 'created_at': datetime.utcnow()}
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            insert = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+            db.session.execute(insert.on_conflict_do_nothing(index_elements=[table.c.sha256]), [row])
+        elif Recording.query.filter_by(sha256=sha256).first() is None:
+            db.session.execute(table.insert(), [row])
+        return Recording.query.filter_by(sha256=sha256).one()
+
+    def fetch(self, call: CallLog, url: str, heartbeat=None) -> Recording:
+        """Download a recording into the store and link it to the call (not committed)"""
+        for _ in range(MAX_REDIRECTS + 1):
+            self.check_url(url)
+            try:
+                response = requests.get(url, stream=True, timeout=self.fetch_timeout, allow_redirects=False)
+            except requests.RequestException as e:
+                raise RuntimeError(f'Fetching the recording of call {call.id} failed: {e}')
+            if not response.is_redirect:
+                break
+            response.close()
+            url = urljoin(url, response.headers['Location'])
+        else:
+            raise ForbiddenRecordingUrl(f'Fetching the recording of call {call.id} failed: too many redirects')
+        with response:
+            if response.status_code >= 400:
+                message = f'Fetching the recording of call {call.id} failed: HTTP {response.status_code}'
+                if response.status_code < 500 and response.status_code not in (408, 429):
+                    raise PermanentJobError(message)
+                raise RuntimeError(message)
+            declared = response.headers.get('Content-Length')
+            if declared and declared.isdigit() and int(declared) > self.max_bytes:
+                raise RecordingTooLarge(f'Recording is larger than {self.max_bytes} bytes')
+            content_type = (response.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+            if not content_type.startswith('audio/'):
+                content_type = mimetypes.guess_type(url.split('?')[0])[0] or 'application/octet-stream'
+            try:
+                recording = self.store(response.iter_content(CHUNK_SIZE), content_type, heartbeat)
+            except requests.RequestException as e:
+                raise RuntimeError(f'Fetching the recording of call {call.id} failed: {e}')
+        call.recording_id = recording.id
+        return recording
+
+    def check_url(self, url: str):
+        """Raise ForbiddenRecordingUrl unless url may be fetched"""
+        parts = urlsplit(url)
+        host = (parts.hostname or '').lower()
+        if parts.scheme != 'https' and not (self.allow_insecure and parts.scheme == 'http'):
+            raise ForbiddenRecordingUrl(f'Recording URL must use https: {url}')
+        if not any(host == allowed or (allowed.startswith('.') and host.endswith(allowed))
+                   for allowed in self.allowed_hosts):
+            raise ForbiddenRecordingUrl(f'Recording host {host!r} is not in RECORDING_FETCH_ALLOWED_HOSTS')
+        if self.allow_insecure:
+            return
+        try:
+            addresses = socket.getaddrinfo(host, parts.port or 443, proto=socket.IPPROTO_TCP)
+        except (socket.gaierror, UnicodeError) as e:
+            raise RuntimeError(f'Resolving recording host {host!r} failed: {e}')
+        for *_, sockaddr in addresses:
+            address = ipaddress.ip_address(sockaddr[0].split('%')[0])
+            address = getattr(address, 'ipv4_mapped', None) or address
+            if not address.is_global:
+                raise ForbiddenRecordingUrl(f'Recording host {host!r} resolves to non-public address {address}')
+
+    def _run_fetch_job(self, job: Job):
+        call = db.session.get(CallLog, job.payload['call_log_id'])
+        if call is None:
+            raise PermanentJobError('Call no longer exists')
+        if call.recording_url != job.payload['url']:
+            # A newer recording URL arrived; its own job stores it
+            return
+        self.fetch(call, job.payload['url'], heartbeat=lambda: job_queue.renew(job))
+
+    def file(self, recording: Recording, fmt: Optional[str] = None) -> Tuple[str, str, str]:
+        """
+        The path, content type and ETag to serve a recording in `fmt` (its
+        stored format when None), transcoding it on first request.
+        """
+        if fmt is None or fmt == format_of(recording.content_type):
+            return self.path(recording.sha256), recording.content_type, recording.sha256
+        if fmt not in TRANSCODE_FORMATS:
+            raise InvalidRecordingRequest(f'format must be one of: {", ".join(TRANSCODE_FORMATS)}')
+        if not self.ffmpeg:
+            raise InvalidRecordingRequest('Transcoding is not available; request the stored format')
+        content_type, options = TRANSCODE_FORMATS[fmt]
+        path = os.path.join(self.storage_dir, 'transcoded', recording.sha256[:2], f'{recording.sha256}.{fmt}')
+        if not os.path.exists(path):
+            with self._locks[hash(path) % TRANSCODE_LOCKS]:
+                if not os.path.exists(path):
+                    self._transcode(self.path(recording.sha256), path, options)
+        return path, content_type, f'{recording.sha256}-{fmt}'
+
+    def _transcode(self, source: str, path: str, options):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        try:
+            subprocess.run([self.ffmpeg, '-nostdin', '-loglevel', 'error', '-i', source, '-vn', *options,
+                            '-y', temp_path],
+                           check=True, capture_output=True, timeout=self.transcode_timeout)
+            os.replace(temp_path, path)
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            stderr = getattr(e, 'stderr', None) or b''
+            logger.error(f'Transcoding {source} failed: {stderr.decode(errors="replace")[-500:]}')
+            raise InvalidRecordingRequest('The recording could not be transcoded')
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+# Initialize the service instance
+recording_service = RecordingService()
@@ -0,0 +1,320 @@
+import os
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy.orm import attributes
+from sqlalchemy.orm.util import identity_key
+
+from models import db, Lead, Conversation, Message, CallLog
+
+logger = logging.getLogger(__name__)
+
+# Score = status points + engagement, clipped to 0..100. Engagement is the
+# sum of event points, each halving every half_life_days.
+STATUS_POINTS = {'new': 0, 'contacted': 10, 'qualified': 25, 'converted': 40, 'lost': -100}
+MESSAGE_POINTS = 3.0        # per message from the lead
+CALL_POINTS = 5.0           # per completed call
+CALL_MINUTE_POINTS = 2.0    # per minute of a completed call...
+CALL_MAX_MINUTES = 10       # ...counting at most this many minutes
+MAX_SCORE = 100
+
+# (lead id, when, points)
+ScoreEvent = Tuple[int, datetime, float]
+
+
+def call_points(duration: Optional[int]) -> float:
+    return CALL_POINTS + CALL_MINUTE_POINTS * min(max(duration or 0, 0), CALL_MAX_MINUTES * 60) / 60.0
+
+
+def clip_score(status: Optional[str], engagement):
+    """Works on scalars and on NumPy arrays of engagement"""
+    return np.clip(np.rint(STATUS_POINTS.get(status or 'new', 0) + np.asarray(engagement)), 0, MAX_SCORE)
+
+
+class ScoringService:
+    """
+    Keeps Lead.score up to date from domain events instead of rescans.
+
+    Each lead stores its engagement and the time it was computed at, so an
+    event costs one row update: decay the stored engagement to the event's
+    time and add the event's points. ORM writes are picked up after every
+    flush (messages from a lead, calls that complete, status changes) and
+    applied in the same transaction with one bulk UPDATE; Core writers pass
+    their events to apply_events().
+
+    Decay only needs the stored values, so refresh_scores() recomputes
+    every score in NumPy batches and writes back the ones that changed;
+    rescore_user() rebuilds an account's engagement from its message and
+    call history in one vectorized pass. A score set by hand holds until
+    the lead's next event, which then starts from it, or the next rescore.
+    """
+
+    def __init__(self, app=None):
+        self.half_life_days = 14.0
+        self.batch_size = 5000
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize scoring with app configuration and follow ORM writes"""
+        self.half_life_days = float(app.config.get(
+            'LEAD_SCORE_HALF_LIFE_DAYS', os.getenv('LEAD_SCORE_HALF_LIFE_DAYS', self.half_life_days)))
+        self.batch_size = int(app.config.get(
+            'LEAD_SCORE_BATCH_SIZE', os.getenv('LEAD_SCORE_BATCH_SIZE', self.batch_size)))
+
+        if not db.event.contains(db.session, 'after_flush', self._collect_events):
+            db.event.listen(db.session, 'after_flush', self._collect_events)
+
+    def decay(self, days):
+        """Multiplier for points that are `days` old (scalar or array)"""
+        return 0.5 ** (np.maximum(days, 0) / self.half_life_days)
+
+    def apply_events(self, connection, events: Iterable[ScoreEvent], rescored: Iterable[int] = (),
+                     session=None) -> int:
+        """
+        Fold events into their leads' engagement and rewrite the scores with
+        one executemany UPDATE. Leads in `rescored` (e.g. after a status
+        change) are recomputed even without events. Runs on `connection`,
+        inside the caller's transaction.
+
+        Returns:
+            int: number of leads updated
+        """
+        by_lead = defaultdict(list)
+        for lead_id, at, points in events:
+            by_lead[lead_id].append((at, points))
+        lead_ids = set(by_lead) | set(rescored)
+        if not lead_ids:
+            return 0
+
+        leads = Lead.__table__
+        now = datetime.utcnow()
+        updates = []
+        for row in connection.execute(
+            db.select(leads.c.id, leads.c.status, leads.c.score, leads.c.engagement, leads.c.engagement_at)
+            .where(leads.c.id.in_(lead_ids))
+        ).all():
+            if row.engagement_at is None:
+                # Not scored yet: start from the current (imported or manual) score
+                engagement = float((row.score or 0) - max(STATUS_POINTS.get(row.status or 'new', 0), 0))
+            else:
+                engagement = row.engagement * self.decay((now - row.engagement_at).total_seconds() / 86400)
+            for at, points in by_lead.get(row.id, ()):
+                engagement += points * self.decay((now - at).total_seconds() / 86400)
+            engagement = max(engagement, 0.0)
+            updates.append({
+                'lead_id': row.id,
+                'new_score': int(clip_score(row.status, engagement)),
+                'new_engagement': engagement,
+                'new_engagement_at': now
+            })
+
+        if updates:
+            connection.execute(
+                leads.update()
+                .where(leads.c.id == db.bindparam('lead_id'))
+                .values(score=db.bindparam('new_score'),
+                        engagement=db.bindparam('new_engagement'),
+                        engagement_at=db.bindparam('new_engagement_at'),
+                        updated_at=leads.c.updated_at),
+                updates
+            )
+            if session is not None:
+                self._sync_identity_map(session, updates)
+        return len(updates)
+
+    def _sync_identity_map(self, session, updates):
+        # Loaded leads would otherwise show the score from before the update
+        for update in updates:
+            lead = session.identity_map.get(identity_key(Lead, update['lead_id']))
+            if lead is not None:
+                attributes.set_committed_value(lead, 'score', update['new_score'])
+                attributes.set_committed_value(lead, 'engagement', update['new_engagement'])
+                attributes.set_committed_value(lead, 'engagement_at', update['new_engagement_at'])
+
+    def _became(self, obj, key, value):
+        # An expired attribute has no old value loaded; any set counts as the change
+        history = attributes.get_history(obj, key)
+        return history.has_changes() and value not in history.deleted
+
+    def _collect_events(self, session, flush_context):
+        events = []
+        rescored: Set[int] = set()
+        manual: Set[int] = set()
+        message_times = defaultdict(list)
+
+        for obj in session.new:
+            if isinstance(obj, Message) and obj.sender_type == 'lead':
+                message_times[obj.conversation_id].append(obj.created_at or datetime.utcnow())
+            elif isinstance(obj, CallLog) and obj.status == 'completed' and obj.lead_id:
+                events.append((obj.lead_id, obj.ended_at or obj.created_at or datetime.utcnow(),
+                               call_points(obj.duration)))
+        for obj in session.dirty:
+            if isinstance(obj, CallLog) and obj.lead_id and obj.status == 'completed' \
+                    and self._became(obj, 'status', 'completed'):
+                events.append((obj.lead_id, obj.ended_at or datetime.utcnow(), call_points(obj.duration)))
+            elif isinstance(obj, Lead) and obj.id is not None:
+                if attributes.get_history(obj, 'score').has_changes():
+                    manual.add(obj.id)
+                elif attributes.get_history(obj, 'status').has_changes():
+                    rescored.add(obj.id)
+
+        if not (events or rescored or manual or message_times):
+            return
+        connection = session.connection()
+        if message_times:
+            conversations = Conversation.__table__
+            for conversation_id, lead_id in connection.execute(
+                db.select(conversations.c.id, conversations.c.lead_id)
+                .where(conversations.c.id.in_(list(message_times)), conversations.c.lead_id.isnot(None))
+            ).all():
+                events.extend((lead_id, at, MESSAGE_POINTS) for at in message_times[conversation_id])
+
+        if manual:
+            # A score set by hand holds until the next event, which starts from it
+            leads = Lead.__table__
+            connection.execute(
+                leads.update().where(leads.c.id.in_(manual))
+                .values(engagement_at=None, updated_at=leads.c.updated_at)
+            )
+            events = [event for event in events if event[0] not in manual]
+            rescored -= manual
+        self.apply_events(connection, events, rescored, session)
+
+    def refresh_scores(self, user_id: Optional[int] = None, now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Apply recency decay to every scored lead (or one user's) and write
+        back the scores that changed. Leads are read in id order, batch_size
+        at a time, and each batch is committed with one UPDATE. Stored
+        engagement is left alone; it decays from engagement_at on read.
+
+        Returns:
+            dict: leads checked and scores changed
+        """
+        leads = Lead.__table__
+        now = now or datetime.utcnow()
+        checked = changed = 0
+        last_id = 0
+        while True:
+            statement = db.select(leads.c.id, leads.c.status, leads.c.score, leads.c.engagement,
+                                  leads.c.engagement_at)\
+                          .where(leads.c.engagement_at.isnot(None), leads.c.id > last_id)\
+                          .order_by(leads.c.id).limit(self.batch_size)
+            if user_id is not None:
+                statement = statement.where(leads.c.user_id == int(user_id))
+            rows = db.session.execute(statement).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            ids = np.array([row.id for row in rows], dtype=np.int64)
+            scores = np.array([row.score or 0 for row in rows], dtype=np.int64)
+            engagement = np.array([row.engagement for row in rows], dtype=np.float64)
+            age = np.array([(now - row.engagement_at).total_seconds() for row in rows], dtype=np.float64) / 86400
+            status_points = np.array([STATUS_POINTS.get(row.status or 'new', 0) for row in rows], dtype=np.float64)
+            new_scores = np.clip(np.rint(status_points + engagement * self.decay(age)), 0, MAX_SCORE).astype(np.int64)
+
+            moved = np.nonzero(new_scores != scores)[0]
+            if len(moved):
+                db.session.execute(
+                    leads.update()
+                    .where(leads.c.id == db.bindparam('lead_id'))
+                    .values(score=db.bindparam('new_score'), updated_at=leads.c.updated_at),
+                    [{'lead_id': int(ids[i]), 'new_score': int(new_scores[i])} for i in moved]
+                )
+            db.session.commit()
+            checked += len(rows)
+            changed += len(moved)
+        return {'checked': checked, 'changed': changed}
+
+    def rescore_user(self, user_id: int, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Rebuild every lead's engagement for one account from its history.
+
+        Messages and completed calls are aggregated per lead and day in the
+        database, then decayed and summed per lead with NumPy; all leads
+        are written back in batch_size UPDATEs and the transaction is
+        committed. Messages already moved to cold storage are not counted.
+
+        Returns:
+            dict: leads scored, events counted and scores changed
+        """
+        user_id = int(user_id)
+        now = now or datetime.utcnow()
+        leads, conversations = Lead.__table__, Conversation.__table__
+        messages, calls = Message.__table__, CallLog.__table__
+
+        rows = db.session.execute(
+            db.select(leads.c.id, leads.c.status, leads.c.score)
+            .where(leads.c.user_id == user_id).order_by(leads.c.id)
+        ).all()
+        if not rows:
+            return {'leads': 0, 'messages': 0, 'calls': 0, 'changed': 0}
+        ids = np.array([row.id for row in rows], dtype=np.int64)
+        old_scores = np.array([row.score or 0 for row in rows], dtype=np.int64)
+        status_points = np.array([STATUS_POINTS.get(row.status or 'new', 0) for row in rows], dtype=np.float64)
+        today = np.datetime64(now, 's')
+
+        def per_lead(day_rows, points):
+            """Sum points per lead, each (lead, day) bucket decayed from mid-day"""
+            if not day_rows:
+                return np.zeros(len(ids))
+            lead_ids = np.array([row[0] for row in day_rows], dtype=np.int64)
+            days = np.array([str(row[1]) for row in day_rows], dtype='datetime64[D]').astype('datetime64[s]')
+            age = (today - days).astype(np.float64) / 86400 - 0.5
+            index = np.searchsorted(ids, lead_ids)
+            # History can still point at deleted leads (SQLite does not
+            # enforce the foreign keys); those must not land on a neighbour
+            valid = (index < len(ids)) & (ids[np.minimum(index, len(ids) - 1)] == lead_ids)
+            return np.bincount(index[valid], weights=(points * self.decay(age))[valid], minlength=len(ids))
+
+        message_day = db.func.date(messages.c.created_at)
+        message_rows = db.session.execute(
+            db.select(conversations.c.lead_id, message_day, db.func.count())
+            .select_from(messages.join(conversations, conversations.c.id == messages.c.conversation_id))
+            .where(conversations.c.user_id == user_id, conversations.c.lead_id.isnot(None),
+                   messages.c.sender_type == 'lead')
+            .group_by(conversations.c.lead_id, message_day)
+        ).all()
+        message_counts = np.array([row[2] for row in message_rows], dtype=np.float64)
+
+        call_day = db.func.date(db.func.coalesce(calls.c.ended_at, calls.c.created_at))
+        capped = db.case((calls.c.duration > CALL_MAX_MINUTES * 60, CALL_MAX_MINUTES * 60),
+                         else_=db.func.coalesce(calls.c.duration, 0))
+        call_rows = db.session.execute(
+            db.select(calls.c.lead_id, call_day, db.func.count(), db.func.sum(capped))
+            .where(calls.c.user_id == user_id, calls.c.lead_id.isnot(None), calls.c.status == 'completed')
+            .group_by(calls.c.lead_id, call_day)
+        ).all()
+        call_counts = np.array([row[2] for row in call_rows], dtype=np.float64)
+        call_seconds = np.array([row[3] or 0 for row in call_rows], dtype=np.float64)
+
+        engagement = per_lead(message_rows, MESSAGE_POINTS * message_counts) \
+            + per_lead(call_rows, CALL_POINTS * call_counts + CALL_MINUTE_POINTS * call_seconds / 60.0)
+        scores = np.clip(np.rint(status_points + engagement), 0, MAX_SCORE).astype(np.int64)
+
+        for start in range(0, len(ids), self.batch_size):
+            end = start + self.batch_size
+            db.session.execute(
+                leads.update()
+                .where(leads.c.id == db.bindparam('lead_id'))
+                .values(score=db.bindparam('new_score'), engagement=db.bindparam('new_engagement'),
+                        engagement_at=db.bindparam('new_engagement_at'), updated_at=leads.c.updated_at),
+                [{'lead_id': int(lead_id), 'new_score': int(score), 'new_engagement': float(value),
+                  'new_engagement_at': now}
+                 for lead_id, score, value in zip(ids[start:end], scores[start:end], engagement[start:end])]
+            )
+        db.session.commit()
+        return {
+            'leads': len(ids),
+            'messages': int(message_counts.sum()),
+            'calls': int(call_counts.sum()),
+            'changed': int((scores != old_scores).sum())
+        }
+
+# Initialize the service instance
+scoring_service = ScoringService()
@@ -0,0 +1,270 @@
+import os
+import re
+import html
+from typing import Any, Dict, List, Optional
+
+from models import db
+
+# Private-use characters mark highlights inside SQL; they are swapped for
+# <mark> tags after the rest of the snippet has been HTML-escaped
+HIGHLIGHT_OPEN = '\ue000'
+HIGHLIGHT_CLOSE = '\ue001'
+
+# Quoted phrases, or single words with an optional trailing * for prefix search
+QUERY_TOKEN = re.compile(r'"([^"]*)"|(\w+)(\*?)')
+WORD = re.compile(r'\w+')
+
+
+class InvalidSearchQuery(ValueError):
+    """Raised when a search query has no searchable terms"""
+
+
+def fts5_query(text: str, max_terms: int = 16) -> str:
+    """
+    Turn free text into a safe FTS5 MATCH expression.
+
+    Every word becomes a quoted string, so FTS5 operators and column
+    filters typed by the user are treated as plain text. "Quoted phrases"
+    and word* prefixes are kept; all terms must match.
+    """
+    terms = []
+    for phrase, word, star in QUERY_TOKEN.findall(text):
+        if phrase:
+            words = WORD.findall(phrase)
+            if words:
+                terms.append('"' + ' '.join(words) + '"')
+        elif word:
+            terms.append(f'"{word}"' + star)
+        if len(terms) >= max_terms:
+            break
+    if not terms:
+        raise InvalidSearchQuery('Search query has no searchable terms')
+    return ' '.join(terms)
+
+
+def render_snippet(snippet: Optional[str]) -> Optional[str]:
+    """HTML-escape a snippet and turn the highlight markers into <mark> tags"""
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace(HIGHLIGHT_OPEN, '<mark>').replace(HIGHLIGHT_CLOSE, '</mark>')
+
+
+class SearchService:
+    def __init__(self, app=None):
+        self.snippet_tokens = 16
+        self.max_terms = 16
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize search with app configuration"""
+        self.snippet_tokens = int(app.config.get(
+            'SEARCH_SNIPPET_TOKENS', os.getenv('SEARCH_SNIPPET_TOKENS', self.snippet_tokens)))
+        self.max_terms = int(app.config.get(
+            'SEARCH_MAX_TERMS', os.getenv('SEARCH_MAX_TERMS', self.max_terms)))
+
+    def search_messages(self, user_id: int, query: str, limit: int = 20, offset: int = 0,
+                        conversation_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Full-text search over one user's messages, best matches first.
+
+        Returns up to `limit` results starting at `offset`, each with the
+        message, its conversation's id and title, a highlighted snippet and
+        the relevance score (higher is better).
+        """
+        dialect = db.engine.dialect.name
+        if dialect == 'sqlite':
+            rows = self._search_sqlite(user_id, query, limit, offset, conversation_id)
+        elif dialect == 'postgresql':
+            rows = self._search_postgres(user_id, query, limit, offset, conversation_id)
+        else:
+            rows = self._search_like(user_id, query, limit, offset, conversation_id)
+
+        return [{
+            'message': {
+                'id': row.id,
+                'conversation_id': row.conversation_id,
+                'sender_type': row.sender_type,
+                'content': row.content,
+                'created_at': row.created_at.isoformat()
+            },
+            'conversation': {'id': row.conversation_id, 'title': row.title},
+            'snippet': render_snippet(row.snippet),
+            'score': float(row.score)
+        } for row in rows]
+
+    def _search_sqlite(self, user_id, query, limit, offset, conversation_id):
+        # The owner token restricts matches to the user's messages inside FTS5
+        match = f'owner : "u{int(user_id)}" AND content : ({fts5_query(query, self.max_terms)})'
+        scope = 'AND m.conversation_id = :conversation_id' if conversation_id else ''
+        statement = db.text(f"""
+            SELECT m.id, m.conversation_id, m.sender_type, m.content, m.created_at, c.title,
+                   snippet(messages_fts, 0, :open, :close, '…', :tokens) AS snippet,
+                   -bm25(messages_fts, 1.0, 0.0) AS score
+            FROM messages_fts
+            JOIN messages m ON m.id = messages_fts.rowid
+            JOIN conversations c ON c.id = m.conversation_id
+            WHERE messages_fts MATCH :match {scope}
+            ORDER BY bm25(messages_fts, 1.0, 0.0), m.id DESC
+            LIMIT :limit OFFSET :offset
+        """).columns(created_at=db.DateTime)
+        return db.session.execute(statement, {
+            'match': match, 'open': HIGHLIGHT_OPEN, 'close': HIGHLIGHT_CLOSE,
+            'tokens': self.snippet_tokens, 'conversation_id': conversation_id,
+            'limit': limit, 'offset': offset
+        }).all()
+
+    def _search_postgres(self, user_id, query, limit, offset, conversation_id):
+        if not WORD.search(query):
+            raise InvalidSearchQuery('Search query has no searchable terms')
+        # Rank inside the index-backed match, headline only the returned page
+        scope = 'AND m.conversation_id = :conversation_id' if conversation_id else ''
+        statement = db.text(f"""
+            WITH q AS (SELECT websearch_to_tsquery('english', :query) AS query),
+            hits AS (
+                SELECT m.id, m.conversation_id, m.sender_type, m.content, m.created_at, c.title,
+                       ts_rank_cd(to_tsvector('english', m.content), q.query) AS score
+                FROM q, messages m
+                JOIN conversations c ON c.id = m.conversation_id
+                WHERE to_tsvector('english', m.content) @@ q.query
+                  AND c.user_id = :user_id {scope}
+                ORDER BY score DESC, m.id DESC
+                LIMIT :limit OFFSET :offset
+            )
+            SELECT hits.*, ts_headline('english', hits.content, q.query,
+                       'StartSel=' || :open || ', StopSel=' || :close || ', MaxWords=' || :tokens
+                       || ', MinWords=5, MaxFragments=2, FragmentDelimiter=" … "') AS snippet
+            FROM hits, q
+            ORDER BY hits.score DESC, hits.id DESC
+        """)
+        return db.session.execute(statement, {
+            'query': query, 'user_id': user_id, 'open': HIGHLIGHT_OPEN, 'close': HIGHLIGHT_CLOSE,
+            'tokens': self.snippet_tokens, 'conversation_id': conversation_id,
+            'limit': limit, 'offset': offset
+        }).all()
+
+    def _search_like(self, user_id, query, limit, offset, conversation_id):
+        """Unindexed fallback for databases without a full-text index here"""
+        from models import Conversation, Message
+
+        words = WORD.findall(query)[:self.max_terms]
+        if not words:
+            raise InvalidSearchQuery('Search query has no searchable terms')
+        statement = db.select(
+            Message.id, Message.conversation_id, Message.sender_type, Message.content,
+            Message.created_at, Conversation.title,
+            db.literal(None).label('snippet'), db.literal(0).label('score')
+        ).join(Conversation, Conversation.id == Message.conversation_id)\
+         .where(Conversation.user_id == user_id, *[Message.content.ilike(f'%{w}%') for w in words])
+        if conversation_id:
+            statement = statement.where(Message.conversation_id == conversation_id)
+        statement = statement.order_by(Message.id.desc()).limit(limit).offset(offset)
+        return db.session.execute(statement).all()
+
+    def search_transcripts(self, user_id: int, query: str, limit: int = 20, offset: int = 0,
+                           call_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Full-text search over one user's call transcript segments, best
+        matches first, shaped like search_messages with the call in place
+        of the conversation.
+        """
+        dialect = db.engine.dialect.name
+        if dialect == 'sqlite':
+            rows = self._search_transcripts_sqlite(user_id, query, limit, offset, call_id)
+        elif dialect == 'postgresql':
+            rows = self._search_transcripts_postgres(user_id, query, limit, offset, call_id)
+        else:
+            rows = self._search_transcripts_like(user_id, query, limit, offset, call_id)
+
+        return [{
+            'segment': {
+                'id': row.id,
+                'call_log_id': row.call_log_id,
+                'seq': row.seq,
+                'speaker': row.speaker,
+                'start_ms': row.start_ms,
+                'end_ms': row.end_ms,
+                'text': row.text
+            },
+            'call': {
+                'id': row.call_log_id,
+                'from_number': row.from_number,
+                'to_number': row.to_number,
+                'created_at': row.call_created_at.isoformat() if row.call_created_at else None
+            },
+            'snippet': render_snippet(row.snippet),
+            'score': float(row.score)
+        } for row in rows]
+
+    def _search_transcripts_sqlite(self, user_id, query, limit, offset, call_id):
+        match = f'owner : "u{int(user_id)}" AND text : ({fts5_query(query, self.max_terms)})'
+        scope = 'AND s.call_log_id = :call_id' if call_id else ''
+        statement = db.text(f"""
+            SELECT s.id, s.call_log_id, s.seq, s.speaker, s.start_ms, s.end_ms, s.text,
+                   c.from_number, c.to_number, c.created_at AS call_created_at,
+                   snippet(transcript_fts, 0, :open, :close, '…', :tokens) AS snippet,
+                   -bm25(transcript_fts, 1.0, 0.0) AS score
+            FROM transcript_fts
+            JOIN call_transcript_segments s ON s.id = transcript_fts.rowid
+            JOIN call_logs c ON c.id = s.call_log_id
+            WHERE transcript_fts MATCH :match {scope}
+            ORDER BY bm25(transcript_fts, 1.0, 0.0), s.id DESC
+            LIMIT :limit OFFSET :offset
+        """).columns(call_created_at=db.DateTime)
+        return db.session.execute(statement, {
+            'match': match, 'open': HIGHLIGHT_OPEN, 'close': HIGHLIGHT_CLOSE,
+            'tokens': self.snippet_tokens, 'call_id': call_id,
+            'limit': limit, 'offset': offset
+        }).all()
+
+    def _search_transcripts_postgres(self, user_id, query, limit, offset, call_id):
+        if not WORD.search(query):
+            raise InvalidSearchQuery('Search query has no searchable terms')
+        scope = 'AND s.call_log_id = :call_id' if call_id else ''
+        statement = db.text(f"""
+            WITH q AS (SELECT websearch_to_tsquery('english', :query) AS query),
+            hits AS (
+                SELECT s.id, s.call_log_id, s.seq, s.speaker, s.start_ms, s.end_ms, s.text,
+                       c.from_number, c.to_number, c.created_at AS call_created_at,
+                       ts_rank_cd(to_tsvector('english', s.text), q.query) AS score
+                FROM q, call_transcript_segments s
+                JOIN call_logs c ON c.id = s.call_log_id
+                WHERE to_tsvector('english', s.text) @@ q.query
+                  AND c.user_id = :user_id {scope}
+                ORDER BY score DESC, s.id DESC
+                LIMIT :limit OFFSET :offset
+            )
+            SELECT hits.*, ts_headline('english', hits.text, q.query,
+                       'StartSel=' || :open || ', StopSel=' || :close || ', MaxWords=' || :tokens
+                       || ', MinWords=5, MaxFragments=2, FragmentDelimiter=" … "') AS snippet
+            FROM hits, q
+            ORDER BY hits.score DESC, hits.id DESC
+        """)
+        return db.session.execute(statement, {
+            'query': query, 'user_id': user_id, 'open': HIGHLIGHT_OPEN, 'close': HIGHLIGHT_CLOSE,
+            'tokens': self.snippet_tokens, 'call_id': call_id,
+            'limit': limit, 'offset': offset
+        }).all()
+
+    def _search_transcripts_like(self, user_id, query, limit, offset, call_id):
+        """Unindexed fallback for databases without a full-text index here"""
+        from models import CallLog, CallTranscriptSegment as Segment
+
+        words = WORD.findall(query)[:self.max_terms]
+        if not words:
+            raise InvalidSearchQuery('Search query has no searchable terms')
+        statement = db.select(
+            Segment.id, Segment.call_log_id, Segment.seq, Segment.speaker, Segment.start_ms,
+            Segment.end_ms, Segment.text, CallLog.from_number, CallLog.to_number,
+            CallLog.created_at.label('call_created_at'),
+            db.literal(None).label('snippet'), db.literal(0).label('score')
+        ).join(CallLog, CallLog.id == Segment.call_log_id)\
+         .where(CallLog.user_id == user_id, *[Segment.text.ilike(f'%{w}%') for w in words])
+        if call_id:
+            statement = statement.where(Segment.call_log_id == call_id)
+        statement = statement.order_by(Segment.id.desc()).limit(limit).offset(offset)
+        return db.session.execute(statement).all()
+
+# Initialize the service instance
+search_service = SearchService()
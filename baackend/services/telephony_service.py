@@ -0,0 +1,395 @@
+import os
+import hmac
+import time
+import hashlib
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, CallLog, TelephonyEvent
+from .analytics_service import analytics_service, ROLLUP_FIELDS
+from .export_service import parse_date, InvalidExportRequest
+from .recording_service import recording_service
+from .scoring_service import scoring_service, call_points
+
+logger = logging.getLogger(__name__)
+
+# Calls only move forward through these; a terminal status is final
+STATUS_RANK = {'queued': 0, 'initiated': 1, 'ringing': 2, 'in-progress': 3}
+TERMINAL_STATUSES = ('completed', 'failed', 'busy', 'no-answer', 'canceled')
+TERMINAL_RANK = 4
+CALL_STATUSES = tuple(STATUS_RANK) + TERMINAL_STATUSES
+
+# Call log columns the events write
+CALL_STATE_FIELDS = ('status', 'duration', 'recording_url', 'ended_at', 'provider_call_id')
+
+# Webhook requests carry at most this many events
+MAX_EVENTS_PER_REQUEST = 1000
+
+
+class InvalidTelephonyEvent(ValueError):
+    """Raised for a webhook payload that cannot be accepted"""
+
+
+class TelephonyProviderError(Exception):
+    """Raised when the provider does not accept an outbound call"""
+
+
+def status_rank(status: Optional[str]) -> int:
+    if status in TERMINAL_STATUSES:
+        return TERMINAL_RANK
+    return STATUS_RANK.get(status, -1)
+
+
+def parse_event(raw: Any) -> Dict[str, Any]:
+    """Validate one provider event and map it onto TelephonyEvent columns"""
+    if not isinstance(raw, dict):
+        raise InvalidTelephonyEvent('Each event must be an object')
+    event_id, call_id = raw.get('id'), raw.get('call_id')
+    if not event_id or not call_id:
+        raise InvalidTelephonyEvent('Events need an id and a call_id')
+    status = raw.get('status')
+    if status is not None and status not in CALL_STATUSES:
+        raise InvalidTelephonyEvent(f'Unknown call status: {status}')
+    duration = raw.get('duration')
+    if duration is not None and (not isinstance(duration, int) or isinstance(duration, bool) or duration < 0):
+        raise InvalidTelephonyEvent('duration must be a non-negative integer')
+    call_log_id = raw.get('call_log_id')
+    if call_log_id is not None and (not isinstance(call_log_id, int) or isinstance(call_log_id, bool)):
+        raise InvalidTelephonyEvent('call_log_id must be an integer')
+    try:
+        occurred_at = parse_date(raw.get('timestamp'), 'timestamp') or datetime.utcnow()
+    except InvalidExportRequest as e:
+        raise InvalidTelephonyEvent(str(e))
+    return {
+        'event_id': str(event_id)[:100],
+        'provider_call_id': str(call_id)[:64],
+        'call_log_id': call_log_id,
+        'status': status,
+        'duration': duration,
+        'recording_url': str(raw['recording_url'])[:500] if raw.get('recording_url') else None,
+        'occurred_at': occurred_at
+    }
+
+
+class TelephonyService:
+    """
+    Ingests call status webhooks and applies them to call logs in batches.
+
+    The webhook endpoint validates a request, drops event ids it has seen
+    and inserts the rest into the telephony_events inbox with one statement;
+    nothing else happens on the request path. The writer claims unprocessed
+    events batch_size at a time, folds each call's events into one final
+    state, and writes all changed calls with one executemany UPDATE. Call
+    statuses only move forward (queued < initiated < ringing < in-progress
+    < terminal), so late or reordered events cannot undo a newer state.
+    Rollups and lead scores are updated from the same batch, and a fetch
+    job is queued for each new recording URL.
+
+    Events are matched to calls by the provider's call id. Until an
+    outbound call we placed is linked to a provider id, an event carrying
+    its call_log_id (which we passed to the provider) matches it and links
+    the id; other events are marked unmatched.
+
+    Outbound calls are placed with place_call, which passes our call_log_id
+    and the status callback URL along.
+    """
+
+    def __init__(self, app=None):
+        self.api_url = None
+        self.api_key = None
+        self.api_timeout = 10.0
+        self.from_number = None
+        self.status_callback_url = None
+        self.webhook_secret = None
+        self.allow_unsigned = False
+        self.batch_size = 2000
+        self.poll_interval = 0.2
+        self.retention_hours = 72.0
+        self._local = threading.local()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize the provider client and webhook ingestion with app configuration"""
+        self.api_url = app.config.get('TELEPHONY_API_URL', os.getenv('TELEPHONY_API_URL'))
+        self.api_key = app.config.get('TELEPHONY_API_KEY', os.getenv('TELEPHONY_API_KEY'))
+        self.api_timeout = float(app.config.get(
+            'TELEPHONY_API_TIMEOUT', os.getenv('TELEPHONY_API_TIMEOUT', self.api_timeout)))
+        self.from_number = app.config.get('TELEPHONY_FROM_NUMBER', os.getenv('TELEPHONY_FROM_NUMBER'))
+        self.status_callback_url = app.config.get(
+            'TELEPHONY_STATUS_CALLBACK_URL', os.getenv('TELEPHONY_STATUS_CALLBACK_URL'))
+        self.webhook_secret = app.config.get('TELEPHONY_WEBHOOK_SECRET', os.getenv('TELEPHONY_WEBHOOK_SECRET'))
+        # Local development only: accept webhooks without a signature when no secret is set
+        self.allow_unsigned = str(app.config.get(
+            'TELEPHONY_ALLOW_UNSIGNED_WEBHOOKS', os.getenv('TELEPHONY_ALLOW_UNSIGNED_WEBHOOKS', 'false'))).lower() == 'true'
+        self.batch_size = int(app.config.get(
+            'TELEPHONY_WRITER_BATCH_SIZE', os.getenv('TELEPHONY_WRITER_BATCH_SIZE', self.batch_size)))
+        self.poll_interval = float(app.config.get(
+            'TELEPHONY_WRITER_POLL_INTERVAL', os.getenv('TELEPHONY_WRITER_POLL_INTERVAL', self.poll_interval)))
+        self.retention_hours = float(app.config.get(
+            'TELEPHONY_EVENT_RETENTION_HOURS', os.getenv('TELEPHONY_EVENT_RETENTION_HOURS', self.retention_hours)))
+
+    def place_call(self, call: Dict[str, Any]) -> str:
+        """
+        Ask the provider to place an outbound call and return its call id.
+        `call` carries the call log's id, from_number, to_number,
+        voice_agent_id and agent, the prompt, greeting and model options
+        the provider runs the call with. Safe to call from several threads
+        at once.
+        """
+        if not self.api_url:
+            raise TelephonyProviderError('TELEPHONY_API_URL is not configured')
+        headers = {'Authorization': f'Bearer {self.api_key}'} if self.api_key else {}
+        try:
+            response = self._http().post(f"{self.api_url.rstrip('/')}/calls", json={
+                'call_log_id': call['id'],
+                'from': call['from_number'],
+                'to': call['to_number'],
+                'voice_agent_id': call.get('voice_agent_id'),
+                'agent': call.get('agent'),
+                'status_callback': self.status_callback_url
+            }, headers=headers, timeout=self.api_timeout)
+            response.raise_for_status()
+            return str(response.json()['call_id'])[:64]
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            raise TelephonyProviderError(f'Provider did not accept call {call["id"]}: {e}')
+
+    def _http(self) -> requests.Session:
+        # One keep-alive session per dispatching thread
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def sign(self, body: bytes) -> str:
+        return hmac.new(self.webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+
+    def verify_signature(self, body: bytes, signature: Optional[str]) -> bool:
+        """
+        HMAC-SHA256 of the raw body. Without a secret nothing passes, unless
+        TELEPHONY_ALLOW_UNSIGNED_WEBHOOKS opts in for local development.
+        """
+        if not self.webhook_secret:
+            return self.allow_unsigned
+        return bool(signature) and hmac.compare_digest(self.sign(body), signature)
+
+    def parse_payload(self, payload: Any) -> List[Dict[str, Any]]:
+        """Accepts one event, a list of events or {"events": [...]}"""
+        if isinstance(payload, dict) and 'events' in payload:
+            payload = payload['events']
+        events = payload if isinstance(payload, list) else [payload]
+        if not events:
+            raise InvalidTelephonyEvent('No events')
+        if len(events) > MAX_EVENTS_PER_REQUEST:
+            raise InvalidTelephonyEvent(f'At most {MAX_EVENTS_PER_REQUEST} events per request')
+        return [parse_event(event) for event in events]
+
+    def ingest(self, events: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Add new events to the inbox and commit. Event ids already stored,
+        or repeated within the request, are counted as duplicates.
+        """
+        unique = {}
+        for event in events:
+            unique.setdefault(event['event_id'], event)
+        now = datetime.utcnow()
+        rows = [{**event, 'received_at': now} for event in unique.values()]
+
+        inbox = TelephonyEvent.__table__
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            insert = (sqlite if dialect == 'sqlite' else postgresql).insert(inbox)
+            result = db.session.execute(
+                insert.on_conflict_do_nothing(index_elements=[inbox.c.event_id]).returning(inbox.c.id),
+                rows
+            )
+            accepted = len(result.all())
+        else:
+            seen = set(db.session.execute(
+                db.select(inbox.c.event_id).where(inbox.c.event_id.in_(list(unique)))
+            ).scalars())
+            rows = [row for row in rows if row['event_id'] not in seen]
+            if rows:
+                db.session.execute(inbox.insert(), rows)
+            accepted = len(rows)
+        db.session.commit()
+        return {'accepted': accepted, 'duplicates': len(events) - accepted}
+
+    def process_batch(self) -> Dict[str, int]:
+        """
+        Apply up to batch_size unprocessed events in one transaction.
+
+        Returns:
+            dict: events read, calls updated and events per outcome
+        """
+        inbox, calls = TelephonyEvent.__table__, CallLog.__table__
+        now = datetime.utcnow()
+        claim = db.select(inbox).where(inbox.c.processed_at.is_(None)).order_by(inbox.c.id).limit(self.batch_size)
+        if db.session.get_bind().dialect.name == 'postgresql':
+            # Lets several writers share the inbox
+            claim = claim.with_for_update(skip_locked=True)
+        events = db.session.execute(claim).all()
+        stats = {'events': len(events), 'calls': 0, 'applied': 0, 'stale': 0, 'unmatched': 0}
+        if not events:
+            db.session.rollback()
+            return stats
+
+        call_columns = [calls.c.id, calls.c.lead_id, calls.c.provider_call_id, calls.c.direction, calls.c.ended_at,
+                        calls.c.recording_url, *[calls.c[field] for field in ROLLUP_FIELDS]]
+        by_provider_id, by_id, unlinked = {}, {}, {}
+        provider_ids = list({event.provider_call_id for event in events})
+        call_log_ids = list({event.call_log_id for event in events if event.call_log_id is not None})
+        for condition in (calls.c.provider_call_id.in_(provider_ids), calls.c.id.in_(call_log_ids)):
+            for row in db.session.execute(db.select(*call_columns).where(condition).with_for_update()).all():
+                by_id[row.id] = row
+                if row.provider_call_id:
+                    by_provider_id[row.provider_call_id] = row
+                elif row.direction == 'outbound':
+                    # Only calls we placed and the provider has not reported yet
+                    # can be claimed by call_log_id, which is a guessable integer
+                    unlinked[row.id] = row
+
+        grouped = defaultdict(list)
+        outcomes = []
+        for event in events:
+            call = by_provider_id.get(event.provider_call_id) or unlinked.get(event.call_log_id)
+            if call is None:
+                outcomes.append({'event': event.id, 'outcome': 'unmatched', 'now': now})
+            else:
+                grouped[call.id].append(event)
+
+        updates, changes, score_events = [], [], []
+        for call_id, call_events in grouped.items():
+            call = by_id[call_id]
+            state, applied = self._fold(call, sorted(call_events, key=lambda e: (e.occurred_at, e.id)))
+            outcomes.extend({'event': event.id, 'outcome': 'applied' if event.id in applied else 'stale',
+                             'now': now} for event in call_events)
+            if state == self._state(call):
+                continue
+            updates.append({'call_id': call_id, **{f'new_{key}': value for key, value in state.items()}})
+            changes.append((
+                {field: getattr(call, field) for field in ROLLUP_FIELDS},
+                {**{field: getattr(call, field) for field in ROLLUP_FIELDS},
+                 'status': state['status'], 'duration': state['duration']}
+            ))
+            if call.lead_id and state['status'] == 'completed' and call.status != 'completed':
+                score_events.append((call.lead_id, state['ended_at'] or now, call_points(state['duration'])))
+
+        if updates:
+            db.session.execute(
+                calls.update().where(calls.c.id == db.bindparam('call_id'))
+                .values(**{key: db.bindparam(f'new_{key}') for key in CALL_STATE_FIELDS}),
+                updates
+            )
+            connection = db.session.connection()
+            analytics_service.apply_changes(connection, changes)
+            scoring_service.apply_events(connection, score_events)
+            for update in updates:
+                if update['new_recording_url'] != by_id[update['call_id']].recording_url:
+                    recording_service.enqueue_fetch(update['call_id'], update['new_recording_url'])
+        db.session.execute(
+            inbox.update().where(inbox.c.id == db.bindparam('event'))
+            .values(processed_at=db.bindparam('now'), outcome=db.bindparam('outcome')),
+            outcomes
+        )
+        db.session.commit()
+
+        stats['calls'] = len(updates)
+        for outcome in outcomes:
+            stats[outcome['outcome']] += 1
+        return stats
+
+    def _state(self, call) -> Dict[str, Any]:
+        return {field: getattr(call, field) for field in CALL_STATE_FIELDS}
+
+    def _fold(self, call, events) -> Tuple[Dict[str, Any], set]:
+        """A call's state after its events (in provider time order), and the events that changed it"""
+        state = self._state(call)
+        applied = set()
+        for event in events:
+            changed = False
+            if event.status and status_rank(event.status) > status_rank(state['status']):
+                state['status'] = event.status
+                if event.status in TERMINAL_STATUSES:
+                    state['ended_at'] = state['ended_at'] or event.occurred_at
+                changed = True
+            if event.duration is not None and event.duration > (state['duration'] or 0):
+                state['duration'] = event.duration
+                changed = True
+            if event.recording_url and event.recording_url != state['recording_url']:
+                state['recording_url'] = event.recording_url
+                changed = True
+            if not state['provider_call_id']:
+                state['provider_call_id'] = event.provider_call_id
+                changed = True
+            if changed:
+                applied.add(event.id)
+        return state, applied
+
+    def prune(self) -> int:
+        """Delete processed events older than the dedup window; returns how many"""
+        inbox = TelephonyEvent.__table__
+        cutoff = datetime.utcnow() - timedelta(hours=self.retention_hours)
+        result = db.session.execute(
+            inbox.delete().where(inbox.c.processed_at.isnot(None), inbox.c.processed_at < cutoff))
+        db.session.commit()
+        return result.rowcount
+
+    def start_writer(self, app) -> 'TelephonyWriter':
+        """Start the event writer on a thread in this process"""
+        writer = TelephonyWriter(app, self)
+        writer.start()
+        return writer
+
+
+class TelephonyWriter:
+    """Applies inbox batches back to back, polling when the inbox is empty"""
+
+    def __init__(self, app, service: TelephonyService):
+        self.app = app
+        self.service = service
+        self.stats = defaultdict(int)
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='telephony-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop after the batch in progress"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        last_prune = 0.0
+        with self.app.app_context():
+            while not self._stopping.is_set():
+                try:
+                    if time.monotonic() - last_prune > 600:
+                        last_prune = time.monotonic()
+                        self.service.prune()
+                    batch = self.service.process_batch()
+                except Exception:
+                    logger.exception('Telephony event batch failed')
+                    db.session.rollback()
+                    self._stopping.wait(self.service.poll_interval)
+                    continue
+                finally:
+                    db.session.remove()
+                for key, value in batch.items():
+                    self.stats[key] += value
+                if batch['events'] < self.service.batch_size:
+                    # Let the next batch fill up instead of spinning on a few events
+                    self._stopping.wait(self.service.poll_interval)
+
+# Initialize the service instance
+telephony_service = TelephonyService()
@@ -0,0 +1,272 @@
+import os
+import json
+import zlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from models import db, Conversation, Message, MessageArchive
+from models.conversation import ARCHIVED_STATUSES
+
+# Optional faster codec; segments record which one wrote them
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+logger = logging.getLogger(__name__)
+
+# Stored per message, in this order, inside a segment
+SEGMENT_COLUMNS = ('id', 'sender_type', 'content', 'metadata', 'created_at')
+
+
+def compress(raw: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(raw)
+    return zlib.compress(raw, 9)
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+class TieringService:
+    """
+    Moves messages of long-archived conversations into compressed segments
+    in message_archives and reads them back transparently.
+
+    Tiering runs in bounded batches (scripts/tier_messages.py): each
+    conversation is moved in one transaction, segment_size messages per
+    segment. Reads decode a conversation's segments on first access and
+    keep them in a small LRU cache, keyed by the segment's id, conversation
+    and message id range so a stale entry cannot answer for another
+    segment; reopening a conversation moves its
+    messages back into the hot table.
+    """
+
+    def __init__(self, app=None):
+        self.age_days = 30
+        self.batch_size = 100
+        self.segment_size = 500
+        self.codec = 'zstd' if HAS_ZSTD else 'zlib'
+        self.cache_size = 256
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize tiering with app configuration"""
+        self.age_days = float(app.config.get(
+            'MESSAGE_TIERING_AGE_DAYS', os.getenv('MESSAGE_TIERING_AGE_DAYS', self.age_days)))
+        self.batch_size = int(app.config.get(
+            'MESSAGE_TIERING_BATCH_SIZE', os.getenv('MESSAGE_TIERING_BATCH_SIZE', self.batch_size)))
+        self.segment_size = int(app.config.get(
+            'MESSAGE_SEGMENT_SIZE', os.getenv('MESSAGE_SEGMENT_SIZE', self.segment_size)))
+        self.cache_size = int(app.config.get(
+            'MESSAGE_ARCHIVE_CACHE_SEGMENTS', os.getenv('MESSAGE_ARCHIVE_CACHE_SEGMENTS', self.cache_size)))
+
+    def candidates(self, limit: Optional[int] = None, age_days: Optional[float] = None) -> List[int]:
+        """Ids of archived conversations old enough to move, oldest first"""
+        cutoff = datetime.utcnow() - timedelta(days=self.age_days if age_days is None else age_days)
+        return db.session.execute(
+            db.select(Conversation.id)
+            .where(Conversation.archived_at <= cutoff,
+                   Conversation.status.in_(ARCHIVED_STATUSES),
+                   Conversation.cold_storage_at.is_(None))
+            .order_by(Conversation.archived_at, Conversation.id)
+            .limit(limit or self.batch_size)
+        ).scalars().all()
+
+    def tier_batch(self, limit: Optional[int] = None, age_days: Optional[float] = None) -> Dict[str, int]:
+        """
+        Move one bounded batch of conversations to cold storage.
+
+        Returns:
+            dict: conversations, messages and segments moved, raw and stored bytes
+        """
+        stats = {'conversations': 0, 'messages': 0, 'segments': 0, 'raw_bytes': 0, 'stored_bytes': 0}
+        for conversation_id in self.candidates(limit, age_days):
+            try:
+                moved = self.tier_conversation(conversation_id)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Tiering conversation {conversation_id} failed: {str(e)}")
+                continue
+            stats['conversations'] += 1
+            for key in ('messages', 'segments', 'raw_bytes', 'stored_bytes'):
+                stats[key] += moved[key]
+        return stats
+
+    def tier_conversation(self, conversation_id: int) -> Dict[str, int]:
+        """Move all of a conversation's hot messages into segments, in one transaction"""
+        messages = Message.__table__
+        conversations = Conversation.__table__
+        stats = {'messages': 0, 'segments': 0, 'raw_bytes': 0, 'stored_bytes': 0}
+
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                db.select(messages.c.id, messages.c.sender_type, messages.c.content,
+                          messages.c.metadata, messages.c.created_at)
+                .where(messages.c.conversation_id == conversation_id, messages.c.id > last_id)
+                .order_by(messages.c.id)
+                .limit(self.segment_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            raw = json.dumps({
+                'columns': SEGMENT_COLUMNS,
+                'rows': [[row.id, row.sender_type, row.content, row.metadata,
+                          row.created_at.isoformat() if row.created_at else None] for row in rows]
+            }, separators=(',', ':'), default=str).encode()
+            data = compress(raw, self.codec)
+            db.session.execute(db.insert(MessageArchive.__table__).values(
+                conversation_id=conversation_id,
+                first_message_id=rows[0].id,
+                last_message_id=last_id,
+                message_count=len(rows),
+                codec=self.codec,
+                raw_size=len(raw),
+                data=data,
+                created_at=datetime.utcnow()
+            ))
+            # Core delete: the conversation keeps its message counters, and
+            # the full-text triggers drop the rows from the search index
+            db.session.execute(messages.delete().where(
+                messages.c.conversation_id == conversation_id,
+                messages.c.id.between(rows[0].id, last_id)
+            ))
+            stats['messages'] += len(rows)
+            stats['segments'] += 1
+            stats['raw_bytes'] += len(raw)
+            stats['stored_bytes'] += len(data)
+
+        db.session.execute(
+            conversations.update()
+            .where(conversations.c.id == conversation_id)
+            .values(cold_storage_at=datetime.utcnow(), updated_at=conversations.c.updated_at)
+        )
+        db.session.commit()
+        return stats
+
+    @staticmethod
+    def _cache_key(archive) -> tuple:
+        return archive.id, archive.conversation_id, archive.first_message_id, archive.last_message_id
+
+    def _segment_messages(self, archive, data: Optional[bytes] = None) -> List[Message]:
+        """The messages of one segment; `archive` needs its id, codec, conversation and id range"""
+        key = self._cache_key(archive)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        conversation_id = archive.conversation_id
+        if data is None:
+            data = db.session.execute(
+                db.select(MessageArchive.data).where(MessageArchive.id == archive.id)
+            ).scalar_one()
+        segment = json.loads(decompress(data, archive.codec))
+        columns = segment['columns']
+        decoded = []
+        for values in segment['rows']:
+            row = dict(zip(columns, values))
+            # Transient instances: never added to a session, only serialized
+            decoded.append(Message(
+                id=row['id'],
+                conversation_id=conversation_id,
+                sender_type=row['sender_type'],
+                content=row['content'],
+                message_metadata=row['metadata'],
+                created_at=datetime.fromisoformat(row['created_at']) if row['created_at'] else None
+            ))
+
+        with self._lock:
+            self._cache[key] = decoded
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return decoded
+
+    def archived_messages(self, conversation_id: int, since: Optional[int] = None) -> List[Message]:
+        """Messages of a conversation held in cold storage, decoded lazily per segment"""
+        query = db.select(MessageArchive.id, MessageArchive.codec, MessageArchive.conversation_id,
+                          MessageArchive.first_message_id, MessageArchive.last_message_id)\
+                  .where(MessageArchive.conversation_id == conversation_id)\
+                  .order_by(MessageArchive.first_message_id)
+        if since is not None:
+            # Segments hold id ranges, so whole segments can be skipped
+            query = query.where(MessageArchive.last_message_id > since)
+
+        messages = []
+        for archive in db.session.execute(query).all():
+            messages.extend(self._segment_messages(archive))
+        if since is not None:
+            messages = [message for message in messages if message.id > since]
+        return messages
+
+    def conversation_messages(self, conversation: Conversation, since: Optional[int] = None) -> List[Message]:
+        """All messages of a cold conversation: archived segments plus any hot messages added since"""
+        query = Message.query.filter_by(conversation_id=conversation.id)
+        if since is not None:
+            query = query.filter(Message.id > since)
+        return self.archived_messages(conversation.id, since) + query.all()
+
+    def rehydrate(self, conversation: Conversation) -> int:
+        """
+        Move a conversation's messages back into the hot table, keeping their
+        ids. Runs in the caller's transaction; returns the number restored.
+        """
+        if conversation.cold_storage_at is None:
+            return 0
+
+        archives = MessageArchive.query.filter_by(conversation_id=conversation.id)\
+                                       .order_by(MessageArchive.first_message_id).all()
+        restored = 0
+        for archive in archives:
+            messages = self._segment_messages(archive, archive.data)
+            if messages:
+                # Core insert: the counters already include these messages
+                db.session.execute(Message.__table__.insert(), [{
+                    'id': message.id,
+                    'conversation_id': conversation.id,
+                    'sender_type': message.sender_type,
+                    'content': message.content,
+                    'metadata': message.message_metadata,
+                    'created_at': message.created_at
+                } for message in messages])
+            restored += len(messages)
+            db.session.delete(archive)
+            with self._lock:
+                self._cache.pop(self._cache_key(archive), None)
+
+        conversation.cold_storage_at = None
+        return restored
+
+    def stats(self) -> Dict[str, Any]:
+        """Totals over everything in cold storage"""
+        row = db.session.execute(db.select(
+            db.func.count(MessageArchive.id),
+            db.func.coalesce(db.func.sum(MessageArchive.message_count), 0),
+            db.func.coalesce(db.func.sum(MessageArchive.raw_size), 0),
+            db.func.coalesce(db.func.sum(db.func.length(MessageArchive.data)), 0)
+        )).one()
+        return {
+            'segments': row[0],
+            'messages': row[1],
+            'raw_bytes': row[2],
+            'stored_bytes': row[3],
+            'compression_ratio': round(row[2] / row[3], 2) if row[3] else None
+        }
+
+# Initialize the service instance
+tiering_service = TieringService()
@@ -0,0 +1,344 @@
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Any, List, Optional
+from flask import jsonify, request, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+
+class Tool:
+    """A capability the model may call, described by a JSON schema"""
+
+    def __init__(self, name: str, description: str, parameters: Dict[str, Any],
+                 handler: Callable[..., Any], timeout: Optional[float] = None):
+        self.name = name
+        self.description = description
+        self.parameters = parameters
+        self.handler = handler
+        self.timeout = timeout
+
+    def definition(self) -> Dict[str, Any]:
+        return {
+            'type': 'function',
+            'function': {
+                'name': self.name,
+                'description': self.description,
+                'parameters': self.parameters
+            }
+        }
+
+
+class ToolService:
+    def __init__(self, app=None):
+        self.tools = {}
+        self.default_timeout = 10.0
+        self._executor = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize the tool executor with app configuration"""
+        self.default_timeout = float(app.config.get(
+            'AGENT_TOOL_TIMEOUT', os.getenv('AGENT_TOOL_TIMEOUT', self.default_timeout)))
+        max_workers = int(app.config.get(
+            'AGENT_TOOL_WORKERS', os.getenv('AGENT_TOOL_WORKERS', 16)))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='agent-tool')
+
+        if not self.tools:
+            register_default_tools(self)
+
+    def register(self, name: str, description: str, parameters: Dict[str, Any],
+                 handler: Callable[..., Any], timeout: Optional[float] = None) -> Tool:
+        """
+        Register a tool. The handler is called as handler(user_id, **arguments)
+        inside an app context and must return something JSON serializable.
+        """
+        tool = Tool(name, description, parameters, handler, timeout)
+        self.tools[name] = tool
+        return tool
+
+    def definitions(self, names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """OpenAI `tools` payload for the selected (or all) tools"""
+        return [tool.definition() for name, tool in self.tools.items()
+                if names is None or name in names]
+
+    def execute_calls(self, tool_calls: List[Dict[str, Any]], user_id) -> List[Dict[str, Any]]:
+        """
+        Run the tool calls from one model turn concurrently.
+
+        Each call gets its own timeout; a call that overruns is reported as
+        timed out and its result is dropped. Results come back in call order.
+        """
+        if self._executor is None:
+            raise RuntimeError("ToolService not initialized with app")
+
+        app = current_app._get_current_object()
+        started = time.monotonic()
+        futures = {}
+        results = {}
+
+        for call in tool_calls:
+            function = call['function']
+            tool = self.tools.get(function['name'])
+            if tool is None:
+                results[call['id']] = self._result(call, 'error', 0.0, error=f"Unknown tool {function['name']}")
+                continue
+            try:
+                arguments = json.loads(function.get('arguments') or '{}')
+            except ValueError:
+                results[call['id']] = self._result(call, 'error', 0.0, error='Arguments are not valid JSON')
+                continue
+            timeout = tool.timeout or self.default_timeout
+            futures[call['id']] = (
+                self._executor.submit(self._run_tool, app, tool, user_id, arguments),
+                started + timeout,
+                timeout
+            )
+
+        # Wait until every call has either finished or passed its own deadline
+        pending = dict(futures)
+        while pending:
+            now = time.monotonic()
+            pending = {k: v for k, v in pending.items() if not v[0].done() and v[1] > now}
+            if not pending:
+                break
+            wait([future for future, _, _ in pending.values()],
+                 timeout=min(expires for _, expires, _ in pending.values()) - now,
+                 return_when=FIRST_COMPLETED)
+
+        for call in tool_calls:
+            if call['id'] not in futures:
+                continue
+            future, expires, timeout = futures[call['id']]
+            if not future.done():
+                future.cancel()
+                results[call['id']] = self._result(call, 'timeout', timeout, error=f"Timed out after {timeout:.1f}s")
+                continue
+            try:
+                output, latency = future.result()
+            except Exception as e:
+                results[call['id']] = self._result(call, 'error', time.monotonic() - started, error=str(e))
+                continue
+            if started + latency > expires:
+                results[call['id']] = self._result(call, 'timeout', latency, error=f"Timed out after {timeout:.1f}s")
+            else:
+                results[call['id']] = self._result(call, 'ok', latency, output=output)
+
+        return [results[call['id']] for call in tool_calls]
+
+    @staticmethod
+    def _run_tool(app, tool, user_id, arguments):
+        with app.app_context():
+            started = time.monotonic()
+            output = tool.handler(user_id, **arguments)
+            return output, time.monotonic() - started
+
+    @staticmethod
+    def _result(call, status, latency, output=None, error=None):
+        return {
+            'tool_call_id': call['id'],
+            'name': call['function']['name'],
+            'status': status,
+            'latency_ms': round(latency * 1000, 1),
+            'output': output,
+            'error': error
+        }
+
+    def run_turn(self, messages: List[Dict[str, Any]], user_id, model: Optional[str] = None,
+                 tool_names: Optional[List[str]] = None, **kwargs) -> Dict[str, Any]:
+        """
+        Run one agent turn with tool use.
+
+        The model is called with the registered tools. If it requests any,
+        they are executed concurrently and all results go back in a single
+        follow-up request.
+
+        Returns:
+            dict: The final completion plus tool results and a latency breakdown
+        """
+        from . import openai_service
+
+        turn_started = time.monotonic()
+        first = openai_service.chat_completion(
+            messages=messages,
+            model=model,
+            tools=self.definitions(tool_names),
+            tool_choice='auto',
+            user_id=user_id,
+            **kwargs
+        )
+        first_ms = (time.monotonic() - turn_started) * 1000
+        if not first['success']:
+            return first
+
+        assistant = first['data']['choices'][0]['message']
+        tool_calls = assistant.get('tool_calls') or []
+        timings = {'first_completion_ms': round(first_ms, 1)}
+        if not tool_calls:
+            timings['total_ms'] = timings['first_completion_ms']
+            return {**first, 'tool_results': [], 'timings': timings}
+
+        tools_started = time.monotonic()
+        tool_results = self.execute_calls(tool_calls, user_id)
+        tools_ms = (time.monotonic() - tools_started) * 1000
+
+        follow_up_messages = list(messages) + [{
+            'role': 'assistant',
+            'content': assistant.get('content'),
+            'tool_calls': tool_calls
+        }] + [{
+            'role': 'tool',
+            'tool_call_id': result['tool_call_id'],
+            'content': json.dumps(
+                result['output'] if result['status'] == 'ok' else {'error': result['error']},
+                default=str
+            )
+        } for result in tool_results]
+
+        follow_up_started = time.monotonic()
+        final = openai_service.chat_completion(
+            messages=follow_up_messages,
+            model=model,
+            tools=self.definitions(tool_names),
+            tool_choice='none',
+            user_id=user_id,
+            **kwargs
+        )
+        follow_up_ms = (time.monotonic() - follow_up_started) * 1000
+
+        timings.update({
+            'tools_ms': round(tools_ms, 1),
+            # What running the same calls one after another would have cost
+            'tools_serial_ms': round(sum(r['latency_ms'] for r in tool_results), 1),
+            'follow_up_ms': round(follow_up_ms, 1),
+            'total_ms': round((time.monotonic() - turn_started) * 1000, 1)
+        })
+        return {**final, 'tool_results': tool_results, 'timings': timings}
+
+
+def register_default_tools(tools: ToolService):
+    """Expose the app's own capabilities to agents"""
+    from models import Lead
+    from . import memory_service, email_service
+    from .n8n_service import N8NService
+
+    def lookup_lead(user_id, lead_id=None, email=None, name=None):
+        query = Lead.query.filter_by(user_id=user_id)
+        if lead_id is not None:
+            query = query.filter_by(id=lead_id)
+        if email:
+            query = query.filter(Lead.email.ilike(email))
+        if name:
+            query = query.filter(Lead.name.ilike(f"%{name}%"))
+        return [lead.to_dict() for lead in query.limit(5).all()]
+
+    def search_memory(user_id, query, limit=5):
+        results = memory_service.search(query=query, user_id=user_id, limit=int(limit))
+        return [{'content': r.item.content, 'score': r.score} for r in results]
+
+    def run_workflow(user_id, workflow_id, payload=None):
+        return N8NService.execute_workflow(
+            workflow_id,
+            {**(payload or {}), 'user_id': user_id},
+            timeout=tools.tools['run_workflow'].timeout or tools.default_timeout
+        )
+
+    def send_email(user_id, to, subject, body):
+        return email_service.send_email(to_emails=to, subject=subject, body=body)
+
+    tools.register(
+        'lookup_lead',
+        "Look up the user's leads by id, email or name.",
+        {
+            'type': 'object',
+            'properties': {
+                'lead_id': {'type': 'integer'},
+                'email': {'type': 'string'},
+                'name': {'type': 'string', 'description': 'Partial name match'}
+            }
+        },
+        lookup_lead,
+        timeout=2.0
+    )
+    tools.register(
+        'search_memory',
+        'Semantic search over stored memories and notes.',
+        {
+            'type': 'object',
+            'properties': {
+                'query': {'type': 'string'},
+                'limit': {'type': 'integer', 'default': 5}
+            },
+            'required': ['query']
+        },
+        search_memory,
+        timeout=3.0
+    )
+    tools.register(
+        'run_workflow',
+        'Trigger an n8n automation workflow with a JSON payload.',
+        {
+            'type': 'object',
+            'properties': {
+                'workflow_id': {'type': 'string'},
+                'payload': {'type': 'object'}
+            },
+            'required': ['workflow_id']
+        },
+        run_workflow,
+        timeout=10.0
+    )
+    tools.register(
+        'send_email',
+        'Send a plain-text email.',
+        {
+            'type': 'object',
+            'properties': {
+                'to': {'type': 'string'},
+                'subject': {'type': 'string'},
+                'body': {'type': 'string'}
+            },
+            'required': ['to', 'subject', 'body']
+        },
+        send_email,
+        timeout=15.0
+    )
+
+# Initialize the service instance
+tool_service = ToolService()
+
+def create_tool_routes(bp):
+    """Create agent tool-calling API routes"""
+
+    @bp.route('/agent/turn', methods=['POST'])
+    @jwt_required()
+    def agent_turn():
+        data = request.get_json()
+        messages = data.get('messages')
+
+        if not messages:
+            return jsonify({
+                'success': False,
+                'message': 'messages array is required'
+            }), 400
+
+        result = tool_service.run_turn(
+            messages=messages,
+            user_id=get_jwt_identity(),
+            model=data.get('model'),
+            tool_names=data.get('tools')
+        )
+
+        return jsonify(result), 200 if result['success'] else 500
+
+    @bp.route('/agent/tools', methods=['GET'])
+    @jwt_required()
+    def list_tools():
+        return jsonify({
+            'success': True,
+            'data': tool_service.definitions()
+        })
+
+    return bp
@@ -0,0 +1,162 @@
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, CallLog, CallTranscriptSegment
+from .pubsub_service import pubsub_service
+
+# Appends carry at most this many segments
+MAX_SEGMENTS_PER_REQUEST = 500
+
+
+class InvalidTranscriptSegment(ValueError):
+    """Raised for a transcript segment that cannot be appended"""
+
+
+def _optional_int(raw: Dict[str, Any], field: str) -> Optional[int]:
+    value = raw.get(field)
+    if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 0):
+        raise InvalidTranscriptSegment(f'{field} must be a non-negative integer')
+    return value
+
+
+def parse_segment(raw: Any) -> Dict[str, Any]:
+    """Validate one segment and map it onto CallTranscriptSegment columns"""
+    if not isinstance(raw, dict):
+        raise InvalidTranscriptSegment('Each segment must be an object')
+    seq = _optional_int(raw, 'seq')
+    if seq is None:
+        raise InvalidTranscriptSegment('Segments need a seq')
+    text = raw.get('text')
+    if not isinstance(text, str) or not text.strip():
+        raise InvalidTranscriptSegment('Segments need text')
+    start_ms, end_ms = _optional_int(raw, 'start_ms'), _optional_int(raw, 'end_ms')
+    if start_ms is not None and end_ms is not None and end_ms < start_ms:
+        raise InvalidTranscriptSegment('end_ms must not be before start_ms')
+    return {
+        'seq': seq,
+        'speaker': str(raw['speaker'])[:20] if raw.get('speaker') else None,
+        'start_ms': start_ms,
+        'end_ms': end_ms,
+        'text': text.strip()
+    }
+
+
+def render_transcript(segments) -> str:
+    """One "speaker: text" line per segment, in seq order"""
+    return '\n'.join(f'{segment.speaker}: {segment.text}' if segment.speaker else segment.text
+                     for segment in segments)
+
+
+class TranscriptService:
+    """
+    Stores call transcripts as append-only segments.
+
+    A transcriber appends segments while the call is live: each append is
+    one INSERT of the new rows (never a rewrite of the growing text), and
+    the new segments are published on the call's pub/sub topic for the
+    transcript stream. CallLog.transcription is a materialized copy that
+    is rebuilt the first time it is read after segments were added, so a
+    live call pays for the full text at most once per read, not per append.
+    """
+
+    def __init__(self, app=None):
+        self.max_segments = MAX_SEGMENTS_PER_REQUEST
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize transcript storage with app configuration"""
+        self.max_segments = int(app.config.get(
+            'TRANSCRIPT_MAX_SEGMENTS_PER_REQUEST',
+            os.getenv('TRANSCRIPT_MAX_SEGMENTS_PER_REQUEST', self.max_segments)))
+
+    def parse_payload(self, payload: Any) -> List[Dict[str, Any]]:
+        """Accepts one segment, a list of segments or {"segments": [...]}"""
+        if isinstance(payload, dict) and 'segments' in payload:
+            payload = payload['segments']
+        segments = payload if isinstance(payload, list) else [payload]
+        if not segments:
+            raise InvalidTranscriptSegment('No segments')
+        if len(segments) > self.max_segments:
+            raise InvalidTranscriptSegment(f'At most {self.max_segments} segments per request')
+        return [parse_segment(segment) for segment in segments]
+
+    def append(self, call: CallLog, segments: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Insert new segments for a call, commit and publish them. A seq the
+        call already has (a retried append) is counted as a duplicate and
+        keeps its original text.
+        """
+        unique = {}
+        for segment in segments:
+            unique.setdefault(segment['seq'], segment)
+        now = datetime.utcnow()
+        rows = [{**segment, 'call_log_id': call.id, 'created_at': now}
+                for _, segment in sorted(unique.items())]
+
+        table = CallTranscriptSegment.__table__
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            insert = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+            result = db.session.execute(
+                insert.on_conflict_do_nothing(index_elements=[table.c.call_log_id, table.c.seq])
+                .returning(table.c.id, table.c.seq),
+                rows
+            )
+            ids = {seq: segment_id for segment_id, seq in result}
+        else:
+            existing = set(db.session.execute(
+                db.select(table.c.seq).where(table.c.call_log_id == call.id, table.c.seq.in_(list(unique)))
+            ).scalars())
+            ids = {}
+            for row in rows:
+                if row['seq'] not in existing:
+                    ids[row['seq']] = db.session.execute(table.insert().values(**row)).inserted_primary_key[0]
+        db.session.commit()
+
+        appended = sorted(({'id': ids[seq], 'call_log_id': call.id, **segment, 'created_at': now.isoformat()}
+                           for seq, segment in unique.items() if seq in ids),
+                          key=lambda segment: segment['id'])
+        for segment in appended:
+            pubsub_service.publish(f"call:{call.id}", segment)
+        return {'accepted': len(appended), 'duplicates': len(segments) - len(appended), 'segments': appended}
+
+    def segments(self, call_id: int, since: Optional[int] = None, limit: Optional[int] = None):
+        """A call's segments in arrival order, optionally after segment id `since`"""
+        query = CallTranscriptSegment.query.filter(CallTranscriptSegment.call_log_id == call_id)
+        if since is not None:
+            query = query.filter(CallTranscriptSegment.id > since)
+        query = query.order_by(CallTranscriptSegment.id.asc())
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    def materialize(self, call: CallLog) -> Optional[str]:
+        """
+        The call's full transcript. Rebuilt from the segments and stored
+        when segments were appended since it was last built; calls without
+        segments keep whatever transcription they were given.
+        """
+        segments = CallTranscriptSegment.__table__
+        latest = db.session.execute(
+            db.select(db.func.max(segments.c.id)).where(segments.c.call_log_id == call.id)
+        ).scalar()
+        if latest is None or latest == call.transcript_segment_id:
+            return call.transcription
+
+        rows = db.session.execute(
+            db.select(segments.c.id, segments.c.speaker, segments.c.text)
+            .where(segments.c.call_log_id == call.id)
+            .order_by(segments.c.seq)
+        ).all()
+        call.transcription = render_transcript(rows)
+        call.transcript_segment_id = max(row.id for row in rows)
+        db.session.commit()
+        return call.transcription
+
+# Initialize the service instance
+transcript_service = TranscriptService()